@@ -0,0 +1,1669 @@
+# 기능별 성능 측정: python -m bench <시나리오> [옵션]   (시나리오 목록: python -m bench --help)
+# 시나리오마다 기존 방식(baseline)과 새 방식을 같은 입력으로 돌려서 표로 출력 (--json 이면 JSON)
+# 시간은 --repeat 번 돌린 것 중 가장 빠른 값, 메모리는 tracemalloc 으로 잰 파이썬 할당 최대치
+# 요청 단위 시나리오는 replay.py 의 AsgiClient 로 앱을 같은 프로세스에서 직접 호출함 (네트워크 비용 제외)
+import argparse
+import asyncio
+import gc
+import inspect
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# 벤치마크가 작업 디렉터리에 세션 DB 를 남기지 않도록
+os.environ.setdefault("SESSION_DB", ":memory:")
+
+SCENARIOS = {}
+
+
+def scenario(name: str, help: str, *arguments):
+    def decorator(func):
+        SCENARIOS[name] = (func, help, arguments)
+        return func
+
+    return decorator
+
+
+def arg(*flags, **kwargs):
+    return flags, kwargs
+
+
+def int_list(text: str):
+    return [int(value) for value in text.split(",") if value]
+
+
+def best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(fn) -> float:
+    # MB
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def print_table(rows, out=sys.stdout):
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    cells = [[_format(row.get(column, "")) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(row[i]) for row in cells)) for i, column in enumerate(columns)]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)), file=out)
+    for row in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)), file=out)
+
+
+def _format(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}" if abs(value) < 1000 else f"{value:.0f}"
+    return str(value)
+
+
+def replay_app(app, records, requests: int, concurrency: int = 16, rate: float = 0.0, routes: bool = False,
+               url: str | None = None):
+    # replay.py 의 닫힌/개방 루프를 그대로 써서 app 을 같은 프로세스에서 호출하고 TOTAL 행을 돌려줌
+    # routes=True 면 라우트 라벨별 행을 dict 로 돌려줌, url 이 있으면 그 서버로 HTTP 요청을 보냄
+    from replay import AsgiClient, HttpClient, RouteLabels, replay
+
+    options = argparse.Namespace(requests=requests, concurrency=concurrency, rate=rate, arrival="uniform")
+
+    async def run():
+        if url:
+            client = HttpClient(url, concurrency, 30.0)
+            try:
+                results, elapsed = await replay(client, records, RouteLabels(app), options)
+            finally:
+                await client.close()
+        else:
+            async with app.router.lifespan_context(app):
+                results, elapsed = await replay(AsgiClient(app), records, RouteLabels(app), options)
+        rows, total = results.summary(elapsed)
+        return {row["route"]: row for row in rows} if routes else total
+
+    return asyncio.run(run())
+
+
+def request(method: str, target: str, body=None):
+    # replay.load_capture 가 만드는 레코드 모양: (method, target, headers, body)
+    if body is None:
+        return method, target, {}, b""
+    return method, target, {"content-type": "application/json"}, json.dumps(body).encode()
+
+
+####################
+# 컬럼형 가중치 벡터 파싱/렌더 (/index-weights/columnar)
+####################
+
+@scenario(
+    "index-weights", "Dict[int, float] validation vs columnar arrays (JSON and binary bodies)",
+    arg("--sizes", type=int_list, default=[10_000, 1_000_000], help="entry counts, e.g. 10000,1000000,10000000"),
+    arg("--repeat", type=int, default=3),
+    arg("--no-memory", action="store_true", help="skip the tracemalloc peak (it needs several GB at 10M entries)"),
+)
+def bench_index_weights(args):
+    import random
+    import struct
+    from typing import Dict
+
+    from pydantic import TypeAdapter
+
+    from main import render_json
+    from routers.index_weights import IndexWeights
+
+    adapter = TypeAdapter(Dict[int, float])
+    rows = []
+    for size in args.sizes:
+        rng = random.Random(size)
+        # 배치마다 인덱스를 만들어 쓰고 버림 (10M 에서 세 배치를 동시에 들고 있지 않게)
+        layouts = {
+            "sorted": lambda: list(range(size)),
+            "dense-shuffled": lambda: rng.sample(range(size), size),
+            "sparse-shuffled": lambda: rng.sample(range(size * 1000), size),
+        }
+        for layout, make_indices in layouts.items():
+            indices = make_indices()
+            weights = [rng.random() for _ in indices]
+            body = json.dumps(dict(zip(map(str, indices), weights))).encode()
+            binary = b"".join(map(struct.Struct("<qd").pack, indices, weights))
+            del indices, weights
+            cases = {
+                "baseline validate_json": lambda: adapter.validate_json(body),
+                "baseline validate+render": lambda: render_json(adapter.validate_json(body)),
+                "columnar from_json": lambda: IndexWeights.from_json(body),
+                "columnar json+render": lambda: IndexWeights.from_json(body).to_json_bytes(),
+                "columnar from_binary": lambda: IndexWeights.from_binary(binary),
+                "columnar binary+render": lambda: IndexWeights.from_binary(binary).to_json_bytes(),
+            }
+            for case, fn in cases.items():
+                row = {"entries": size, "layout": layout, "case": case, "seconds": best_time(fn, args.repeat)}
+                if not args.no_memory:
+                    row["peak_mb"] = peak_memory(fn)
+                rows.append(row)
+            del body, binary
+    return rows
+
+
+####################
+# 지연 시간 계측 오버헤드
+####################
+
+# 가벼운 엔드포인트 위주라서 요청당 고정 비용(계측 같은)이 비율로는 가장 크게 보이는 조합
+REPLAY_MIX = [
+    request("GET", "/"),
+    request("GET", "/hello/world"),
+    request("GET", "/users/gyeore"),
+    request("GET", "/users?ids=gyeore,haneul,nobody"),
+    request("GET", "/models/alexnet"),
+    request("GET", "/items/?limit=10"),
+    request("POST", "/index-weights/", {"1": 0.5, "2": 0.25}),
+]
+
+
+@scenario(
+    "replay-mix", "replay a fixed mix of light requests against main:app in this process (see REPLAY_MIX)",
+    arg("--requests", type=int, default=20_000),
+    arg("--concurrency", type=int, default=16),
+)
+def bench_replay_mix(args):
+    from main import METRICS_ENABLED, app, load_lazy_routes
+
+    load_lazy_routes(app)
+    # 처음 몇천 요청은 지연 초기화와 인터프리터 특수화가 섞이므로 재지 않음
+    replay_app(app, REPLAY_MIX, args.requests // 10, args.concurrency)
+    cpu = time.process_time()
+    total = replay_app(app, REPLAY_MIX, args.requests, args.concurrency)
+    cpu_us = (time.process_time() - cpu) / total["count"] * 1e6
+    return [{"metrics": METRICS_ENABLED, **{k: v for k, v in total.items() if k not in ("route", "statuses")}, "cpu_us": cpu_us}]
+
+
+@scenario(
+    "metrics-overhead", "replay-mix with METRICS=1 vs METRICS=0 (no MetricsMiddleware, no route/endpoint timing)",
+    arg("--requests", type=int, default=20_000),
+    arg("--rounds", type=int, default=7, help="on/off pairs in fresh processes; the median pair is reported"),
+    arg("--concurrency", type=int, default=16),
+)
+def bench_metrics_overhead(args):
+    import statistics
+    import subprocess
+
+    rows = {"1": [], "0": []}
+    for round_ in range(args.rounds):
+        # 짝마다 순서를 바꿔서 먼저 돈 쪽이 유리하거나 불리한 것을 상쇄
+        for enabled in ("1", "0") if round_ % 2 else ("0", "1"):
+            output = subprocess.run(
+                [sys.executable, "-m", "bench", "--json", "replay-mix",
+                 "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+                env={**os.environ, "METRICS": enabled}, capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout
+            rows[enabled].append(json.loads(output)[0])
+    # 같은 상자의 다른 프로세스가 끼어든 시간은 빼고 보도록 벽시계 처리량 대신 요청당 CPU 시간으로 비교하고,
+    # 한 번 튄 라운드에 좌우되지 않게 짝별 차이의 중앙값을 씀
+    overhead = statistics.median((on["cpu_us"] - off["cpu_us"]) / off["cpu_us"] * 100 for on, off in zip(rows["1"], rows["0"]))
+    result = []
+    for enabled, runs in rows.items():
+        row = sorted(runs, key=lambda row: row["cpu_us"])[len(runs) // 2]
+        result.append({
+            "metrics": "on" if enabled == "1" else "off",
+            "requests": row["count"],
+            "non_2xx": row["non_2xx"],
+            "req_per_s": row["rps"],
+            "p50_ms": row["p50_ms"],
+            "p99_ms": row["p99_ms"],
+            "cpu_us": row["cpu_us"],
+            "overhead_pct": overhead if enabled == "1" else 0,
+        })
+    return result
+
+
+####################
+# 과부하 때 가벼운 라우트의 꼬리 지연
+####################
+
+@scenario(
+    "overload", "p99 of GET / alone vs while POST /images/multiple/ is saturated, with and without the rate limit",
+    arg("--requests", type=int, default=4_000),
+    arg("--concurrency", type=int, default=16),
+    arg("--images", type=int, default=2_000, help="images per POST /images/multiple/ body"),
+    arg("--heavy", type=int, default=3, help="heavy requests per GET / in the saturated mix"),
+)
+def bench_overload(args):
+    import main
+
+    images = [{"url": f"https://example.com/{i}.png", "name": f"image {i}"} for i in range(args.images)]
+    light = request("GET", "/")
+    heavy = request("POST", "/images/multiple/", images)
+    rows = []
+    for case, records, limited in (
+        ("idle", [light], True),
+        ("saturated, rate limited", [*[heavy] * args.heavy, light], True),
+        ("saturated, no rate limit", [*[heavy] * args.heavy, light], False),
+    ):
+        # 버킷은 프로세스 전체에서 공유되므로 경우마다 새로 만들어서 앞의 경우가 쓴 토큰이 남지 않게 함
+        main.token_buckets = main.SharedTokenBuckets(1024)
+        if not limited:
+            main.token_buckets.acquire = lambda *args, **kwargs: 0.0
+        by_route = replay_app(main.app, records, args.requests, args.concurrency, routes=True)
+        for route, row in by_route.items():
+            rows.append({
+                "case": case,
+                "route": route,
+                "count": row["count"],
+                "statuses": " ".join(f"{status}:{count}" for status, count in row["statuses"].items()),
+                "p50_ms": row["p50_ms"],
+                "p99_ms": row["p99_ms"],
+                "max_ms": row["max_ms"],
+            })
+    return rows
+
+
+####################
+# /files 파일 서빙
+####################
+
+@scenario(
+    "files", "GET /files/... vs starlette FileResponse: small files, one large file, concurrent range requests",
+    arg("--small-kb", type=int, default=4),
+    arg("--large-mb", type=int, default=256, help="large file size; use e.g. 4096 for a multi-GB file"),
+    arg("--range-kb", type=int, default=64),
+    arg("--requests", type=int, default=2_000, help="requests for the small-file and range cases"),
+    arg("--concurrency", type=int, default=16),
+)
+def bench_files(args):
+    import random
+    import tempfile
+
+    root = tempfile.mkdtemp(prefix="bench-files-")
+    # routers.files 는 import 할 때 FILES_ROOT 를 읽음
+    os.environ["FILES_ROOT"] = root
+    from starlette.responses import FileResponse
+
+    from main import app, load_lazy_routes
+
+    load_lazy_routes(app)
+    sizes = {"small.bin": args.small_kb << 10, "large.bin": args.large_mb << 20}
+    for name, size in sizes.items():
+        with open(os.path.join(root, name), "wb") as f:
+            for offset in range(0, size, 1 << 20):
+                f.write(os.urandom(min(1 << 20, size - offset)))
+
+    async def file_response(request):
+        return FileResponse(os.path.join(root, request.path_params["name"]))
+
+    # 비교 대상도 같은 앱에 붙여서 미들웨어 비용은 양쪽에 똑같이 들어가게 함
+    app.add_route("/bench-files/{name}", file_response)
+    rng = random.Random(0)
+    span = args.range_kb << 10
+    starts = [rng.randrange(0, sizes["large.bin"] - span) for _ in range(256)]
+    cases = {
+        "small file": ([request("GET", "/files/small.bin")], args.requests, sizes["small.bin"]),
+        "large file": ([request("GET", "/files/large.bin")], max(4, args.concurrency // 2), sizes["large.bin"]),
+        "range requests": (
+            [("GET", "/files/large.bin", {"range": f"bytes={start}-{start + span - 1}"}, b"") for start in starts],
+            args.requests, span,
+        ),
+    }
+    rows = []
+    try:
+        for case, (records, requests, size) in cases.items():
+            for server, prefix in (("FileResponse", "/bench-files/"), ("/files route", "/files/")):
+                targets = [(method, prefix + target[len("/files/"):], headers, body)
+                           for method, target, headers, body in records]
+                total = replay_app(app, targets, requests, args.concurrency)
+                rows.append({
+                    "case": case,
+                    "server": server,
+                    "bytes": size,
+                    "requests": total["count"],
+                    "non_2xx": total["non_2xx"],
+                    "req_per_s": total["rps"],
+                    "mb_per_s": total["rps"] * size / 1e6,
+                    "p99_ms": total["p99_ms"],
+                })
+    finally:
+        for name in sizes:
+            os.unlink(os.path.join(root, name))
+        os.rmdir(root)
+    return rows
+
+
+####################
+# 검증된 URL 캐시
+####################
+
+@scenario(
+    "image-validate", "validate a List[Image] JSON batch at several duplicate ratios with this process's URL_CACHE_SIZE",
+    arg("--batch", type=int, default=10_000),
+    arg("--duplicates", type=lambda text: [float(v) for v in text.split(",")], default=[0.0, 0.5, 0.9, 0.99],
+        help="fraction of the batch that repeats an earlier URL"),
+    arg("--repeat", type=int, default=20),
+)
+def bench_image_validate(args):
+    import random
+    from typing import List
+
+    from pydantic import BaseModel, HttpUrl, TypeAdapter
+
+    from main import Image, url_cache
+
+    class PlainImage(BaseModel):
+        url: HttpUrl
+        name: str
+
+    adapters = {"Image": TypeAdapter(List[Image])}
+    if not url_cache.maxsize:
+        adapters["plain HttpUrl model"] = TypeAdapter(List[PlainImage])
+    rows = []
+    for ratio in args.duplicates:
+        rng = random.Random(0)
+        distinct = max(1, round(args.batch * (1 - ratio)))
+        pool = [f"https://cdn{i % 7}.example.com/assets/{i:06d}/image.png?w=640" for i in range(distinct)]
+        urls = [pool[i % distinct] for i in range(args.batch)]
+        rng.shuffle(urls)
+        body = json.dumps([{"url": url, "name": "image"} for url in urls]).encode()
+        for case, adapter in adapters.items():
+            def run():
+                # 배치마다 빈 캐시에서 시작 (배치 안의 중복만 이득으로 침)
+                url_cache.clear()
+                adapter.validate_json(body)
+
+            seconds = best_time(run, args.repeat)
+            rows.append({
+                "url_cache_size": url_cache.maxsize,
+                "duplicates": ratio,
+                "distinct_urls": distinct,
+                "model": case,
+                "ms": seconds * 1000,
+                "us_per_image": seconds / args.batch * 1e6,
+            })
+    return rows
+
+
+@scenario(
+    "url-cache", "image-validate with URL_CACHE_SIZE=0 (no wrap validator) vs an enabled cache, in fresh processes",
+    arg("--cache-size", type=int, default=4096),
+    arg("--batch", type=int, default=10_000),
+    arg("--duplicates", default="0,0.5,0.9,0.99"),
+    arg("--repeat", type=int, default=20),
+)
+def bench_url_cache(args):
+    import subprocess
+
+    rows = []
+    for size in (0, args.cache_size):
+        output = subprocess.run(
+            [sys.executable, "-m", "bench", "--json", "image-validate", "--batch", str(args.batch),
+             "--duplicates", args.duplicates, "--repeat", str(args.repeat)],
+            env={**os.environ, "URL_CACHE_SIZE": str(size)}, capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout
+        rows.extend(json.loads(output))
+    baseline = {row["duplicates"]: row["ms"] for row in rows if row["model"] == "plain HttpUrl model"}
+    for row in rows:
+        row["speedup"] = baseline[row["duplicates"]] / row["ms"]
+    return sorted(rows, key=lambda row: (row["duplicates"], row["url_cache_size"]))
+
+
+####################
+# 이미지 배열 스트리밍 수집
+####################
+
+IMAGE_HANDLERS = {
+    "buffered": "/images/multiple/",
+    "stream ndjson": "/images/multiple/stream?format=ndjson",
+    "stream json": "/images/multiple/stream?format=json",
+}
+
+
+def image_body_chunks(images: int, chunk_size: int):
+    # 본문을 통째로 만들지 않고 청크 단위로 만들어서 보내는 쪽 메모리가 측정에 섞이지 않게 함
+    parts, size = [b"["], 1
+    for i in range(images):
+        part = b"%s{\"url\":\"https://cdn.example.com/assets/%06d.png\",\"name\":\"image %d\"}" % (
+            b"," if i else b"", i, i)
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield b"".join(parts)
+            parts, size = [], 0
+    parts.append(b"]")
+    yield b"".join(parts)
+
+
+@scenario(
+    "images-ingest", "send one chunked List[Image] body to a /images/multiple handler; report TTFB and peak RSS",
+    arg("--handler", choices=list(IMAGE_HANDLERS), default="stream ndjson"),
+    arg("--images", type=int, default=100_000),
+    arg("--chunk-kb", type=int, default=64),
+)
+async def bench_images_ingest(args):
+    import resource
+
+    # 본문 검증을 같은 프로세스의 스레드에서 하게 해서 RSS 에 전부 잡히게 함
+    os.environ.setdefault("OFFLOAD_EXECUTOR", "thread")
+    from main import app, load_lazy_routes
+
+    load_lazy_routes(app)
+    path, _, query = IMAGE_HANDLERS[args.handler].partition("?")
+
+    async def post(chunks):
+        chunks = iter(chunks)
+        stamps = {}
+        received = 0
+        done = asyncio.Event()
+
+        async def receive():
+            nonlocal chunks
+            if chunks is None:
+                await done.wait()
+                return {"type": "http.disconnect"}
+            chunk = next(chunks, None)
+            if chunk is None:
+                chunks = None
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return {"type": "http.request", "body": chunk, "more_body": True}
+
+        async def send(message):
+            nonlocal received
+            if message["type"] == "http.response.start":
+                stamps["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                if message.get("body"):
+                    stamps.setdefault("first_byte", time.perf_counter())
+                    received += len(message["body"])
+                if not message.get("more_body", False):
+                    stamps["last_byte"] = time.perf_counter()
+                    done.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+            "root_path": "", "headers": [(b"content-type", b"application/json")],
+            "client": ("127.0.0.1", 50000), "server": ("bench", 80), "state": {},
+        }
+        stamps["sent"] = time.perf_counter()
+        await app(scope, receive, send)
+        return stamps, received
+
+    async with app.router.lifespan_context(app):
+        await post(image_body_chunks(10, 1 << 10))
+        gc.collect()
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        stamps, received = await post(image_body_chunks(args.images, args.chunk_kb << 10))
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return [{
+        "handler": args.handler,
+        "images": args.images,
+        "status": stamps["status"],
+        "ttfb_ms": (stamps["first_byte"] - stamps["sent"]) * 1000,
+        "total_ms": (stamps["last_byte"] - stamps["sent"]) * 1000,
+        "response_mb": received / 1e6,
+        "peak_rss_mb": peak,
+        "rss_growth_mb": peak - before,
+    }]
+
+
+@scenario(
+    "images-stream", "images-ingest for every handler and batch size, each in a fresh process (peak RSS is per process)",
+    arg("--sizes", type=int_list, default=[1_000, 10_000, 100_000]),
+)
+def bench_images_stream(args):
+    import subprocess
+
+    rows = []
+    for images in args.sizes:
+        for handler in IMAGE_HANDLERS:
+            output = subprocess.run(
+                [sys.executable, "-m", "bench", "--json", "images-ingest", "--handler", handler, "--images", str(images)],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout
+            rows.extend(json.loads(output))
+    return rows
+
+
+####################
+# 고정 모양 응답 템플릿
+####################
+
+@scenario(
+    "templates", "GET /, /hello/{name}, /users/me from JsonTemplate vs the same handlers returning dicts",
+    arg("--requests", type=int, default=20_000),
+    arg("--concurrency", type=int, default=16),
+    arg("--rounds", type=int, default=3, help="best of this many replays per case"),
+)
+def bench_templates(args):
+    from main import app
+
+    # 템플릿 이전의 핸들러를 같은 앱에 붙여서 미들웨어와 라우트 클래스는 똑같이 거치게 함
+    @app.get("/bench-dict/")
+    async def root_dict():
+        return {"message": "Hello World"}
+
+    @app.get("/bench-dict/hello/{name}")
+    async def say_hello_dict(name: str):
+        return {"message": f"Hello {name}"}
+
+    @app.get("/bench-dict/users/me")
+    async def read_user_me_dict():
+        return {"user_id": "the current user"}
+
+    rows = []
+    for path in ("/", "/hello/world", "/users/me"):
+        for case, target in (("dict", "/bench-dict" + path), ("template", path)):
+            total = max((replay_app(app, [request("GET", target)], args.requests, args.concurrency)
+                         for _ in range(args.rounds)), key=lambda row: row["rps"])
+            rows.append({
+                "route": path,
+                "case": case,
+                "non_2xx": total["non_2xx"],
+                "req_per_s": total["rps"],
+                "p50_ms": total["p50_ms"],
+                "p99_ms": total["p99_ms"],
+            })
+    return rows
+
+
+####################
+# 색인된 ItemStore
+####################
+
+@scenario(
+    "item-store", "ItemStore.page vs sorting and filtering a plain list of item dicts",
+    arg("--sizes", type=int_list, default=[10_000, 100_000]),
+    arg("--tags", type=int, default=50, help="tag vocabulary; item tags are Zipf-ish so a few tags are common"),
+    arg("--limit", type=int, default=100),
+    arg("--repeat", type=int, default=5),
+)
+def bench_item_store(args):
+    import random
+    from datetime import datetime, timedelta
+
+    from main import ItemStore
+
+    rows = []
+    for size in args.sizes:
+        rng = random.Random(size)
+        vocabulary = [f"tag{i}" for i in range(args.tags)]
+        weights = [1 / (i + 1) for i in range(args.tags)]
+        store = ItemStore()
+        start = datetime(2024, 1, 1)
+        for i in range(size):
+            store.add(f"item {i}", rng.choices(vocabulary, weights, k=rng.randint(0, 3)),
+                      created_at=start + timedelta(seconds=i))
+        for item_id in rng.sample(range(1, size + 1), size // 10):
+            store.update(item_id, updated_at=start + timedelta(seconds=size + rng.randrange(size)))
+        items = [store[item_id] for item_id in range(1, size + 1)]
+
+        def scan(order_by, limit, offset=0, tags=()):
+            # 기존 방식: 요청마다 전체 목록을 거르고 정렬한 뒤 자름
+            wanted = set(tags)
+            matching = [item for item in items if wanted <= set(item["tags"])]
+            matching.sort(key=lambda item: (item[order_by], item["id"]))
+            return matching[offset:offset + limit]
+
+        deep = size // 2
+        _, cursor = store.page("created_at", deep, 0)
+        queries = {
+            "first page": dict(order_by="created_at"),
+            "first page by updated_at": dict(order_by="updated_at"),
+            "offset n/2": dict(order_by="created_at", offset=deep),
+            "common tag": dict(order_by="created_at", tags=["tag0"]),
+            "two tags": dict(order_by="updated_at", tags=["tag0", "tag3"]),
+            "rare tag, offset 100": dict(order_by="created_at", tags=[vocabulary[-1]], offset=100),
+        }
+        for query, params in queries.items():
+            expected = scan(limit=args.limit, **params)
+            assert [item["id"] for item in store.page(limit=args.limit, **params)[0]] == [item["id"] for item in expected]
+            rows.append({
+                "items": size,
+                "query": query,
+                "scan_ms": best_time(lambda: scan(limit=args.limit, **params), args.repeat) * 1000,
+                "store_ms": best_time(lambda: store.page(limit=args.limit, **params), args.repeat) * 1000,
+            })
+        # 목록 스캔에는 커서가 없으므로 같은 위치를 offset 으로 찾는 비용과 비교함
+        offset_row = next(row for row in rows if row["items"] == size and row["query"] == "offset n/2")
+        rows.append({
+            "items": size,
+            "query": "cursor at n/2",
+            "scan_ms": offset_row["scan_ms"],
+            "store_ms": best_time(lambda: store.page("created_at", args.limit, cursor=cursor), args.repeat) * 1000,
+        })
+    for row in rows:
+        row["speedup"] = row["scan_ms"] / row["store_ms"]
+    return rows
+
+
+####################
+# 프리포크 워커 수에 따른 처리량
+####################
+
+SERVE_MIX = [request("GET", "/hello/world"), request("GET", "/models/alexnet")]
+
+
+@scenario(
+    "http-load", "closed-loop replay of /hello/{name} and /models/{model_name} against a running server over HTTP",
+    arg("--url", default="http://127.0.0.1:8000"),
+    arg("--requests", type=int, default=5_000),
+    arg("--concurrency", type=int, default=32),
+)
+async def bench_http_load(args):
+    from replay import HttpClient, RouteLabels, replay
+
+    client = HttpClient(args.url, args.concurrency, 30.0)
+    try:
+        options = argparse.Namespace(requests=args.requests, concurrency=args.concurrency, rate=0.0, arrival="uniform")
+        results, elapsed = await replay(client, SERVE_MIX, RouteLabels(None), options)
+    finally:
+        await client.close()
+    total = results.summary(elapsed)[1]
+    return [{k: v for k, v in total.items() if k not in ("route", "statuses")}]
+
+
+@scenario(
+    "serve-scaling", "python -m serve with 1..N workers, loaded by several http-load client processes",
+    arg("--workers", type=int_list, default=None, help="worker counts (default: powers of two up to the CPU count)"),
+    arg("--clients", type=int, default=None, help="load generator processes (default: CPU count)"),
+    arg("--requests", type=int, default=5_000, help="requests per client process"),
+    arg("--concurrency", type=int, default=32, help="connections per client process"),
+    arg("--port", type=int, default=8765),
+)
+def bench_serve_scaling(args):
+    import signal
+    import subprocess
+    import urllib.request
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({1 << i for i in range(cpus.bit_length()) if 1 << i <= cpus} | {cpus})
+    clients = args.clients or cpus
+    url = f"http://127.0.0.1:{args.port}"
+    here = os.path.dirname(os.path.abspath(__file__))
+    rows = []
+    for count in workers:
+        server = subprocess.Popen([sys.executable, "-m", "serve", "--workers", str(count), "--port", str(args.port)],
+                                  cwd=here)
+        try:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    with urllib.request.urlopen(url + "/hello/ready", timeout=1) as response:
+                        if response.status == 200:
+                            break
+                except OSError:
+                    if time.monotonic() > deadline or server.poll() is not None:
+                        raise SystemExit(f"serve with {count} workers did not become ready")
+                    time.sleep(0.2)
+            loads = [
+                subprocess.Popen([sys.executable, "-m", "bench", "--json", "http-load", "--url", url,
+                                  "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+                                 cwd=here, stdout=subprocess.PIPE, text=True)
+                for _ in range(clients)
+            ]
+            totals = [json.loads(load.communicate()[0])[0] for load in loads]
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(30)
+        rows.append({
+            "workers": count,
+            "clients": clients,
+            "requests": sum(total["count"] for total in totals),
+            "non_2xx": sum(total["non_2xx"] for total in totals),
+            "req_per_s": sum(total["rps"] for total in totals),
+            "p99_ms": max(total["p99_ms"] for total in totals),
+        })
+    for row in rows:
+        row["scaling"] = row["req_per_s"] / rows[0]["req_per_s"]
+        row["efficiency"] = row["scaling"] / (row["workers"] / rows[0]["workers"])
+    return rows
+
+
+####################
+# 응답 캐시
+####################
+
+@scenario(
+    "response-cache", "GET /users/{user_id} without the cache, on a miss, on a hit and as conditional 304s",
+    arg("--requests", type=int, default=20_000),
+    arg("--concurrency", type=int, default=16),
+    arg("--rounds", type=int, default=3, help="best of this many replays per case"),
+)
+def bench_response_cache(args):
+    import sqlite3
+    import types
+
+    from main import SqliteUserRepository, app, read_user, resources
+
+    # USER_STORE=sqlite:///... 로 돌리면 "users" 풀을 거치는 경로를 잼 (조회할 사용자를 미리 넣어 둠)
+    pool = resources.pools.get("users")
+    if pool is not None:
+        with sqlite3.connect(pool.path) as conn:
+            SqliteUserRepository.setup(conn)
+            conn.execute("INSERT OR REPLACE INTO users VALUES ('gyeore', 'gyeore', 'Gyeore Kim')")
+        conn.close()
+    # 캐시 없는 같은 핸들러를 같은 앱에 붙여서 비교 (함수 객체만 새로 만들어 @cached_response 표시가 없게 함)
+    uncached = types.FunctionType(read_user.__code__, read_user.__globals__, "read_user_uncached",
+                                  read_user.__defaults__, read_user.__closure__)
+    uncached.__annotations__ = read_user.__annotations__
+    app.get("/bench-users/{user_id}")(uncached)
+    cache = read_user.response_cache
+
+    def run(record):
+        return max((replay_app(app, [record], args.requests, args.concurrency) for _ in range(args.rounds)),
+                   key=lambda row: row["rps"])
+
+    ttl = cache.ttl
+    results = {"no cache": run(request("GET", "/bench-users/gyeore"))}
+    # ttl=0 이면 넣자마자 만료되므로 매번 핸들러까지 감 (미리 들어 있던 항목은 비우고 시작)
+    cache.purge()
+    cache.ttl = 0
+    try:
+        results["miss (ttl=0)"] = run(request("GET", "/users/gyeore"))
+    finally:
+        cache.ttl = ttl
+    replay_app(app, [request("GET", "/users/gyeore")], 1, 1)
+    entry = next(iter(cache._entries.values()))
+    last_modified = entry["last_modified"].strftime("%a, %d %b %Y %H:%M:%S GMT")
+    results["hit"] = run(request("GET", "/users/gyeore"))
+    results["304 If-None-Match"] = run(("GET", "/users/gyeore", {"if-none-match": entry["etag"]}, b""))
+    results["304 If-Modified-Since"] = run(("GET", "/users/gyeore", {"if-modified-since": last_modified}, b""))
+    return [
+        {
+            "case": case,
+            "statuses": " ".join(f"{status}:{count}" for status, count in total["statuses"].items()),
+            "req_per_s": total["rps"],
+            "p50_ms": total["p50_ms"],
+            "p99_ms": total["p99_ms"],
+        }
+        for case, total in results.items()
+    ]
+
+
+####################
+# enum 경로 매개변수 직접 디스패치
+####################
+
+@scenario(
+    "enum-dispatch", "GET /models/{model_name} through EnumDispatchApp vs the dynamic validate-and-call route",
+    arg("--requests", type=int, default=20_000),
+    arg("--concurrency", type=int, default=16),
+    arg("--rounds", type=int, default=3, help="best of this many replays per case"),
+)
+def bench_enum_dispatch(args):
+    from main import ModelName, app
+
+    # @prerender_enum_responses 가 없는 같은 핸들러 (예전 동적 경로)
+    @app.get("/bench-models/{model_name}")
+    async def get_model_dynamic(model_name: ModelName):
+        if model_name is ModelName.alexnet:
+            return {"model_name": model_name, "message": "Deep Learning FTW!"}
+        if model_name.value == "lenet":
+            return {"model_name": model_name, "message": "LeCNN all the images"}
+        return {"model_name": model_name, "message": "Have some residuals"}
+
+    rows = []
+    for values in ([member.value for member in ModelName], ["vgg"]):
+        for case, prefix in (("dynamic", "/bench-models/"), ("enum dispatch", "/models/")):
+            records = [request("GET", prefix + value) for value in values]
+            total = max((replay_app(app, records, args.requests, args.concurrency) for _ in range(args.rounds)),
+                        key=lambda row: row["rps"])
+            rows.append({
+                "values": ",".join(values),
+                "case": case,
+                "statuses": " ".join(f"{status}:{count}" for status, count in total["statuses"].items()),
+                "req_per_s": total["rps"],
+                "p50_ms": total["p50_ms"],
+                "p99_ms": total["p99_ms"],
+            })
+    return rows
+
+
+####################
+# 스트리밍 업로드
+####################
+
+UPLOAD_HANDLERS = ("buffered body", "stream")
+
+
+@scenario(
+    "upload-run", "run --clients concurrent uploads of --size-mb each in this process; report MB/s and RSS growth",
+    arg("--handler", choices=UPLOAD_HANDLERS, default="stream"),
+    arg("--size-mb", type=int, default=64),
+    arg("--clients", type=int, default=8),
+    arg("--chunk-kb", type=int, default=64),
+)
+async def bench_upload_run(args):
+    import hashlib
+    import resource
+    import shutil
+    import tempfile
+
+    root = tempfile.mkdtemp(prefix="bench-uploads-")
+    # routers.uploads 는 import 할 때 UPLOAD_DIR 을 읽음
+    os.environ["UPLOAD_DIR"] = root
+    from fastapi import Request
+    from starlette.concurrency import run_in_threadpool
+
+    from main import app, load_lazy_routes
+
+    load_lazy_routes(app)
+
+    # 기존 방식 (bytes = File() 과 같은 모양): 본문 전체를 메모리로 받은 뒤 해시하고 디스크에 씀
+    @app.post("/bench-upload")
+    async def buffered_upload(request: Request):
+        body = await request.body()
+
+        def store():
+            with open(os.path.join(root, os.urandom(8).hex()), "wb") as f:
+                f.write(body)
+            return hashlib.sha256(body).hexdigest()
+
+        return {"size": len(body), "sha256": await run_in_threadpool(store)}
+
+    path = "/uploadfile/stream" if args.handler == "stream" else "/bench-upload"
+    chunk = os.urandom(args.chunk_kb << 10)
+    size = args.size_mb << 20
+
+    async def upload():
+        remaining = size
+        done = asyncio.Event()
+        status = None
+
+        async def receive():
+            nonlocal remaining
+            if done.is_set() or remaining < 0:
+                await done.wait()
+                return {"type": "http.disconnect"}
+            if not remaining:
+                remaining = -1
+                return {"type": "http.request", "body": b"", "more_body": False}
+            body = chunk[:remaining]
+            remaining -= len(body)
+            # 실제 소켓처럼 청크 사이에 다른 업로드가 끼어들 수 있게 함
+            await asyncio.sleep(0)
+            return {"type": "http.request", "body": body, "more_body": True}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                done.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"filename=bench.bin",
+            "root_path": "", "headers": [(b"content-type", b"application/octet-stream"),
+                                         (b"content-length", str(size).encode())],
+            "client": ("127.0.0.1", 50000), "server": ("bench", 80), "state": {},
+        }
+        await app(scope, receive, send)
+        return status
+
+    try:
+        async with app.router.lifespan_context(app):
+            gc.collect()
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            start = time.perf_counter()
+            statuses = await asyncio.gather(*(upload() for _ in range(args.clients)))
+            elapsed = time.perf_counter() - start
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return [{
+        "handler": args.handler,
+        "clients": args.clients,
+        "size_mb": args.size_mb,
+        "statuses": " ".join(f"{status}:{statuses.count(status)}" for status in sorted(set(statuses), key=str)),
+        "seconds": elapsed,
+        "mb_per_s": args.clients * size / elapsed / 1e6,
+        "rss_growth_mb": peak - before,
+        "rss_per_upload_mb": (peak - before) / args.clients,
+    }]
+
+
+@scenario(
+    "uploads", "upload-run for the buffered and streaming handlers, each in a fresh process (peak RSS is per process)",
+    arg("--size-mb", type=int, default=64, help="use 1024 for the 1 GB case (needs clients * size of free disk)"),
+    arg("--clients", type=int_list, default=[1, 8, 32], help="use e.g. 1,10,100 for 100 concurrent clients"),
+)
+def bench_uploads(args):
+    import subprocess
+
+    rows = []
+    for clients in args.clients:
+        for handler in UPLOAD_HANDLERS:
+            output = subprocess.run(
+                [sys.executable, "-m", "bench", "--json", "upload-run", "--handler", handler,
+                 "--size-mb", str(args.size_mb), "--clients", str(clients)],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout
+            rows.extend(json.loads(output))
+    return rows
+
+
+####################
+# 사용자 조회 합치기
+####################
+
+@scenario(
+    "user-coalescing", "Zipf-distributed user lookups: direct repository calls vs CoalescingUserLoader",
+    arg("--users", type=int, default=10_000),
+    arg("--requests", type=int, default=50_000),
+    arg("--concurrency", type=int, default=64),
+    arg("--zipf", type=float, default=1.1, help="Zipf exponent (higher = hotter head)"),
+    arg("--latency-ms", type=float, default=1.0, help="simulated backend round trip per call"),
+)
+async def bench_user_coalescing(args):
+    import itertools
+    import random
+
+    from main import CoalescingUserLoader, ShardedMemoryUserRepository, User
+
+    class RemoteRepository(ShardedMemoryUserRepository):
+        # 원격 저장소처럼 호출마다 왕복 지연을 더함
+        calls = 0
+
+        async def get_many(self, user_ids, conn=None):
+            self.calls += 1
+            await asyncio.sleep(args.latency_ms / 1000)
+            return await super().get_many(user_ids, conn)
+
+    rng = random.Random(0)
+    user_ids = [f"user{i}" for i in range(args.users)]
+    weights = list(itertools.accumulate(1 / (rank + 1) ** args.zipf for rank in range(args.users)))
+    workload = rng.choices(user_ids, cum_weights=weights, k=args.requests)
+
+    async def run(lookup):
+        queue = iter(workload)
+
+        async def worker():
+            for user_id in queue:
+                await lookup(user_id)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        return time.perf_counter() - start
+
+    rows = []
+    for case, ttl in (("direct repository", None), ("coalescing, no cache", 0.0), ("coalescing + 5s cache", 5.0)):
+        repository = RemoteRepository()
+        for user_id in user_ids:
+            await repository.put(user_id, User(username=user_id))
+        if ttl is None:
+            elapsed = await run(lambda user_id: repository.get_many([user_id]))
+        else:
+            elapsed = await run(CoalescingUserLoader(repository, ttl=ttl).get)
+        rows.append({
+            "case": case,
+            "requests": args.requests,
+            "distinct_users": len(set(workload)),
+            "backend_calls": repository.calls,
+            "calls_per_request": repository.calls / args.requests,
+            "req_per_s": args.requests / elapsed,
+        })
+    return rows
+
+
+####################
+# 배치 요청
+####################
+
+@scenario(
+    "batch", "a 50-call screen as 50 separate requests vs one POST /batch",
+    arg("--screens", type=int, default=400),
+    arg("--calls", type=int, default=50, help="sub-requests per screen"),
+    arg("--concurrency", type=int, default=6, help="connections per client, like a mobile HTTP/1.1 client"),
+    arg("--url", help="send over HTTP to a running server (e.g. python -m serve) instead of in process"),
+)
+def bench_batch(args):
+    from main import app, load_lazy_routes
+
+    load_lazy_routes(app)
+    paths = ["/users/gyeore", "/models/alexnet", *(f"/hello/user{i}" for i in range(args.calls))][:args.calls]
+    separate = [request("GET", path) for path in paths]
+    batch = request("POST", "/batch", [{"method": "GET", "path": path} for path in paths])
+    rows = []
+    for case, records, requests in (("separate", separate, args.screens * args.calls), ("batch", [batch], args.screens)):
+        total = replay_app(app, records, requests, args.concurrency, url=args.url)
+        rows.append({
+            "case": case,
+            "http_requests": total["count"],
+            "non_2xx": total["non_2xx"],
+            "screens_per_s": total["rps"] * args.screens / total["count"],
+            "calls_per_s": total["rps"] * args.screens * args.calls / total["count"],
+        })
+    return rows
+
+
+####################
+# 컴파일된 매개변수 검증기
+####################
+
+@scenario(
+    "params-validator", "per-request FilterParams validation: FastAPI's query-model path vs ParamsValidator",
+    arg("--tags", type=int_list, default=[0, 10, 100]),
+    arg("--calls", type=int, default=10_000),
+    arg("--repeat", type=int, default=5),
+)
+def bench_params_validator(args):
+    from typing import Annotated
+
+    from fastapi import Query
+    from fastapi.dependencies.utils import get_dependant, request_params_to_args
+    from starlette.datastructures import QueryParams
+
+    from main import FilterParams, ParamsValidator
+
+    def read_items(filter_query: Annotated[FilterParams, Query()]):
+        pass
+
+    fields = get_dependant(path="/items/", call=read_items).query_params
+    compiled = ParamsValidator(FilterParams, "query")
+    rows = []
+    for count in args.tags:
+        params = QueryParams([("limit", "50"), ("offset", "10"), ("order_by", "updated_at"),
+                              *(("tags", f"tag{i}") for i in range(count))])
+        values, errors = request_params_to_args(fields, params)
+        assert not errors and values["filter_query"] == compiled(params)
+        cases = {
+            "fastapi": lambda: request_params_to_args(fields, params),
+            "compiled": lambda: compiled(params),
+        }
+        for case, fn in cases.items():
+            def run():
+                for _ in range(args.calls):
+                    fn()
+
+            rows.append({
+                "tags": count,
+                "case": case,
+                "us_per_request": best_time(run, args.repeat) / args.calls * 1e6,
+            })
+    return rows
+
+
+####################
+# JSON 응답 직렬화
+####################
+
+@scenario(
+    "json-encode", "JSONResponse(jsonable_encoder(x)) vs render_json(x) for the payloads the app echoes",
+    arg("--sizes", type=int_list, default=[100, 10_000, 100_000]),
+    arg("--repeat", type=int, default=5),
+)
+def bench_json_encode(args):
+    import random
+    from datetime import datetime, timedelta
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from main import Image, StoredItem, orjson, render_json
+
+    rows = []
+    for size in args.sizes:
+        rng = random.Random(size)
+        start = datetime(2024, 1, 1)
+        payloads = {
+            "List[Image]": [Image(url=f"https://cdn.example.com/{i}.png", name=f"image {i}") for i in range(size)],
+            "Dict[int, float]": {rng.randrange(size * 10): rng.random() for _ in range(size)},
+            "item dicts": [
+                {"id": i, "item_name": f"item {i}", "created_at": start + timedelta(seconds=i),
+                 "updated_at": start + timedelta(seconds=i), "tags": ["a", "b"]}
+                for i in range(size)
+            ],
+            "StoredItem models": [
+                StoredItem(id=i, item_name=f"item {i}", created_at=start, updated_at=start, tags=["a"])
+                for i in range(size)
+            ],
+        }
+        for payload, content in payloads.items():
+            assert JSONResponse(jsonable_encoder(content)).body == render_json(content)
+            baseline = best_time(lambda: JSONResponse(jsonable_encoder(content)).body, args.repeat)
+            fast = best_time(lambda: render_json(content), args.repeat)
+            rows.append({
+                "payload": payload,
+                "size": size,
+                "backend": "orjson" if orjson is not None else "json",
+                "jsonable_encoder_ms": baseline * 1000,
+                "render_json_ms": fast * 1000,
+                "speedup": baseline / fast,
+                "bytes": len(render_json(content)),
+            })
+    return rows
+
+
+####################
+# 큰 본문 검증 오프로드
+####################
+
+@scenario(
+    "body-offload", "p99 of GET /hello/{name} while large Dict[int, float] bodies are posted: inline vs offloaded",
+    arg("--entries", type=int, default=50_000, help="entries per POST /index-weights/ body"),
+    arg("--requests", type=int, default=1_000),
+    arg("--rate", type=float, default=50.0,
+        help="open-loop arrivals per second; latency counts from the scheduled send time, so time spent "
+             "queued behind a blocked event loop shows up (a closed loop in process would hide it)"),
+    arg("--heavy", type=int, default=1, help="large posts per GET /hello/{name} in the mix"),
+    arg("--light", type=int, default=4),
+)
+def bench_body_offload(args):
+    import random
+
+    import main
+
+    rng = random.Random(0)
+    body = {str(rng.randrange(args.entries * 10)): rng.random() for _ in range(args.entries)}
+    light = request("GET", "/hello/world")
+    records = [*[request("POST", "/index-weights/", body)] * args.heavy, *[light] * args.light]
+    workers = int(os.environ.get("OFFLOAD_WORKERS", min(4, os.cpu_count() or 1)))
+    rows = []
+    # 같은 라우트를 풀 없이(OFFLOAD_BODY 기본값, 이벤트 루프에서 검증) 돌린 경우와 풀을 켠 경우를 비교
+    for case, kind in (("inline", None), ("offload, process pool", "process"), ("offload, thread pool", "thread")):
+        main.body_offload = main.BodyOffloadPool(workers, kind) if kind is not None else None
+        try:
+            by_route = replay_app(main.app, records, args.requests, rate=args.rate, routes=True)
+        finally:
+            if main.body_offload is not None:
+                main.body_offload.shutdown()
+        for route, row in by_route.items():
+            rows.append({
+                "case": case,
+                "route": route,
+                "count": row["count"],
+                "non_2xx": row["non_2xx"],
+                "p50_ms": row["p50_ms"],
+                "p99_ms": row["p99_ms"],
+                "max_ms": row["max_ms"],
+            })
+    return rows
+
+
+####################
+# 응답 압축
+####################
+
+@scenario(
+    "compression", "compression ratio and CPU time per encoding and profile for echo-style JSON payloads",
+    arg("--sizes", type=int_list, default=[100, 10_000, 100_000], help="images per List[Image] payload"),
+    arg("--chunk", type=int, default=256, help="items per chunk in the streaming case (StreamingListResponse batch)"),
+    arg("--repeat", type=int, default=3),
+)
+def bench_compression(args):
+    from main import COMPRESSION_ENCODERS, COMPRESSION_PROFILES, render_json
+
+    rows = []
+    for size in args.sizes:
+        items = [render_json({"url": f"https://cdn.example.com/assets/{i:06d}.png", "name": f"image {i}"})
+                 for i in range(size)]
+        body = b"[" + b",".join(items) + b"]"
+        chunks = [b",".join(items[i:i + args.chunk]) for i in range(0, size, args.chunk)]
+        for encoding, encoder in COMPRESSION_ENCODERS.items():
+            for profile, levels in COMPRESSION_PROFILES.items():
+                def whole():
+                    return encoder(levels[encoding]).finish(body)
+
+                def streamed():
+                    # 청크마다 flush 하는 스트리밍 경로 (NDJSON 처럼 바로바로 내보낼 때)
+                    stream = encoder(levels[encoding])
+                    return b"".join([*map(stream.compress, chunks), stream.finish()])
+
+                for mode, fn in (("whole", whole), ("streamed", streamed)):
+                    seconds = best_time(fn, args.repeat)
+                    compressed = len(fn())
+                    rows.append({
+                        "images": size,
+                        "bytes": len(body),
+                        "encoding": encoding,
+                        "profile": f"{profile} ({levels[encoding]})",
+                        "mode": mode,
+                        "ratio": len(body) / compressed,
+                        "ms": seconds * 1000,
+                        "mb_per_s": len(body) / seconds / 1e6,
+                    })
+    return rows
+
+
+####################
+# 연결 풀
+####################
+
+@scenario(
+    "connection-pool", "SQLite user lookups through SqlitePool vs opening a connection per request",
+    arg("--requests", type=int, default=5_000),
+    arg("--concurrency", type=int, default=16),
+    arg("--pool-size", type=int, default=8),
+    arg("--users", type=int, default=1_000),
+)
+async def bench_connection_pool(args):
+    import concurrent.futures
+    import random
+    import sqlite3
+    import tempfile
+
+    from main import SqlitePool, SqliteUserRepository
+
+    root = tempfile.mkdtemp(prefix="bench-pool-")
+    path = os.path.join(root, "users.db")
+    with sqlite3.connect(path) as conn:
+        SqliteUserRepository.setup(conn)
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?)",
+                         [(f"user{i}", f"user{i}", f"User {i}") for i in range(args.users)])
+    conn.close()
+    rng = random.Random(0)
+    workload = [f"user{rng.randrange(args.users)}" for _ in range(args.requests)]
+    query = "SELECT user_id, username, full_name FROM users WHERE user_id IN (?)"
+
+    def per_request(user_id):
+        # 풀 이전 방식: 요청마다 SqlitePool._connect 와 같은 설정으로 연결을 열고 닫음
+        conn = sqlite3.connect(path, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            SqliteUserRepository.setup(conn)
+            return conn.execute(query, (user_id,)).fetchall()
+        finally:
+            conn.close()
+
+    async def run(lookup):
+        latencies = []
+        queue = iter(workload)
+
+        async def worker():
+            for user_id in queue:
+                start = time.perf_counter()
+                await lookup(user_id)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return {
+            "req_per_s": len(latencies) / elapsed,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        }
+
+    rows = []
+    try:
+        executor = concurrent.futures.ThreadPoolExecutor(args.pool_size)
+        loop = asyncio.get_running_loop()
+        rows.append({"case": "connection per request",
+                     **await run(lambda user_id: loop.run_in_executor(executor, per_request, user_id))})
+        executor.shutdown()
+
+        pool = SqlitePool(path, setup=SqliteUserRepository.setup, min_size=1, max_size=args.pool_size)
+        repository = SqliteUserRepository(pool)
+        await pool.open()
+        try:
+            rows.append({"case": "SqlitePool", **await run(lambda user_id: repository.get_many([user_id]))})
+            rows[-1]["connections_opened"] = pool.created
+        finally:
+            await pool.close()
+    finally:
+        for name in os.listdir(root):
+            os.unlink(os.path.join(root, name))
+        os.rmdir(root)
+    rows[0]["connections_opened"] = args.requests
+    return rows
+
+
+####################
+# 세션 조회
+####################
+
+@scenario(
+    "session-lookup",
+    "session lookups: SessionStore.get and the current_session dependency on LRU hits, decode, SQLite misses, "
+    "and GET /sessions/me at a concurrency above the session pool size",
+    arg("--sessions", type=int_list, default=[10_000, 100_000]),
+    arg("--lookups", type=int, default=200_000),
+    arg("--requests", type=int, default=20_000),
+    arg("--concurrency", type=int, default=64),
+    arg("--repeat", type=int, default=5),
+)
+async def bench_session_lookup(args):
+    import random
+    from contextlib import asynccontextmanager
+
+    from main import Session, app, current_session, resources, session_store
+    from replay import AsgiClient, RouteLabels, replay
+
+    async def best_async(fn, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    # FastAPI 가 yield 의존성을 푸는 방식 그대로: 요청마다 resources.depends("sessions") 를 열고 current_session 을 부른 뒤 닫음
+    acquire_sessions = asynccontextmanager(resources.depends("sessions").dependency)
+    pool = session_store.pool
+    rows = []
+    async with app.router.lifespan_context(app):
+        for count in args.sessions:
+            session_store.cache.clear()
+            sessions = [await session_store.create(f"user{i}", {"theme": "dark", "n": i}) for i in range(count)]
+            # 다른 워커가 바꿨는지 SQLite 로 다시 확인하는 주기(SESSION_REVALIDATE)가 측정 중에 오지 않게 함
+            for session in sessions:
+                session.verified_until = float("inf")
+            rng = random.Random(count)
+            ids = [rng.choice(sessions).session_id for _ in range(args.lookups)]
+            get = session_store.get
+
+            async def hits():
+                # 적중하면 get 안에서 await 가 없으므로 이벤트 루프를 거치지 않음 (코루틴 생성/실행 비용은 포함)
+                for session_id in ids:
+                    await get(session_id)
+
+            async def dependency_hits():
+                for session_id in ids:
+                    async with acquire_sessions() as conn:
+                        await current_session(conn, session_id)
+
+            payload = sessions[0].encode()
+            decode_calls = args.lookups // 10
+            misses = ids[:2_000]
+
+            async def misses_sqlite():
+                for session_id in misses:
+                    session_store.cache.pop(session_id, None)
+                    async with acquire_sessions() as conn:
+                        await current_session(conn, session_id)
+
+            created = pool.created
+            results = {
+                "store.get, LRU hit": await best_async(hits, args.repeat) / args.lookups,
+                "current_session dependency, LRU hit": await best_async(dependency_hits, args.repeat) / args.lookups,
+                "decode payload": best_time(
+                    lambda: [Session.decode("x", payload, 0.0) for _ in range(decode_calls)], args.repeat
+                ) / decode_calls,
+                "current_session dependency, miss (SQLite)": await best_async(misses_sqlite, 1) / len(misses),
+            }
+            for case, seconds in results.items():
+                rows.append({"sessions": count, "case": case, "us_per_lookup": seconds * 1e6})
+
+            # 풀 크기보다 많은 인증 요청을 동시에 보내도 LRU 적중이면 연결을 기다리지 않음
+            records = [("GET", "/sessions/me", {"cookie": f"session_id={session_id}"}, b"") for session_id in ids[:1000]]
+            options = argparse.Namespace(requests=args.requests, concurrency=args.concurrency, rate=0.0,
+                                         arrival="uniform")
+            results, elapsed = await replay(AsgiClient(app), records, RouteLabels(app), options)
+            _, total = results.summary(elapsed)
+            rows.append({
+                "sessions": count,
+                "case": f"GET /sessions/me x{args.concurrency} concurrent (pool max {pool.max_size})",
+                "us_per_lookup": elapsed / total["count"] * 1e6,
+                "req_per_s": total["rps"],
+                "non_2xx": total["non_2xx"],
+                "p99_ms": total["p99_ms"],
+                "connections_opened": pool.created - created,
+            })
+    return rows
+
+
+####################
+# 모델 상태 푸시
+####################
+
+def current_rss_mb() -> float:
+    # ru_maxrss 는 줄지 않으므로 지금 RSS 를 /proc 에서 읽음 (리눅스 전용)
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+@scenario(
+    "push-idle", "memory per idle SSE/WebSocket subscriber and fan-out time for one update, in process",
+    arg("--connections", type=int_list, default=[10_000, 50_000]),
+    arg("--kind", choices=("sse", "ws"), default="sse"),
+)
+async def bench_push_idle(args):
+    from main import app, push_broker
+
+    rows = []
+    async with app.router.lifespan_context(app):
+        for count in args.connections:
+            closing = asyncio.Event()
+            received = [0]
+            everyone = asyncio.Event()
+            target = [count]
+
+            def subscriber_scope():
+                if args.kind == "sse":
+                    path = "/models/alexnet/events"
+                    return {
+                        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+                        "root_path": "", "headers": [], "client": ("127.0.0.1", 50000),
+                        "server": ("bench", 80), "state": {},
+                    }
+                path = "/models/alexnet/ws"
+                return {
+                    "type": "websocket", "asgi": {"version": "3.0"}, "http_version": "1.1", "scheme": "ws",
+                    "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+                    "headers": [], "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+                    "subprotocols": [], "state": {},
+                }
+
+            async def connection():
+                connected = False
+
+                async def receive():
+                    nonlocal connected
+                    if args.kind == "ws" and not connected:
+                        connected = True
+                        return {"type": "websocket.connect"}
+                    await closing.wait()
+                    return {"type": "http.disconnect" if args.kind == "sse" else "websocket.disconnect"}
+
+                async def send(message):
+                    if message.get("body") or message.get("text"):
+                        received[0] += 1
+                        if received[0] >= target[0]:
+                            everyone.set()
+
+                await app(subscriber_scope(), receive, send)
+
+            gc.collect()
+            before = current_rss_mb()
+            tasks = [asyncio.ensure_future(connection()) for _ in range(count)]
+            # 모두 구독해서 현재 상태를 한 번씩 받을 때까지
+            await everyone.wait()
+            gc.collect()
+            idle = current_rss_mb()
+
+            everyone.clear()
+            received[0] = 0
+            update = request("PUT", "/models/alexnet/status", {"status": "training", "detail": "epoch 1"})
+            start = time.perf_counter()
+            from replay import AsgiClient
+
+            status = await AsgiClient(app).request(*update)
+            await everyone.wait()
+            fan_out = time.perf_counter() - start
+
+            subscribers = push_broker.stats()["subscribers"]
+            closing.set()
+            await asyncio.gather(*tasks)
+            rows.append({
+                "kind": args.kind,
+                "connections": count,
+                "subscribers": subscribers,
+                "publish_status": status,
+                "rss_growth_mb": idle - before,
+                "kb_per_connection": (idle - before) * 1000 / count,
+                "fan_out_ms": fan_out * 1000,
+            })
+    return rows
+
+
+####################
+# 큰 리스트 응답 스트리밍
+####################
+
+@scenario(
+    "list-response-run", "send one --items list response in this process; report TTFB, total time and RSS growth",
+    arg("--mode", choices=("buffered", "streaming"), default="streaming"),
+    arg("--items", type=int, default=1_000_000),
+    arg("--batch-size", type=int, default=256),
+)
+async def bench_list_response_run(args):
+    import resource
+    from datetime import datetime
+
+    from main import FastJSONResponse, StoredItem, StreamingListResponse
+
+    created = datetime(2024, 1, 1)
+
+    async def items():
+        for i in range(args.items):
+            yield StoredItem.model_construct(id=i, item_name=f"item {i}", created_at=created, updated_at=created,
+                                             tags=["a", "b"])
+
+    stamps = {}
+    received = 0
+    done = asyncio.Event()
+
+    async def receive():
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal received
+        if message["type"] == "http.response.body":
+            if message.get("body"):
+                stamps.setdefault("first_byte", time.perf_counter())
+                received += len(message["body"])
+            if not message.get("more_body", False):
+                done.set()
+
+    scope = {"type": "http", "method": "GET", "path": "/items/export", "headers": []}
+    gc.collect()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    if args.mode == "buffered":
+        # 예전 방식: 리스트를 다 만든 뒤 한 번에 직렬화
+        response = FastJSONResponse([item async for item in items()])
+    else:
+        response = StreamingListResponse(items(), batch_size=args.batch_size)
+    await response(scope, receive, send)
+    end = time.perf_counter()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return [{
+        "mode": args.mode,
+        "items": args.items,
+        "ttfb_ms": (stamps["first_byte"] - start) * 1000,
+        "total_ms": (end - start) * 1000,
+        "response_mb": received / 1e6,
+        "rss_growth_mb": peak - before,
+    }]
+
+
+@scenario(
+    "list-response", "buffered vs StreamingListResponse for a large list, each in a fresh process",
+    arg("--items", type=int_list, default=[10_000, 1_000_000]),
+)
+def bench_list_response(args):
+    import subprocess
+
+    rows = []
+    for items in args.items:
+        for mode in ("buffered", "streaming"):
+            output = subprocess.run(
+                [sys.executable, "-m", "bench", "--json", "list-response-run", "--mode", mode, "--items", str(items)],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout
+            rows.extend(json.loads(output))
+    return rows
+
+
+####################
+# 판별 유니온
+####################
+
+@scenario(
+    "catalog-union", "plain Union vs the type-discriminated catalog union over many CatalogItem variants",
+    arg("--variants", type=int, default=24),
+    arg("--items", type=int, default=10_000),
+    arg("--repeat", type=int, default=5),
+)
+def bench_catalog_union(args):
+    from typing import List, Literal, Union
+
+    from pydantic import TypeAdapter, create_model
+
+    from main import CatalogItem, catalog_union
+
+    # 벤치 전용 변형은 CatalogItem 을 상속해야 하므로 전역 등록표에 들어감: 유니온은 이 목록으로만 만들고 끝나면 등록표를 되돌림
+    # (같은 프로세스에서 다시 돌려도 type 중복 에러가 나지 않고, 앱의 /catalog 유니온에도 섞이지 않음)
+    registered = dict(CatalogItem.variants)
+    try:
+        variants = list(registered.values())
+        for i in range(args.variants - len(variants)):
+            tag = f"kind{i:02d}"
+            variants.append(create_model(f"Bench{tag.title()}Item", __base__=CatalogItem, type=(Literal[tag], tag),
+                                         **{f"{tag}_size": (int, 0)}))
+    finally:
+        CatalogItem.variants.clear()
+        CatalogItem.variants.update(registered)
+    plain = TypeAdapter(List[Union[tuple(variants)]])
+    discriminated = TypeAdapter(List[catalog_union(variants)])
+
+    def payload(classes):
+        rows = []
+        for i in range(args.items):
+            cls = classes[i % len(classes)]
+            row = {"type": cls.model_fields["type"].default, "description": f"item {i}"}
+            row.update({name: 1 for name, field in cls.model_fields.items() if field.is_required() and name not in row})
+            rows.append(row)
+        return json.dumps(rows).encode()
+
+    rows = []
+    for mix, classes in (("all variants", variants), ("last variant only", variants[-1:])):
+        body = payload(classes)
+        models = discriminated.validate_json(body)
+        assert plain.dump_json(plain.validate_json(body)) == discriminated.dump_json(models)
+        for case, adapter in (("plain Union", plain), ("discriminated", discriminated)):
+            validate = best_time(lambda: adapter.validate_json(body), args.repeat)
+            dump = best_time(lambda: adapter.dump_json(models), args.repeat)
+            rows.append({
+                "variants": len(variants),
+                "mix": mix,
+                "case": case,
+                "validate_us_per_item": validate / args.items * 1e6,
+                "serialize_us_per_item": dump / args.items * 1e6,
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench")
+    parser.add_argument("--json", action="store_true", help="print rows as JSON")
+    subparsers = parser.add_subparsers(dest="scenario", required=True)
+    for name, (_, help, arguments) in SCENARIOS.items():
+        subparser = subparsers.add_parser(name, help=help)
+        for flags, kwargs in arguments:
+            subparser.add_argument(*flags, **kwargs)
+    args = parser.parse_args(argv)
+    result = SCENARIOS[args.scenario][0](args)
+    if inspect.iscoroutine(result):
+        result = asyncio.run(result)
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    else:
+        print_table(result)
+
+
+if __name__ == "__main__":
+    main()
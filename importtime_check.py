@@ -0,0 +1,64 @@
+# 콜드 스타트 import 시간 점검: python -m importtime_check
+# 새 인터프리터에서 python -X importtime -c "import main" 을 여러 번 돌려 main 의 누적 import 시간(최솟값)을 재고
+# importtime_baseline.json 의 기준값보다 tolerance 이상 느려지면 실패함 (--update 로 기준값 갱신)
+# 가장 오래 걸린 모듈(자체 시간 기준)도 함께 출력해서 어디서 늘었는지 바로 볼 수 있게 함
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "importtime_baseline.json")
+
+
+def measure(module: str):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(BASELINE_PATH),
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    total = next(cumulative for name, _, cumulative in modules if name == module)
+    return total, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m importtime_check")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--update", action="store_true")
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    total, modules = min(runs, key=lambda run: run[0])
+    print(f"import {args.module}: {total / 1000:.1f} ms (best of {args.runs})")
+    for name, self_us, _ in sorted(modules, key=lambda m: m[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:7.1f} ms  {name}")
+
+    if args.update:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({args.module: total}, f, indent=2)
+            f.write("\n")
+        return 0
+    try:
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)[args.module]
+    except (FileNotFoundError, KeyError):
+        print("no baseline (run with --update)", file=sys.stderr)
+        return 1
+    limit = baseline * (1 + args.tolerance)
+    if total > limit:
+        print(f"regression: {total / 1000:.1f} ms > {limit / 1000:.1f} ms "
+              f"(baseline {baseline / 1000:.1f} ms + {args.tolerance:.0%})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
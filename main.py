@@ -1,13 +1,51 @@
-from datetime import datetime, timedelta, time
-from typing import Union, List, Literal, Annotated, Set, Dict, Any
+import asyncio
+import base64
+import bisect
+import concurrent.futures
+import copy
+import functools
+import hashlib
+import importlib
+import inspect
+import itertools
+import json
+import marshal
+import math
+import mmap
+import multiprocessing
+import operator
+import os
+import pathlib
+import random
+import re
+import secrets
+import sqlite3
+import struct
+import sys
+import threading
+import zlib
+from collections import Counter, OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from time import monotonic, perf_counter_ns, time as unix_time
+from typing import Union, List, Literal, Annotated, Set, Dict, Any, ClassVar, get_origin
+from urllib.parse import quote
 from uuid import UUID
 
-from pydantic import *
-from fastapi import *
+from pydantic import BaseModel, Field, HttpUrl, TypeAdapter, ValidationError, field_validator
+from fastapi import Body, Cookie, Depends, FastAPI, HTTPException, Query, Request, Response, WebSocket
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from enum import Enum
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+from fastapi.utils import is_body_allowed_for_status_code
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.routing import BaseRoute, Match
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 class ModelName(str, Enum):
@@ -15,10 +53,69 @@ class ModelName(str, Enum):
     resnet = "resnet"
     lenet = "lenet"
 
+# 검증이 끝난 URL 문자열 -> HttpUrl 을 담아두는 LRU 캐시 (같은 CDN URL이 반복되는 배치에서 재파싱을 건너뜀)
+# URL_CACHE_SIZE 환경변수로 켜고 크기를 정함 (0이면 꺼짐, import 할 때 한 번 읽음). HttpUrl은 불변이라 여러 요청이 같은 객체를 공유해도 안전함
+class ValidatedUrlCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            url = self._data.get(key)
+            if url is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return url
+
+    def put(self, key: str, url):
+        with self._lock:
+            self._data[key] = url
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.maxsize > 0,
+                "maxsize": self.maxsize,
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+url_cache = ValidatedUrlCache(int(os.environ.get("URL_CACHE_SIZE", "0")))
+
+
 class Image(BaseModel):
     url: HttpUrl
     name: str
 
+    # 캐시가 꺼져 있으면 wrap validator 자체를 붙이지 않음 (붙이기만 해도 호출 비용이 들어서 기본 HttpUrl 검증만 쓰게 함)
+    if url_cache.maxsize > 0:
+        @field_validator("url", mode="wrap")
+        @classmethod
+        def _cached_url(cls, value, handler):
+            if type(value) is not str:
+                return handler(value)
+            url = url_cache.get(value)
+            if url is None:
+                url = handler(value)
+                url_cache.put(value, url)
+            return url
+
 # class Item(BaseModel):
 #     name: str
 #     description: str | None = Field(
@@ -63,17 +160,2432 @@ class Cookies(BaseModel):
     fatebook_tracker: str | None = None
     googall_tracker: str | None = None
 
-app = FastAPI()
+# 연결 풀: 연결을 만들고/확인하고/닫는 방법만 하위 클래스가 정하고, 빌려주기/돌려받기/정리는 여기서 처리
+# min_size 개는 lifespan 시작 때 미리 열고 max_size 까지 늘어남 (모두 빌려준 상태면 acquire_timeout 까지 기다림)
+# 놀던 연결은 가장 최근 것부터 빌려주므로 오래 안 쓰인 연결이 뒤에 남고, check_after 넘게 놀았던 연결은 빌려주기 전에 check() 로 확인
+# 백그라운드 정리 작업이 idle_timeout 넘게 논 연결을 min_size 까지 닫고, 모자라면 다시 채움
+class ConnectionPool:
+    def __init__(self, min_size: int = 1, max_size: int = 10, idle_timeout: float = 300.0,
+                 check_after: float = 30.0, acquire_timeout: float = 10.0):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.acquire_timeout = acquire_timeout
+        self._idle = deque()
+        self._slots = asyncio.Semaphore(max_size)
+        self._size = 0
+        self._maintenance = None
+        self.created = 0
+        self.closed = 0
+        self.failed_checks = 0
+
+    async def connect(self):
+        raise NotImplementedError
+
+    async def check(self, conn) -> bool:
+        return True
+
+    async def disconnect(self, conn):
+        pass
+
+    async def open(self):
+        await self._fill()
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    async def close(self):
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            self._maintenance = None
+        while self._idle:
+            await self._discard(self._idle.popleft()[0])
+
+    @asynccontextmanager
+    async def acquire(self):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except TimeoutError:
+            raise HTTPException(status_code=503, detail="Connection pool exhausted")
+        try:
+            conn = await self._take()
+        except BaseException:
+            self._slots.release()
+            raise
+        try:
+            yield conn
+        finally:
+            self._idle.append((conn, monotonic()))
+            self._slots.release()
+
+    @asynccontextmanager
+    async def connection(self, conn=None):
+        # 요청이 resources.depends 로 받은 PooledConnection 을 넘기면 그 연결을 (처음이면 이때 빌려서) 쓰고,
+        # 없으면 (백그라운드 작업 등) 여기서 빌렸다가 바로 돌려줌
+        if conn is not None:
+            yield await conn.get() if isinstance(conn, PooledConnection) else conn
+            return
+        async with self.acquire() as conn:
+            yield conn
+
+    async def _take(self):
+        now = monotonic()
+        while self._idle:
+            conn, last_used = self._idle.pop()
+            if now - last_used < self.check_after or await self._healthy(conn):
+                return conn
+            self.failed_checks += 1
+            await self._discard(conn)
+        self._size += 1
+        try:
+            conn = await self.connect()
+        except BaseException:
+            self._size -= 1
+            raise
+        self.created += 1
+        return conn
+
+    async def _healthy(self, conn) -> bool:
+        try:
+            return await self.check(conn)
+        except Exception:
+            return False
+
+    async def _discard(self, conn):
+        self._size -= 1
+        self.closed += 1
+        try:
+            await self.disconnect(conn)
+        except Exception:
+            pass
+
+    async def _fill(self):
+        while self._size < self.min_size:
+            self._size += 1
+            try:
+                conn = await self.connect()
+            except BaseException:
+                self._size -= 1
+                raise
+            self.created += 1
+            self._idle.append((conn, monotonic()))
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, self.check_after) / 2)
+            now = monotonic()
+            # 가장 오래 논 연결이 deque 앞쪽에 있음
+            while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+                await self._discard(self._idle.popleft()[0])
+            try:
+                await self._fill()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": self._size - len(self._idle),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "created": self.created,
+            "closed": self.closed,
+            "failed_checks": self.failed_checks,
+        }
+
+
+class PooledConnection:
+    # 요청 하나가 쓰는 연결 자리: 처음 get() 할 때 풀에서 빌리고, 요청이 끝나면 (resources.depends 의존성 정리) 돌려줌
+    # 캐시에서 끝나는 요청(세션 LRU 적중 등)은 연결을 빌리지 않으므로 풀 크기가 그런 요청의 동시성을 제한하지 않음
+    # 한 요청 안의 여러 조회/쓰기는 같은 연결을 씀 (인메모리 DB 처럼 연결이 하나뿐인 풀에서 자기 자신을 기다리지 않음)
+    __slots__ = ("pool", "_lease", "_conn", "_lock")
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self._lease = None
+        self._conn = None
+        self._lock = None
+
+    async def get(self):
+        if self._conn is not None:
+            return self._conn
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._conn is None:
+                lease = self.pool.acquire()
+                self._conn = await lease.__aenter__()
+                self._lease = lease
+        return self._conn
+
+    @property
+    def acquired(self) -> bool:
+        return self._conn is not None
+
+    async def release(self):
+        lease, self._lease, self._conn = self._lease, None, None
+        if lease is not None:
+            await lease.__aexit__(None, None, None)
+
+
+class SqliteConnection:
+    # 한 번에 한 요청만 빌려 쓰므로 연결 하나의 호출은 겹치지 않음. 블로킹 호출은 풀 전용 스레드에서
+    def __init__(self, conn: sqlite3.Connection, executor):
+        self.conn = conn
+        self.executor = executor
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, self.conn, *args)
+
+    async def execute(self, sql: str, params=()) -> list:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def commit(self, sql: str, params=()):
+        def write(conn):
+            with conn:
+                conn.execute(sql, params)
+
+        await self.run(write)
+
+
+class SqlitePool(ConnectionPool):
+    def __init__(self, path: str, setup=None, **kwargs):
+        if path == ":memory:":
+            # 인메모리 DB 는 연결마다 따로이므로 연결 하나만 계속 씀
+            kwargs.update(min_size=1, max_size=1)
+        super().__init__(**kwargs)
+        self.path = path
+        self.setup = setup
+        self.executor = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        if self.setup is not None:
+            self.setup(conn)
+        return conn
+
+    async def connect(self):
+        # 스레드는 close() 때 정리하고, 다시 열면 (테스트에서 lifespan 을 여러 번 도는 경우 등) 새로 만듦
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(self.max_size, thread_name_prefix="sqlite")
+        conn = await asyncio.get_running_loop().run_in_executor(self.executor, self._connect)
+        return SqliteConnection(conn, self.executor)
+
+    async def check(self, conn) -> bool:
+        return await conn.execute("SELECT 1") == [(1,)]
+
+    async def disconnect(self, conn):
+        await conn.run(sqlite3.Connection.close)
+
+    async def close(self):
+        await super().close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+# 앱 전체 리소스 목록: lifespan 에서 한꺼번에 열고 닫음
+# resources.depends(name) 은 이름마다 같은 의존성 함수를 돌려주므로, 한 요청 안에서 여러 매개변수/하위 의존성이 같은 풀을 요구해도
+# FastAPI 의 요청 단위 의존성 캐시 덕분에 PooledConnection 은 하나만 생김. 연결은 실제로 쓸 때 빌리고 엔드포인트 함수가 끝나면 (응답 전송 전) 바로 돌려줌
+# 저장소 메서드는 이 손잡이를 conn 으로 받아서 pool.connection(conn) 으로 씀. 등록되지 않은 이름(예: memory 저장소의 "users")은 None
+class Resources:
+    def __init__(self):
+        self.pools = {}
+        self._dependencies = {}
+
+    def add(self, name: str, pool: ConnectionPool) -> ConnectionPool:
+        self.pools[name] = pool
+        return pool
+
+    async def open(self):
+        for pool in self.pools.values():
+            await pool.open()
+
+    async def close(self):
+        for pool in self.pools.values():
+            await pool.close()
+
+    def depends(self, name: str):
+        dependency = self._dependencies.get(name)
+        if dependency is None:
+            async def dependency():
+                pool = self.pools.get(name)
+                if pool is None:
+                    yield None
+                    return
+                conn = PooledConnection(pool)
+                try:
+                    yield conn
+                finally:
+                    await conn.release()
+
+            dependency.__name__ = f"acquire_{name}"
+            dependency = self._dependencies[name] = Depends(dependency, scope="function")
+        return dependency
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+resources = Resources()
+
+# 사용자 저장소: 같은 인터페이스(get_many)를 가진 구현을 USER_STORE 환경변수로 고름
+#   memory (기본값)          -> 샤드별 dict 로 나눈 인메모리 저장소
+#   sqlite:///path/users.db  -> SQLite (resources 의 "users" 연결 풀 사용)
+class UserRepository:
+    async def get_many(self, user_ids: List[str], conn=None) -> Dict[str, User]:
+        raise NotImplementedError
+
+    async def put(self, user_id: str, user: User, conn=None):
+        raise NotImplementedError
+
+
+class ShardedMemoryUserRepository(UserRepository):
+    def __init__(self, shards: int = 16):
+        self.shards = [{} for _ in range(shards)]
+
+    def _shard(self, user_id: str) -> dict:
+        return self.shards[hash(user_id) % len(self.shards)]
+
+    async def get_many(self, user_ids, conn=None):
+        found = {}
+        for user_id in user_ids:
+            user = self._shard(user_id).get(user_id)
+            if user is not None:
+                found[user_id] = user
+        return found
+
+    async def put(self, user_id, user, conn=None):
+        self._shard(user_id)[user_id] = user
+
+
+class SqliteUserRepository(UserRepository):
+    def __init__(self, pool: SqlitePool):
+        self.pool = pool
+
+    @staticmethod
+    def setup(conn: sqlite3.Connection):
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, username TEXT NOT NULL, full_name TEXT)"
+            )
+
+    async def get_many(self, user_ids, conn=None):
+        user_ids = list(user_ids)
+        found = {}
+        async with self.pool.connection(conn) as conn:
+            # SQLite 의 바인딩 변수 개수 제한 때문에 나눠서 조회
+            for start in range(0, len(user_ids), 500):
+                batch = user_ids[start:start + 500]
+                rows = await conn.execute(
+                    f"SELECT user_id, username, full_name FROM users WHERE user_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+                for user_id, username, full_name in rows:
+                    found[user_id] = User(username=username, full_name=full_name)
+        return found
+
+    async def put(self, user_id, user, conn=None):
+        async with self.pool.connection(conn) as conn:
+            await conn.commit(
+                "INSERT OR REPLACE INTO users (user_id, username, full_name) VALUES (?, ?, ?)",
+                (user_id, user.username, user.full_name),
+            )
+
+
+class CoalescingUserLoader:
+    # 앞단의 TTL 읽기 캐시(없는 사용자도 캐시) + single-flight:
+    # 같은 user_id 를 동시에 찾는 요청들은 진행 중인 조회 태스크 하나를 함께 기다림
+    # 조회는 처음 요청한 쪽과 따로 도는 태스크라서 그 요청이 취소돼도 계속 진행되고, 대기자에게는 결과나 Exception 만 전달됨
+    def __init__(self, repository: UserRepository, ttl: float = 5.0, maxsize: int = 100_000):
+        self.repository = repository
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.backend_calls = 0
+        self._cache = OrderedDict()
+        self._inflight = {}
+
+    async def get(self, user_id: str, conn=None) -> User | None:
+        return (await self.get_many([user_id], conn)).get(user_id)
+
+    async def get_many(self, user_ids: List[str], conn=None) -> Dict[str, User]:
+        now = monotonic()
+        found = {}
+        waiting = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            cached = self._cache.get(user_id)
+            if cached is not None and cached[0] > now:
+                self._cache.move_to_end(user_id)
+                if cached[1] is not None:
+                    found[user_id] = cached[1]
+            elif user_id in self._inflight:
+                waiting.setdefault(self._inflight[user_id], []).append(user_id)
+            else:
+                missing.append(user_id)
+
+        if missing:
+            task = asyncio.ensure_future(self._fetch(missing, conn))
+            for user_id in missing:
+                self._inflight[user_id] = task
+            try:
+                loaded = await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # 조회가 이 요청이 빌린 연결을 쓰는 중이면 끝날 때까지 돌려주지 않음
+                if conn is not None:
+                    await asyncio.wait([task])
+                raise
+            self._collect(found, missing, loaded)
+
+        for task, ids in waiting.items():
+            self._collect(found, ids, await asyncio.shield(task))
+        return found
+
+    async def _fetch(self, user_ids: List[str], conn):
+        self.backend_calls += 1
+        try:
+            loaded = await self.repository.get_many(user_ids, conn)
+        except Exception as exc:
+            return exc
+        finally:
+            for user_id in user_ids:
+                self._inflight.pop(user_id, None)
+        expires = monotonic() + self.ttl
+        for user_id in user_ids:
+            self._remember(user_id, loaded.get(user_id), expires)
+        return loaded
+
+    @staticmethod
+    def _collect(found: dict, user_ids: List[str], loaded):
+        if isinstance(loaded, Exception):
+            raise loaded
+        for user_id in user_ids:
+            user = loaded.get(user_id)
+            if user is not None:
+                found[user_id] = user
+
+    def _remember(self, user_id, user, expires):
+        self._cache[user_id] = (expires, user)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._cache.pop(user_id, None)
+
+
+def create_user_repository(url: str) -> UserRepository:
+    if url.startswith("sqlite:///"):
+        pool = SqlitePool(
+            url[len("sqlite:///"):], setup=SqliteUserRepository.setup,
+            min_size=int(os.environ.get("USER_POOL_MIN", "1")), max_size=int(os.environ.get("USER_POOL_MAX", "8")),
+        )
+        return SqliteUserRepository(resources.add("users", pool))
+    if url == "memory":
+        repository = ShardedMemoryUserRepository()
+        for user_id, full_name in (("gyeore", "Gyeore Kim"), ("haneul", "Haneul Lee")):
+            repository._shard(user_id)[user_id] = User(username=user_id, full_name=full_name)
+        return repository
+    raise ValueError(f"Unknown USER_STORE: {url}")
+
+
+user_loader = CoalescingUserLoader(create_user_repository(os.environ.get("USER_STORE", "memory")))
+
+# 세션 저장소: session_id 쿠키 -> Session
+# 1단계: 프로세스 안 LRU. Session 객체를 그대로 들고 있어서 적중하면 dict 조회 + 시각 비교 몇 번으로 끝남 (디코딩 없음)
+# 2단계: SQLite 파일 (resources 의 "sessions" 풀). 값은 msgpack 형식 바이너리 (msgpack 이 없으면 아래의 작은 구현을 씀, 형식은 같음)
+# 슬라이딩 만료: 접근할 때마다 expires 만 늘리고, 타이머 휠이 칸을 돌면서 아직 안 끝난 세션은 새 칸으로 다시 넣음 (키마다 타이머 없음)
+# 늘어난 만료 시각은 ttl 의 10% 이상 벌어졌을 때만 모아서 SQLite 에 씀
+# 다른 워커에서 지운(로그아웃) 세션을 오래 믿지 않도록 LRU 항목은 revalidate 초가 지나면 SQLite 에서 다시 읽음
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_MSGPACK_FIXED = {
+    0xCA: struct.Struct(">f"), 0xCB: struct.Struct(">d"),
+    0xCC: struct.Struct(">B"), 0xCD: struct.Struct(">H"), 0xCE: struct.Struct(">I"), 0xCF: struct.Struct(">Q"),
+    0xD0: struct.Struct(">b"), 0xD1: struct.Struct(">h"), 0xD2: struct.Struct(">i"), 0xD3: struct.Struct(">q"),
+}
+# 형식 바이트 -> (길이 필드, 종류)
+_MSGPACK_SIZED = {
+    0xC4: (struct.Struct(">B"), "bin"), 0xC5: (struct.Struct(">H"), "bin"), 0xC6: (struct.Struct(">I"), "bin"),
+    0xD9: (struct.Struct(">B"), "str"), 0xDA: (struct.Struct(">H"), "str"), 0xDB: (struct.Struct(">I"), "str"),
+    0xDC: (struct.Struct(">H"), "array"), 0xDD: (struct.Struct(">I"), "array"),
+    0xDE: (struct.Struct(">H"), "map"), 0xDF: (struct.Struct(">I"), "map"),
+}
+
+
+def _pack_header(out: bytearray, n: int, fix: int, fix_limit: int, wide: tuple):
+    if n < fix_limit:
+        out.append(fix | n)
+    elif wide[0] is not None and n <= 0xFF:
+        out.append(wide[0])
+        out.append(n)
+    elif n <= 0xFFFF:
+        out.append(wide[1])
+        out += n.to_bytes(2, "big")
+    else:
+        out.append(wide[2])
+        out += n.to_bytes(4, "big")
+
+
+def _pack(value, out: bytearray):
+    if value is None:
+        out.append(0xC0)
+    elif value is True:
+        out.append(0xC3)
+    elif value is False:
+        out.append(0xC2)
+    elif isinstance(value, int):
+        if -32 <= value <= 0x7F:
+            out.append(value & 0xFF)
+        elif value > 0:
+            for code in (0xCC, 0xCD, 0xCE, 0xCF):
+                if value < 1 << (8 * _MSGPACK_FIXED[code].size):
+                    out.append(code)
+                    out += _MSGPACK_FIXED[code].pack(value)
+                    return
+            raise ValueError("integer out of range")
+        else:
+            for code in (0xD0, 0xD1, 0xD2, 0xD3):
+                if value >= -(1 << (8 * _MSGPACK_FIXED[code].size - 1)):
+                    out.append(code)
+                    out += _MSGPACK_FIXED[code].pack(value)
+                    return
+            raise ValueError("integer out of range")
+    elif isinstance(value, float):
+        out.append(0xCB)
+        out += _MSGPACK_FIXED[0xCB].pack(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        _pack_header(out, len(data), 0xA0, 32, (0xD9, 0xDA, 0xDB))
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        _pack_header(out, len(value), 0, 0, (0xC4, 0xC5, 0xC6))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        _pack_header(out, len(value), 0x90, 16, (None, 0xDC, 0xDD))
+        for item in value:
+            _pack(item, out)
+    elif isinstance(value, dict):
+        _pack_header(out, len(value), 0x80, 16, (None, 0xDE, 0xDF))
+        for key, item in value.items():
+            _pack(key, out)
+            _pack(item, out)
+    else:
+        raise TypeError(f"Cannot pack {type(value).__name__}")
+
+
+def _unpack(data: bytes, pos: int):
+    code = data[pos]
+    pos += 1
+    if code <= 0x7F:
+        return code, pos
+    if code >= 0xE0:
+        return code - 0x100, pos
+    if code >= 0xA0 and code <= 0xBF:
+        end = pos + (code & 0x1F)
+        return data[pos:end].decode("utf-8"), end
+    if code >= 0x80 and code <= 0x9F:
+        return _unpack_container(data, pos, code & 0x0F, "map" if code <= 0x8F else "array")
+    if code == 0xC0:
+        return None, pos
+    if code == 0xC2 or code == 0xC3:
+        return code == 0xC3, pos
+    fixed = _MSGPACK_FIXED.get(code)
+    if fixed is not None:
+        return fixed.unpack_from(data, pos)[0], pos + fixed.size
+    length, kind = _MSGPACK_SIZED[code]
+    n = length.unpack_from(data, pos)[0]
+    pos += length.size
+    if kind == "str":
+        return data[pos:pos + n].decode("utf-8"), pos + n
+    if kind == "bin":
+        return bytes(data[pos:pos + n]), pos + n
+    return _unpack_container(data, pos, n, kind)
+
+
+def _unpack_container(data: bytes, pos: int, n: int, kind: str):
+    if kind == "array":
+        items = []
+        for _ in range(n):
+            item, pos = _unpack(data, pos)
+            items.append(item)
+        return items, pos
+    items = {}
+    for _ in range(n):
+        key, pos = _unpack(data, pos)
+        items[key], pos = _unpack(data, pos)
+    return items, pos
+
+
+def packb(value) -> bytes:
+    if msgpack is not None:
+        return msgpack.packb(value, use_bin_type=True)
+    out = bytearray()
+    _pack(value, out)
+    return bytes(out)
+
+
+def unpackb(data: bytes):
+    if msgpack is not None:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    value, pos = _unpack(data, 0)
+    if pos != len(data):
+        raise ValueError("Extra data after msgpack value")
+    return value
+
+
+class Session:
+    __slots__ = ("session_id", "user_id", "data", "created", "expires", "stored_expires", "verified_until")
+
+    def __init__(self, session_id: str, user_id: str, data: dict, created: float, expires: float):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.data = data
+        self.created = created
+        self.expires = expires
+        self.stored_expires = expires
+        self.verified_until = 0.0
+
+    def encode(self) -> bytes:
+        return packb((self.user_id, self.created, self.data))
+
+    @classmethod
+    def decode(cls, session_id: str, payload: bytes, expires: float):
+        user_id, created, data = unpackb(payload)
+        return cls(session_id, user_id, data, created, expires)
+
+
+class TimerWheel:
+    # tick 초짜리 칸이 원형으로 이어진 바퀴. 항목은 마감 시각이 속한 칸에 넣기만 하고(O(1)),
+    # advance() 가 지나간 칸들을 비우면서 마감이 지난 항목은 돌려주고 아직 남은(슬라이딩으로 늘어난) 항목은 새 칸에 다시 넣음
+    def __init__(self, tick: float, slots: int):
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.current = int(unix_time() // tick)
+
+    def schedule(self, item, deadline: float):
+        index = max(int(deadline // self.tick), self.current + 1)
+        self.slots[index % len(self.slots)].append(item)
+
+    def advance(self, now: float, deadline_of) -> list:
+        target = int(now // self.tick)
+        items = []
+        # 오래 멈춰 있었더라도 바퀴를 한 바퀴 넘게 돌 필요는 없음
+        for step in range(1, min(target - self.current, len(self.slots)) + 1):
+            index = (self.current + step) % len(self.slots)
+            items.extend(self.slots[index])
+            self.slots[index] = []
+        self.current = max(self.current, target)
+        expired = []
+        for item in items:
+            deadline = deadline_of(item)
+            if deadline is None:
+                continue
+            if deadline <= now:
+                expired.append(item)
+            else:
+                self.schedule(item, deadline)
+        return expired
+
+
+class SessionStore:
+    def __init__(self, pool: SqlitePool, ttl: float = 1800.0, maxsize: int = 100_000,
+                 revalidate: float = 5.0, tick: float = 1.0):
+        self.pool = pool
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.revalidate = revalidate
+        self.cache = OrderedDict()
+        self.wheel = TimerWheel(tick, int(ttl // tick) + 2)
+        self.dirty = {}
+        self._maintenance = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def setup(conn: sqlite3.Connection):
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(session_id TEXT PRIMARY KEY, expires REAL NOT NULL, payload BLOB NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+
+    async def get(self, session_id: str, conn=None) -> Session | None:
+        session = self.cache.get(session_id)
+        if session is not None:
+            now = unix_time()
+            if session.expires > now and session.verified_until > monotonic():
+                self.hits += 1
+                self.cache.move_to_end(session_id)
+                session.expires = now + self.ttl
+                if session.expires - session.stored_expires > self.ttl * 0.1:
+                    self.dirty[session_id] = session
+                return session
+        self.misses += 1
+        return await self._load(session_id, conn)
+
+    async def _load(self, session_id: str, conn=None) -> Session | None:
+        now = unix_time()
+        async with self.pool.connection(conn) as conn:
+            rows = await conn.execute(
+                "SELECT expires, payload FROM sessions WHERE session_id = ? AND expires > ?", (session_id, now)
+            )
+        if not rows:
+            self._forget(session_id)
+            return None
+        stored_expires, payload = rows[0]
+        fresh = Session.decode(session_id, payload, stored_expires)
+        session = self.cache.get(session_id)
+        if session is None:
+            session = fresh
+            session.expires = now + self.ttl
+            self._remember(session)
+        else:
+            # 다른 워커가 바꾼 data 만 반영하고 객체는 그대로 둠 (휠에 이미 들어 있으므로 다시 넣지 않음)
+            session.user_id, session.data = fresh.user_id, fresh.data
+            session.stored_expires = stored_expires
+            session.expires = now + self.ttl
+            session.verified_until = monotonic() + self.revalidate
+            self.cache.move_to_end(session_id)
+        if abs(session.expires - session.stored_expires) > self.ttl * 0.1:
+            self.dirty[session_id] = session
+        return session
+
+    def _remember(self, session: Session):
+        session.verified_until = monotonic() + self.revalidate
+        self.cache[session.session_id] = session
+        self.cache.move_to_end(session.session_id)
+        self.wheel.schedule(session, session.expires)
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def _forget(self, session_id: str):
+        self.cache.pop(session_id, None)
+        self.dirty.pop(session_id, None)
+
+    async def create(self, user_id: str, data: dict | None = None, conn=None) -> Session:
+        now = unix_time()
+        session = Session(secrets.token_urlsafe(32), user_id, data or {}, now, now + self.ttl)
+        await self.save(session, conn)
+        self._remember(session)
+        return session
+
+    async def save(self, session: Session, conn=None):
+        async with self.pool.connection(conn) as conn:
+            await conn.commit(
+                "INSERT OR REPLACE INTO sessions (session_id, expires, payload) VALUES (?, ?, ?)",
+                (session.session_id, session.expires, session.encode()),
+            )
+        session.stored_expires = session.expires
+        self.dirty.pop(session.session_id, None)
+
+    async def delete(self, session_id: str, conn=None):
+        self._forget(session_id)
+        async with self.pool.connection(conn) as conn:
+            await conn.commit("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _deadline(self, session: Session):
+        return session.expires if self.cache.get(session.session_id) is session else None
+
+    async def start(self):
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            self._maintenance = None
+        await self._flush()
+
+    async def _flush(self):
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, {}
+        updates = [(session.expires, session.session_id) for session in dirty.values()]
+
+        def write(conn):
+            with conn:
+                conn.executemany("UPDATE sessions SET expires = MAX(expires, ?) WHERE session_id = ?", updates)
+
+        async with self.pool.acquire() as conn:
+            await conn.run(write)
+        for session in dirty.values():
+            session.stored_expires = max(session.stored_expires, session.expires)
+
+    async def _maintain(self):
+        ticks = 0
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            for session in self.wheel.advance(unix_time(), self._deadline):
+                self._forget(session.session_id)
+            ticks += 1
+            try:
+                await self._flush()
+                # 다른 워커가 만든 세션까지 포함해서 만료된 행은 가끔 한꺼번에 지움
+                if ticks % 60 == 0:
+                    async with self.pool.acquire() as conn:
+                        await conn.commit("DELETE FROM sessions WHERE expires <= ?", (unix_time(),))
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {"size": len(self.cache), "hits": self.hits, "misses": self.misses, "dirty": len(self.dirty)}
+
+
+session_store = SessionStore(
+    resources.add("sessions", SqlitePool(
+        os.environ.get("SESSION_DB", "sessions.db"), setup=SessionStore.setup,
+        min_size=1, max_size=int(os.environ.get("SESSION_POOL_MAX", "4")),
+    )),
+    ttl=float(os.environ.get("SESSION_TTL", "1800")),
+    revalidate=float(os.environ.get("SESSION_REVALIDATE", "5")),
+)
+
+
+async def current_session(
+    conn: Annotated[PooledConnection, resources.depends("sessions")],
+    session_id: Annotated[str | None, Cookie()] = None,
+) -> Session | None:
+    # LRU 에 있으면 연결을 빌리지 않고 끝남 (conn 은 적중하지 않았을 때만 실제로 빌림)
+    if session_id is None:
+        return None
+    return await session_store.get(session_id, conn)
+
+
+async def require_session(session: Annotated[Session | None, Depends(current_session)]) -> Session:
+    if session is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return session
+
+# 모양이 고정된 JSON 응답을 미리 바이트로 인코딩해 두고, 요청마다 매개변수만 이스케이프해서 끼워 넣음
+# 문자열 값 안의 {이름} 자리만 채울 수 있음. 자리가 없으면 시작 시 한 번만 인코딩한 바이트를 그대로 씀
+class JsonTemplate:
+    _slot = re.compile(r"\{(\w+)\}")
+
+    def __init__(self, content: dict, status_code: int = 200):
+        encoded = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+        parts = self._slot.split(encoded)
+        self.literals = [part.encode() for part in parts[0::2]]
+        self.slots = parts[1::2]
+        self.status_code = status_code
+        self.static_body = self.literals[0] if not self.slots else None
+
+    def render_bytes(self, **values) -> bytes:
+        if self.static_body is not None:
+            return self.static_body
+        chunks = [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            # 문자열 안에 들어가므로 json.dumps 결과에서 양쪽 따옴표만 떼어냄
+            chunks.append(json.dumps(str(values[slot]), ensure_ascii=False)[1:-1].encode())
+            chunks.append(literal)
+        return b"".join(chunks)
+
+    def render(self, **values) -> Response:
+        return Response(self.render_bytes(**values), status_code=self.status_code, media_type="application/json")
+
+
+root_template = JsonTemplate({"message": "Hello World"})
+hello_template = JsonTemplate({"message": "Hello {name}"})
+user_me_template = JsonTemplate({"user_id": "the current user"})
+
+
+# 라우트 응답 캐시: 직렬화된 응답 바이트를 경로+쿼리 키로 TTL/LRU 캐시에 저장
+# 강한 ETag 와 Last-Modified 를 붙이고, If-None-Match / If-Modified-Since 가 맞으면 핸들러를 부르지 않고 304 로 응답함
+# 조회는 의존성 해결 전에 하므로 적중하면 연결을 빌리지 않음 (처음 한 번은 FastAPI 가 검증하므로 잘못된 값은 캐시되지 않고 여전히 422)
+class ResponseCache:
+    def __init__(self, name: str, ttl: float, maxsize: int):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry["expires"] <= monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, response: Response):
+        entry = _response_entry(response)
+        entry["expires"] = monotonic() + self.ttl
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def purge(self, prefix: str | None = None) -> int:
+        if prefix is None:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+        keys = [key for key in self._entries if key[0].startswith(prefix)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "ttl": self.ttl,
+            "maxsize": self.maxsize,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+response_caches: Dict[str, ResponseCache] = {}
+
+
+def _response_entry(response: Response):
+    body = bytes(response.body)
+    return {
+        "body": body,
+        "status_code": response.status_code,
+        "media_type": response.headers.get("content-type"),
+        "etag": '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+        "last_modified": datetime.now(timezone.utc).replace(microsecond=0),
+    }
+
+
+def _not_modified(request: Request, entry) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match 가 있으면 If-Modified-Since 는 무시 (RFC 9110)
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or entry["etag"] in tags or f"W/{entry['etag']}" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return entry["last_modified"] <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _cached_response(request: Request, entry, ttl: float) -> Response:
+    headers = {
+        "ETag": entry["etag"],
+        "Last-Modified": format_datetime(entry["last_modified"], usegmt=True),
+        "Cache-Control": f"max-age={int(ttl)}",
+    }
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(entry["body"], status_code=entry["status_code"], headers=headers, media_type=entry["media_type"])
+
+
+def cached_response(ttl: float = 60, maxsize: int = 1024):
+    # 표시만 하고 실제 캐시 조회는 InstrumentedRoute 가 FastAPI 핸들러 앞에서 함 (_cached_handler)
+    def decorator(func):
+        func.response_cache = response_caches[func.__name__] = ResponseCache(func.__name__, ttl, maxsize)
+        return func
+
+    return decorator
+
+
+def _cached_handler(handler, cache: ResponseCache):
+    # 적중하면 의존성(연결 풀 등)과 매개변수 검증을 전혀 거치지 않고 바로 응답함
+    # 캐시 항목은 같은 경로+쿼리가 한 번 검증을 통과해서 200 을 돌려준 경우에만 생기므로 검증을 건너뛰어도 결과가 같음
+    async def cached(request: Request):
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+        entry = cache.get(key)
+        if entry is None:
+            response = await handler(request)
+            if response.status_code != 200 or not hasattr(response, "body") or response.background is not None:
+                return response
+            entry = cache.put(key, response)
+        return _cached_response(request, entry, cache.ttl)
+
+    return cached
+
+
+# Enum 경로 매개변수 하나만 받는 라우트는 가능한 응답이 멤버 수만큼으로 닫혀 있음
+# 시작 시(lifespan) 멤버마다 핸들러를 한 번씩 불러 응답 바이트를 미리 만들어 두고, 요청은 dict 조회 한 번으로 바로 보냄
+# 멤버가 아닌 값은 원래 라우트로 넘겨서 지금과 같은 422 응답을 받음
+def prerender_enum_responses(max_age: int = 300):
+    def decorator(func):
+        func.prerender_enum_max_age = max_age
+        return func
+
+    return decorator
+
+
+class EnumDispatchApp:
+    def __init__(self, param: str, entries: dict, max_age: int, fallback):
+        self.param = param
+        self.entries = entries
+        self.max_age = max_age
+        self.fallback = fallback
+        self.raw_headers = {}
+        for value, entry in entries.items():
+            self.raw_headers[value] = [
+                (b"content-length", str(len(entry["body"])).encode()),
+                (b"content-type", entry["media_type"].encode()),
+                (b"etag", entry["etag"].encode()),
+                (b"last-modified", format_datetime(entry["last_modified"], usegmt=True).encode()),
+                (b"cache-control", f"max-age={max_age}".encode()),
+            ]
+
+    async def __call__(self, scope, receive, send):
+        value = scope["path_params"].get(self.param)
+        entry = self.entries.get(value)
+        if entry is None:
+            await self.fallback(scope, receive, send)
+            return
+        for name, _ in scope["headers"]:
+            if name in (b"if-none-match", b"if-modified-since"):
+                await _cached_response(Request(scope), entry, self.max_age)(scope, receive, send)
+                return
+        await send({"type": "http.response.start", "status": entry["status_code"], "headers": self.raw_headers[value]})
+        await send({"type": "http.response.body", "body": entry["body"]})
+
+
+async def compile_enum_routes(app: FastAPI):
+    for route in app.router.routes:
+        max_age = getattr(getattr(route, "endpoint", None), "prerender_enum_max_age", None)
+        if max_age is None or not isinstance(route, APIRoute) or route.response_model is not None:
+            continue
+        dependant = route.dependant
+        if len(dependant.path_params) != 1 or dependant.query_params or dependant.header_params \
+                or dependant.cookie_params or dependant.body_params or dependant.dependencies:
+            continue
+        field = dependant.path_params[0]
+        enum_cls = field.field_info.annotation
+        if not (isinstance(enum_cls, type) and issubclass(enum_cls, Enum)):
+            continue
+
+        # response_class 를 따로 지정하지 않았으면 DefaultPlaceholder 로 감싸져 있음
+        response_class = getattr(route.response_class, "value", route.response_class)
+        entries = {}
+        for member in enum_cls:
+            result = route.endpoint(**{field.name: member})
+            if inspect.isawaitable(result):
+                result = await result
+            if not isinstance(result, Response):
+                result = response_class(jsonable_encoder(result), status_code=route.status_code or 200)
+            entries[str(member.value)] = _response_entry(result)
+        # lifespan 이 여러 번 돌아도(테스트, 같은 프로세스에서 다시 시작) 이미 감싼 앱을 또 감싸지 않도록 원래 앱을 감쌈
+        fallback = route.app.fallback if isinstance(route.app, EnumDispatchApp) else route.app
+        route.app = EnumDispatchApp(field.alias, entries, max_age, fallback)
+
+
+# 푸시 채널: 토픽(모델 이름)별 구독자에게 메시지를 나눠주는 프로세스 안 브로커 (serve.py 워커마다 따로 있음)
+# 메시지는 발행할 때 한 번만 직렬화하고 같은 PushMessage 객체(JSON 텍스트 + SSE 프레임 bytes)를 모든 구독자가 공유함
+# 구독자마다 큐는 queue_size 개로 제한하고, 꽉 찬 구독자(못 따라오는 느린 클라이언트)는 메시지를 버리는 대신 구독을 끊음
+#   -> 다시 연결하면 최신 상태부터 다시 받으므로 상태 채널에서는 중간 메시지를 놓쳐도 괜찮음
+# 놀고 있는 연결 하나가 쓰는 것은 Subscriber 하나(빈 리스트 + 필드 몇 개)와 끊김을 기다리는 태스크 하나뿐이고,
+# SSE 하트비트도 연결마다 타이머를 두지 않고 브로커가 한 번에 돌면서 넣음
+class PushMessage:
+    __slots__ = ("text", "sse")
+
+    def __init__(self, text: str | None, event_id=None, sse: bytes | None = None):
+        self.text = text
+        if sse is None:
+            sse = (f"id: {event_id}\n" if event_id is not None else "") + f"data: {text}\n\n"
+            sse = sse.encode("utf-8")
+        self.sse = sse
+
+
+# 웹소켓은 서버가 ping 을 보내므로 하트비트는 SSE 구독자에게만 넣음 (text 가 None 이면 웹소켓으로는 보내지 않음)
+HEARTBEAT = PushMessage(None, sse=b": ping\n\n")
+
+
+class Subscriber:
+    __slots__ = ("queue", "queue_size", "waiter", "closed", "dropped", "heartbeat")
+
+    def __init__(self, queue_size: int, heartbeat: bool):
+        self.queue = []
+        self.queue_size = queue_size
+        self.waiter = None
+        self.closed = False
+        self.dropped = False
+        self.heartbeat = heartbeat
+
+    def push(self, message: PushMessage) -> bool:
+        if len(self.queue) >= self.queue_size:
+            return False
+        self.queue.append(message)
+        self._wake()
+        return True
+
+    def close(self, dropped: bool = False):
+        self.closed = True
+        self.dropped = self.dropped or dropped
+        self._wake()
+
+    def _wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self) -> list | None:
+        # 쌓인 메시지를 한꺼번에 돌려줌 (SSE 는 한 번의 send 로 묶어서 보냄). 구독이 끝났으면 None
+        while not self.queue and not self.closed:
+            self.waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+        if self.closed:
+            return None
+        messages, self.queue = self.queue, []
+        return messages
+
+
+class PushBroker:
+    def __init__(self, queue_size: int = 16, heartbeat: float = 15.0):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.topics = {}
+        self.latest = {}
+        self.published = 0
+        self.dropped = 0
+        self._heartbeat_task = None
+
+    def subscribe(self, topic, heartbeat: bool = False) -> Subscriber:
+        subscriber = Subscriber(self.queue_size, heartbeat)
+        self.topics.setdefault(topic, set()).add(subscriber)
+        latest = self.latest.get(topic)
+        if latest is not None:
+            subscriber.push(latest)
+        return subscriber
+
+    def unsubscribe(self, topic, subscriber: Subscriber):
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.topics[topic]
+
+    def publish(self, topic, message: PushMessage):
+        self.latest[topic] = message
+        self.published += 1
+        slow = [subscriber for subscriber in self.topics.get(topic, ()) if not subscriber.push(message)]
+        for subscriber in slow:
+            self.dropped += 1
+            subscriber.close(dropped=True)
+            self.unsubscribe(topic, subscriber)
+
+    async def start(self):
+        if self.heartbeat > 0:
+            self._heartbeat_task = asyncio.create_task(self._beat())
+
+    async def stop(self):
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        for subscribers in list(self.topics.values()):
+            for subscriber in list(subscribers):
+                subscriber.close()
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            for subscribers in self.topics.values():
+                for subscriber in subscribers:
+                    if subscriber.heartbeat and not subscriber.queue:
+                        subscriber.push(HEARTBEAT)
+
+    async def serve(self, topic, receive, write, heartbeat: bool = False) -> Subscriber:
+        # write(messages) 는 묶음 하나를 보내는 함수. send 가 막히면(클라이언트가 느리면) 그동안 큐가 차서 결국 구독이 끊김
+        subscriber = self.subscribe(topic, heartbeat)
+        # 연결이 끊긴 것은 receive 로만 알 수 있으므로 끊김을 기다리는 태스크를 하나 둠
+        watcher = asyncio.ensure_future(_wait_disconnect(receive))
+        watcher.add_done_callback(lambda _: subscriber.close())
+        try:
+            while (messages := await subscriber.get()) is not None:
+                await write(messages)
+        finally:
+            watcher.cancel()
+            self.unsubscribe(topic, subscriber)
+        return subscriber
+
+    def stats(self) -> dict:
+        return {
+            "topics": len(self.topics),
+            "subscribers": sum(len(subscribers) for subscribers in self.topics.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] in ("http.disconnect", "websocket.disconnect"):
+            return
+
+
+# 응답을 오래(또는 끝없이) 흘려보내는 라우트 표시. /batch 처럼 하위 응답을 끝까지 모아서 돌려주는 곳에서는 호출하지 않음
+def streaming_route(func):
+    func.streaming_route = True
+    return func
+
+
+class EventStreamResponse(Response):
+    # text/event-stream 응답: 본문 길이가 없고 브로커 구독이 끝날 때까지 계속 보냄
+    media_type = "text/event-stream"
+
+    def __init__(self, broker: PushBroker, topic, status_code: int = 200):
+        self.broker = broker
+        self.topic = topic
+        self.status_code = status_code
+        self.background = None
+        self.init_headers({"cache-control": "no-cache", "x-accel-buffering": "no"})
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        async def write(messages):
+            body = messages[0].sse if len(messages) == 1 else b"".join(message.sse for message in messages)
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+
+        try:
+            await self.broker.serve(self.topic, receive, write, heartbeat=True)
+        except OSError:
+            return
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+push_broker = PushBroker(
+    queue_size=int(os.environ.get("PUSH_QUEUE_SIZE", "16")),
+    heartbeat=float(os.environ.get("PUSH_HEARTBEAT", "15")),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await compile_enum_routes(app)
+    await resources.open()
+    await session_store.start()
+    await push_broker.start()
+    await latency_metrics.start()
+    yield
+    await latency_metrics.stop()
+    await push_broker.stop()
+    await session_store.stop()
+    await resources.close()
+    if body_offload is not None:
+        body_offload.shutdown()
+
+# 라우트별/단계별 지연 시간 히스토그램
+# 단계: routing(미들웨어 진입 ~ 라우트 핸들러 시작), validation(본문 읽기 + 매개변수 검증), handler(엔드포인트 함수),
+#       serialization(반환값 -> Response), total(응답 전송 완료까지)
+# 기록은 이벤트 루프 스레드에서만 하므로 락 없이 카운터만 올림. /metrics 에서 Prometheus 텍스트 형식으로 내보냄
+# serve.py 로 띄우면 모든 워커의 값을 합쳐서, uvicorn 등으로 직접 띄우면 그 프로세스의 값만 내보냄
+# METRICS=0 이면 미들웨어와 라우트/엔드포인트 타이밍 래퍼를 아예 붙이지 않음 (python -m bench metrics-overhead 의 비교 기준)
+METRICS_ENABLED = os.environ.get("METRICS", "1") != "0"
+_request_timings = ContextVar("request_timings", default=None)
+
+
+class LatencyHistogram:
+    # HDR 스타일 로그-선형 버킷: 2의 거듭제곱 구간마다 하위 버킷 8개 (상대 오차 12.5% 이내), 단위는 마이크로초
+    SUB_BUCKETS = 8
+    MAX_VALUE = (1 << 36) - 1
+    EXPORT_BOUNDS = [1 << k for k in range(4, 27)]
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (self.index(self.MAX_VALUE) + 1)
+        self.count = 0
+        self.sum = 0
+
+    @classmethod
+    def index(cls, value: int) -> int:
+        shift = value.bit_length() - 4
+        if shift <= 0:
+            return value
+        return shift * cls.SUB_BUCKETS + (value >> shift)
+
+    def record(self, micros: int):
+        self.record_many((micros,))
+
+    @classmethod
+    def bucket(cls, micros: int) -> int:
+        # micros - 1 로 버킷을 고르면 버킷이 (하한, 상한] 이 되어 Prometheus 의 le(이하) 경계와 맞음
+        return cls.index(min(max(micros - 1, 0), cls.MAX_VALUE))
+
+    def record_many(self, values):
+        if not values:
+            return
+        # 대부분의 값은 BUCKETS 표(약 65ms 까지) 한 번 조회로 버킷을 찾고, Counter 로 같은 버킷끼리 묶어서 더함
+        try:
+            indexes = Counter(map(_LATENCY_BUCKETS.__getitem__, values))
+        except IndexError:
+            indexes = Counter(map(self.bucket, values))
+        counts = self.counts
+        for index, count in indexes.items():
+            counts[index] += count
+        self.count += len(values)
+        self.sum += sum(values)
+
+    def cumulative(self):
+        # le 경계를 2의 거듭제곱으로 두면 HDR 버킷 경계와 정확히 맞아떨어짐: bound 이하인 값은 index(bound - 1) 버킷까지
+        counts = self.counts
+        running = 0
+        start = 0
+        for bound in self.EXPORT_BOUNDS:
+            end = self.index(bound - 1) + 1
+            running += sum(counts[start:end])
+            start = end
+            yield bound, running
+
+
+def _latency_bucket_table(size: int) -> list:
+    # micros -> 버킷 번호 표 (record_many 에서 씀). 버킷 하나가 연속된 구간이므로 구간 단위로 채움
+    table = [0]
+    value = 0
+    while len(table) < size:
+        width = 1 << max(value.bit_length() - 4, 0)
+        table.extend([LatencyHistogram.index(value)] * width)
+        value += width
+    del table[size:]
+    return table
+
+
+_LATENCY_BUCKETS = _latency_bucket_table(1 << 16)
+
+
+class LatencyMetrics:
+    phases = ("routing", "validation", "handler", "serialization", "total")
+
+    # 요청 경로에서는 (라우트, 메서드)별 평평한 int 목록에 시각 6개를 이어 붙이기만 함 (timings 목록 자체는 바로 버려짐)
+    # 구간 계산과 버킷 집계는 키마다 FLUSH_EVERY 개씩 모아서 슬라이스로 열을 뽑은 뒤 map/Counter 로 한 번에 함
+    FLUSH_EVERY = 1024
+    _FLUSH_ROWS = FLUSH_EVERY * 6
+    # serve.py 로 띄우면 워커마다 익명 공유 메모리 한 칸에 자기 히스토그램을 marshal 로 써 두고 (1초마다, /metrics 때),
+    # /metrics 는 모든 칸을 합쳐서 내보냄. 칸 머리 = (seq, 길이): 쓰는 동안 seq 가 홀수라서 읽는 쪽이 찢어진 값을 건너뜀
+    SEGMENT_SIZE = 1 << 20
+    PUBLISH_INTERVAL = 1.0
+    _HEADER = struct.Struct("QI")
+
+    def __init__(self):
+        self.histograms = {}
+        self.pending = {}
+        self.shared = None
+        self.slot = None
+        self._publisher = None
+
+    def observe(self, scope, timings):
+        route = scope.get("route")
+        key = (route.path if route is not None else "<unmatched>", scope["method"])
+        rows = self.pending.get(key)
+        if rows is None:
+            rows = self.pending[key] = []
+        rows.extend(timings)
+        if len(rows) >= self._FLUSH_ROWS:
+            del self.pending[key]
+            self._record(key, rows)
+
+    def flush(self):
+        pending, self.pending = self.pending, {}
+        for key, rows in pending.items():
+            self._record(key, rows)
+
+    def _record(self, key, rows):
+        histograms = self.histograms.get(key)
+        if histograms is None:
+            histograms = self.histograms[key] = {phase: LatencyHistogram() for phase in self.phases}
+        start, end = rows[0::6], rows[5::6]
+        histograms["total"].record_many(_elapsed_micros(end, start))
+        # 라우트/엔드포인트를 거치지 않은 요청(0)은 그 구간에서 뺌
+        # (404, 검증 실패 422, 미리 렌더링한 열거형 응답, 계측하지 않는 스트리밍 엔드포인트 ...)
+        route_start = rows[1::6]
+        if not any(route_start):
+            return
+        handler_start, handler_end, route_end = rows[2::6], rows[3::6], rows[4::6]
+        if not all(route_start):
+            start, route_start, handler_start, handler_end, route_end = _where(
+                route_start, start, route_start, handler_start, handler_end, route_end
+            )
+        histograms["routing"].record_many(_elapsed_micros(route_start, start))
+        if not all(handler_start):
+            route_start, handler_start, handler_end, route_end = _where(
+                handler_start, route_start, handler_start, handler_end, route_end
+            )
+        if handler_start:
+            histograms["validation"].record_many(_elapsed_micros(handler_start, route_start))
+            histograms["handler"].record_many(_elapsed_micros(handler_end, handler_start))
+            histograms["serialization"].record_many(_elapsed_micros(route_end, handler_end))
+
+    def share(self, workers: int):
+        # serve.py 가 fork 하기 전에 부름
+        import mmap
+
+        self.shared = mmap.mmap(-1, workers * self.SEGMENT_SIZE)
+
+    def attach(self, slot: int):
+        # fork 된 워커가 자기 칸을 맡음. 죽은 워커의 칸을 이어받으면 그 값에서 이어서 세므로 합계가 줄어들지 않음
+        self.slot = slot
+        self.histograms = {}
+        self.pending = {}
+        self._merge(self.histograms, self._read(slot))
+
+    async def start(self):
+        if self.slot is not None:
+            self._publisher = asyncio.create_task(self._publish_periodically())
+
+    async def stop(self):
+        if self._publisher is not None:
+            self._publisher.cancel()
+            self._publisher = None
+            self.flush()
+            self.publish()
+
+    async def _publish_periodically(self):
+        while True:
+            await asyncio.sleep(self.PUBLISH_INTERVAL)
+            self.flush()
+            self.publish()
+
+    def publish(self):
+        state = {
+            key: {
+                phase: (histogram.count, histogram.sum, tuple(itertools.compress(enumerate(histogram.counts), histogram.counts)))
+                for phase, histogram in histograms.items() if histogram.count
+            }
+            for key, histograms in self.histograms.items()
+        }
+        payload = marshal.dumps(state)
+        if len(payload) > self.SEGMENT_SIZE - self._HEADER.size:
+            return
+        offset = self.slot * self.SEGMENT_SIZE
+        seq = self._HEADER.unpack_from(self.shared, offset)[0]
+        self._HEADER.pack_into(self.shared, offset, seq + 1, 0)
+        start = offset + self._HEADER.size
+        self.shared[start:start + len(payload)] = payload
+        self._HEADER.pack_into(self.shared, offset, seq + 2, len(payload))
+
+    def _read(self, slot: int) -> dict:
+        offset = slot * self.SEGMENT_SIZE
+        start = offset + self._HEADER.size
+        for _ in range(100):
+            seq, length = self._HEADER.unpack_from(self.shared, offset)
+            if seq % 2:
+                continue
+            payload = self.shared[start:start + length]
+            if self._HEADER.unpack_from(self.shared, offset)[0] == seq:
+                return marshal.loads(payload) if length else {}
+        return {}
+
+    def _merge(self, into: dict, state: dict):
+        for key, phases in state.items():
+            histograms = into.get(key)
+            if histograms is None:
+                histograms = into[key] = {phase: LatencyHistogram() for phase in self.phases}
+            for phase, (count, total, buckets) in phases.items():
+                histogram = histograms[phase]
+                histogram.count += count
+                histogram.sum += total
+                counts = histogram.counts
+                for index, n in buckets:
+                    counts[index] += n
+
+    def render_prometheus(self) -> str:
+        self.flush()
+        histograms = self.histograms
+        if self.slot is not None:
+            self.publish()
+            histograms = {}
+            for slot in range(len(self.shared) // self.SEGMENT_SIZE):
+                self._merge(histograms, self._read(slot))
+        name = "http_request_phase_seconds"
+        lines = [
+            f"# HELP {name} Request latency by route and phase.",
+            f"# TYPE {name} histogram",
+        ]
+        for (path, method), phases in list(histograms.items()):
+            for phase, histogram in phases.items():
+                if not histogram.count:
+                    continue
+                labels = f'route="{_prometheus_escape(path)}",method="{method}",phase="{phase}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound / 1e6}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum / 1e6:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _elapsed_micros(ends, starts) -> list:
+    return list(map(operator.floordiv, map(operator.sub, ends, starts), itertools.repeat(1000)))
+
+
+def _where(mask, *columns):
+    # mask 가 0 이 아닌 행만 남긴 열들
+    keep = list(map(bool, mask))
+    return [list(itertools.compress(column, keep)) for column in columns]
+
+
+def _prometheus_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+latency_metrics = LatencyMetrics()
+
+
+class MetricsMiddleware:
+    # BaseHTTPMiddleware 를 쓰지 않는 순수 ASGI 미들웨어 (요청마다 태스크/스트림을 새로 만들지 않음)
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # [시작, 라우트 시작, 엔드포인트 시작, 엔드포인트 끝, 라우트 끝, 끝] (0 = 거치지 않음). dict 보다 만들고 채우기 싸서 list
+        # 요청마다 자기 태스크(컨텍스트 복사본)에서 돌므로 끝나고 되돌려 놓지 않음. 같은 태스크의 다음 요청은 여기서 새 값으로 덮어씀
+        timings = [perf_counter_ns(), 0, 0, 0, 0, 0]
+        _request_timings.set(timings)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            timings[5] = perf_counter_ns()
+            latency_metrics.observe(scope, timings)
+
+
+def _timed_endpoint(endpoint):
+    if inspect.isasyncgenfunction(endpoint) or inspect.isgeneratorfunction(endpoint):
+        return endpoint
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            timings = _request_timings.get()
+            if timings is None:
+                return await endpoint(*args, **kwargs)
+            timings[2] = perf_counter_ns()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                timings[3] = perf_counter_ns()
+    else:
+        # 동기 엔드포인트는 스레드풀에서 돌지만 컨텍스트가 복사되므로 같은 timings dict 에 기록됨
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            timings = _request_timings.get()
+            if timings is None:
+                return endpoint(*args, **kwargs)
+            timings[2] = perf_counter_ns()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                timings[3] = perf_counter_ns()
+    return timed
+
+
+# 요청 제한: 클라이언트 x 라우트별 토큰 버킷 (@rate_limit 로 표시한 라우트만)
+# 버킷 상태는 import 시점에 만든 익명 공유 메모리(mmap)에 두므로 serve.py 가 fork 한 워커들이 같은 버킷을 나눠 씀 (외부 저장소 없음)
+# 슬롯 = (키 해시, 남은 토큰, 마지막 갱신 시각) 24바이트. 키 해시로 고른 PROBES 칸짜리 그룹 안에서만 찾고, 없으면 가장 오래된 칸을 재사용
+# 그룹마다 fork 로 물려받는 multiprocessing.Lock 하나를 씀 (그룹 수 > 락 수라서 락을 나눠 씀)
+class SharedTokenBuckets:
+    SLOT = struct.Struct("Qdd")
+    PROBES = 4
+
+    def __init__(self, slots: int = 65536, locks: int = 64):
+        self.groups = max(1, slots // self.PROBES)
+        self.memory = mmap.mmap(-1, self.groups * self.PROBES * self.SLOT.size)
+        self.locks = [multiprocessing.Lock() for _ in range(locks)]
+
+    def acquire(self, key: str, rate: float, burst: float, cost: float = 1.0, block: bool = True) -> float | None:
+        # 토큰을 가져가면 0, 모자라면 다시 시도할 수 있을 때까지 남은 초
+        # block=False 면 락을 바로 못 잡을 때 기다리지 않고 None 을 돌려줌 (이벤트 루프에서 부르는 경로)
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        group = digest % self.groups
+        lock = self.locks[group % len(self.locks)]
+        if not block:
+            if not lock.acquire(block=False):
+                return None
+        # 락을 쥔 채 죽은 워커가 있어도 나머지가 멈추지 않도록 잠깐만 기다리고 못 잡으면 통과시킴
+        elif not lock.acquire(timeout=0.05):
+            return 0.0
+        try:
+            now = monotonic()
+            memory, slot = self.memory, self.SLOT
+            offset = victim = group * self.PROBES * slot.size
+            victim_last = None
+            for offset in range(offset, offset + self.PROBES * slot.size, slot.size):
+                slot_key, tokens, last = slot.unpack_from(memory, offset)
+                if slot_key == digest:
+                    tokens = min(burst, tokens + (now - last) * rate)
+                    break
+                if victim_last is None or last < victim_last:
+                    victim, victim_last = offset, last
+            else:
+                offset, tokens = victim, burst
+            if tokens >= cost:
+                slot.pack_into(memory, offset, digest, tokens - cost, now)
+                return 0.0
+            slot.pack_into(memory, offset, digest, tokens, now)
+            return (cost - tokens) / rate
+        finally:
+            lock.release()
+
+
+token_buckets = SharedTokenBuckets(int(os.environ.get("TOKEN_BUCKET_SLOTS", "65536")))
+
+
+def rate_limit(rate: float, burst: float | None = None):
+    # rate: 초당 채워지는 토큰 수, burst: 버킷 크기 (한 번에 몰아서 보낼 수 있는 요청 수)
+    def decorator(func):
+        func.rate_limit = (rate, burst or rate)
+        return func
+
+    return decorator
+
+
+def _rate_limited(handler, route_key: str, rate: float, burst: float):
+    # 본문을 읽고 검증하기 전에 거르므로 제한에 걸린 요청은 거의 비용이 들지 않음
+    async def limited(request: Request):
+        client = request.client.host if request.client else "-"
+        key = f"{client} {route_key}"
+        retry_after = token_buckets.acquire(key, rate, burst, block=False)
+        if retry_after is None:
+            # 다른 워커가 락을 쥐고 있으면 기다리는 일은 스레드에서 해서 이벤트 루프를 막지 않음
+            retry_after = await run_in_threadpool(token_buckets.acquire, key, rate, burst)
+        if retry_after:
+            raise HTTPException(
+                status_code=429, detail="Too Many Requests", headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+        return await handler(request)
+
+    return limited
+
+
+# 수용 제어: 워커당 동시 처리 요청 수를 제한하고, 넘치는 요청은 크기가 정해진 대기열에서 queue_timeout 까지만 기다림
+# 대기열이 가득 찼거나 시간 안에 자리가 나지 않으면 바로 503 으로 돌려보내서 밀린 요청 때문에 지연이 끝없이 늘어나지 않게 함
+# 요청 하나가 자리 하나지만, 안에서 여러 요청을 동시에 돌리는 라우트(/batch)는 scope["admission"] 으로 자리를 더 잡음 (admit/release)
+# 여러 자리는 한 번에 잡거나 못 잡으므로 배치끼리 자리를 나눠 쥐고 서로 기다리는 일이 없고, 대기열은 도착 순서대로 풀림
+class AdmissionMiddleware:
+    def __init__(self, app, max_concurrency: int, max_queue: int, queue_timeout: float, exempt=(),
+                 exempt_pattern: str | None = None):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.exempt = frozenset(exempt)
+        # 오래 열려 있는 스트림(SSE 구독 등)은 자리를 계속 차지하므로 세지 않음
+        self.exempt_pattern = re.compile(exempt_pattern) if exempt_pattern else None
+        self.active = 0
+        self._waiters = deque()
+        self.shed = 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or self.max_concurrency <= 0
+            or scope["path"] in self.exempt or scope.get("subrequest")
+            or (self.exempt_pattern is not None and self.exempt_pattern.fullmatch(scope["path"]))
+        ):
+            await self.app(scope, receive, send)
+            return
+        if not await self.admit(1):
+            await self.reject(scope, receive, send)
+            return
+        scope["admission"] = self
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.release(1)
+
+    async def admit(self, weight: int) -> bool:
+        # weight 개 자리를 한꺼번에 잡음. 대기열이 가득 찼거나 queue_timeout 안에 못 잡으면 False (shed 는 호출한 쪽에서 셈)
+        weight = min(weight, self.max_concurrency)
+        if not self._waiters and self.active + weight <= self.max_concurrency:
+            self.active += weight
+            return True
+        if len(self._waiters) >= self.max_queue:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (weight, waiter)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return True
+        except TimeoutError:
+            return False
+        except BaseException:
+            # 자리를 넘겨받은 직후에 취소됐으면 돌려놓음
+            if waiter.done() and not waiter.cancelled():
+                self.release(weight)
+            raise
+        finally:
+            if waiter.cancelled() and entry in self._waiters:
+                self._waiters.remove(entry)
+                self._wake()
+
+    def release(self, weight: int):
+        self.active -= min(weight, self.max_concurrency)
+        self._wake()
+
+    def _wake(self):
+        # 도착 순서대로: 맨 앞 요청이 들어갈 자리가 날 때까지 뒤 요청도 기다림 (큰 배치가 굶지 않게)
+        while self._waiters:
+            weight, waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if self.active + weight > self.max_concurrency:
+                return
+            self._waiters.popleft()
+            self.active += weight
+            waiter.set_result(None)
+
+    async def reject(self, scope, receive, send):
+        self.shed += 1
+        response = FastJSONResponse({"detail": "Service Unavailable"}, status_code=503, headers={"Retry-After": "1"})
+        await response(scope, receive, send)
+
+
+# 큰 요청 본문의 JSON 파싱/검증을 이벤트 루프 밖으로 넘김 (@offload_body 로 표시한 라우트만)
+# 본문 bytes 를 그대로 풀에 넘기고(pickle 은 bytes 를 한 번 복사할 뿐) FastAPI 와 같은 순서(json.loads -> validate_python)로 검증한 뒤
+# 검증된 값만 돌려받아 엔드포인트를 바로 호출함. 실패하면 FastAPI 와 같은 모양의 422 를 만듦
+# 기본은 프로세스 풀, GIL 없는 빌드에서는 스레드 풀 (OFFLOAD_EXECUTOR=process|thread 로 지정 가능)
+# min_size 보다 작은 본문은 넘기는 비용이 더 크므로 원래 경로로 처리
+# 검증된 값을 pickle 로 다시 받아 이벤트 루프에서 렌더링하므로 GIL 빌드에서는 처리량과 꼬리 지연이 오히려 나빠짐
+# (python -m bench body-offload) -> OFFLOAD_BODY=1 일 때만 켜짐. 꺼져 있으면 @offload_body 는 표시만 남고 원래 경로로 처리
+def offload_body(min_size: int = 64 * 1024):
+    def decorator(func):
+        func.offload_body_min_size = min_size
+        return func
+
+    return decorator
+
+
+_offload_adapters = {}
+
+
+def _validate_body_offloaded(annotation, body: bytes):
+    # 풀 워커에서 실행됨 (프로세스 풀이면 워커가 main 을 import 해서 이 함수를 찾음)
+    adapter = _offload_adapters.get(annotation)
+    if adapter is None:
+        adapter = _offload_adapters[annotation] = TypeAdapter(annotation)
+    try:
+        value = json.loads(body)
+    except json.JSONDecodeError as e:
+        return "json", (e.pos, e.msg, e.doc)
+    try:
+        return "ok", adapter.validate_python(value)
+    except ValidationError as exc:
+        return "invalid", exc.errors(include_url=False)
+
+
+class BodyOffloadPool:
+    def __init__(self, workers: int, kind: str):
+        self.workers = workers
+        self.kind = kind
+        self.executor = None
+        self.slots = None
+
+    async def validate(self, annotation, body: bytes):
+        # 풀은 첫 요청 때 만듦 (serve.py 가 fork 한 뒤 워커 안에서 만들어지도록)
+        if self.executor is None:
+            if self.kind == "thread":
+                self.executor = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="body-offload")
+            else:
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            # 풀 안쪽 대기열은 크기 제한이 없으므로 넘겨두는 작업 수를 여기서 묶어둠
+            self.slots = asyncio.Semaphore(self.workers * 2)
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, _validate_body_offloaded, annotation, body
+            )
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+body_offload = BodyOffloadPool(
+    int(os.environ.get("OFFLOAD_WORKERS", min(4, os.cpu_count() or 1))),
+    os.environ.get("OFFLOAD_EXECUTOR") or ("process" if getattr(sys, "_is_gil_enabled", lambda: True)() else "thread"),
+) if os.environ.get("OFFLOAD_BODY") == "1" else None
+
+
+def _is_json_content_type(value: str | None) -> bool:
+    media_type = (value or "").split(";", 1)[0].strip().lower()
+    return media_type == "application/json" or (media_type.startswith("application/") and media_type.endswith("+json"))
+
+
+def _offloaded_body(handler, dependant, min_size: int):
+    # 본문 매개변수 하나만 받고 응답 모델이 없는(direct render) 엔드포인트만 대상
+    if (
+        len(dependant.body_params) != 1
+        or dependant.path_params or dependant.query_params or dependant.header_params or dependant.cookie_params
+        or dependant.dependencies
+        or not getattr(dependant.call, "direct_render", False)
+    ):
+        return handler
+    field = dependant.body_params[0]
+    name, annotation, call = field.name, field.field_info.annotation, dependant.call
+
+    async def offloaded(request: Request):
+        pool = body_offload
+        if pool is None or not _is_json_content_type(request.headers.get("content-type")):
+            return await handler(request)
+        body = await request.body()
+        if len(body) < min_size:
+            return await handler(request)
+        try:
+            status, result = await pool.validate(annotation, body)
+        except concurrent.futures.BrokenExecutor:
+            # 풀 워커가 죽었으면 풀을 버리고 이번 요청은 원래 경로로 처리
+            pool.shutdown()
+            return await handler(request)
+        if status == "json":
+            pos, msg, doc = result
+            raise RequestValidationError(
+                [{"type": "json_invalid", "loc": ("body", pos), "msg": "JSON decode error",
+                  "input": {}, "ctx": {"error": msg}}],
+                body=doc,
+            )
+        if status == "invalid":
+            raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in result], body=body)
+        if inspect.iscoroutinefunction(call):
+            return await call(**{name: result})
+        return await run_in_threadpool(call, **{name: result})
+
+    return offloaded
+
+
+# 응답 압축: Accept-Encoding 으로 zstd/br/gzip 중 하나를 고름 (zstd, br 은 zstandard, brotli 가 설치되어 있을 때만)
+# 본문이 한 번에 오는 응답은 min_size 이상일 때만 압축하고, 여러 조각으로 흐르는 응답은 조각마다 압축 후 flush 해서 바로 내보냄
+# 라우트별 정책은 @compression_policy 로 지정 (profile: fast/default/best 또는 None 이면 압축 안 함)
+# ETag 가 있는 응답(cached_response, Enum 미리 렌더링)과 precompressed 라우트는 best 로 한 번만 압축해서 LRU 에 보관
+# best 수준(zstd 19, br 11)은 큰 본문이면 수십 ms 가 걸리므로 처음 한 번은 스레드풀에서 압축하고, 같은 키를 동시에 요청하면 그 결과를 같이 기다림
+# 파일 응답(Range 지원, zero-copy 전송)과 이미 인코딩된 응답은 건드리지 않음
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH) if data else b""
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, level: int):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush() if data else b""
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self.compressor.process(data) + self.compressor.finish()
+
+
+class _ZstdEncoder:
+    def __init__(self, level: int):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if data else b""
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+# 같은 q 값이면 앞쪽 인코딩을 우선
+COMPRESSION_ENCODERS = {
+    name: encoder
+    for name, encoder, available in (
+        ("zstd", _ZstdEncoder, zstandard is not None),
+        ("br", _BrotliEncoder, brotli is not None),
+        ("gzip", _GzipEncoder, True),
+    )
+    if available
+}
+COMPRESSION_PROFILES = {
+    "fast": {"zstd": 1, "br": 1, "gzip": 1},
+    "default": {"zstd": 3, "br": 4, "gzip": 6},
+    "best": {"zstd": 19, "br": 11, "gzip": 9},
+}
+COMPRESSIBLE_TYPES = {"application/json", "application/x-ndjson", "application/javascript", "application/xml"}
+
+
+def compression_policy(profile: str | None = "default", min_size: int | None = None, precompressed: bool = False):
+    def decorator(func):
+        func.compression_policy = (profile, min_size, precompressed)
+        return func
+
+    return decorator
+
+
+@functools.lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for name in COMPRESSION_ENCODERS:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def _is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES \
+        or media_type.endswith("+json") or media_type.endswith("+xml")
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size: int = 500, cache_size: int = 256):
+        self.app = app
+        self.min_size = min_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self._pending = {}
+
+    async def __call__(self, scope, receive, send):
+        # 하위 요청(/batch)은 바깥 응답에서 한 번에 압축됨
+        if scope["type"] != "http" or scope["method"] == "HEAD" or scope.get("subrequest"):
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = next((value for key, value in scope["headers"] if key == b"accept-encoding"), None)
+        encoding = negotiate_encoding(accept_encoding.decode("latin-1")) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(self, scope, send, encoding))
+
+    def policy(self, scope, start):
+        status = start["status"]
+        if status < 200 or status in (204, 206, 304):
+            return None
+        headers = MutableHeaders(raw=start["headers"])
+        if "content-encoding" in headers or "accept-ranges" in headers \
+                or not _is_compressible(headers.get("content-type", "")):
+            return None
+        endpoint = getattr(scope.get("route"), "endpoint", None)
+        profile, min_size, precompressed = getattr(endpoint, "compression_policy", ("default", None, False))
+        if profile is None:
+            return None
+        return profile, self.min_size if min_size is None else min_size, precompressed
+
+    async def compress(self, encoding: str, body: bytes, profile: str, cache_key) -> bytes:
+        if cache_key is None:
+            return COMPRESSION_ENCODERS[encoding](COMPRESSION_PROFILES[profile][encoding]).finish(body)
+        key = (encoding, cache_key)
+        compressed = self.cache.get(key)
+        if compressed is not None:
+            self.cache.move_to_end(key)
+            return compressed
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(
+                run_in_threadpool(COMPRESSION_ENCODERS[encoding](COMPRESSION_PROFILES["best"][encoding]).finish, body)
+            )
+            pending.add_done_callback(functools.partial(self._compressed, key))
+        # 기다리던 요청이 취소돼도 압축은 끝까지 해서 캐시에 넣음
+        return await asyncio.shield(pending)
+
+    def _compressed(self, key, future):
+        del self._pending[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.cache[key] = future.result()
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+
+class _CompressingSend:
+    # http.response.start 는 첫 본문 조각을 보고 압축 여부를 정할 때까지 붙잡아 둠
+    def __init__(self, middleware: CompressionMiddleware, scope, send, encoding: str):
+        self.middleware = middleware
+        self.scope = scope
+        self.send = send
+        self.encoding = encoding
+        self.start = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if self.passthrough:
+            await self.send(message)
+            return
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if self.encoder is not None:
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                chunk = self.encoder.compress(body)
+                if chunk:
+                    await self.send({"type": "http.response.body", "body": chunk, "more_body": True})
+            else:
+                await self.send({"type": "http.response.body", "body": self.encoder.finish(body), "more_body": False})
+            return
+
+        start, self.start = self.start, None
+        policy = self.middleware.policy(self.scope, start) if message["type"] == "http.response.body" else None
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if policy is None or (not more_body and len(body) < policy[1]):
+            self.passthrough = True
+            await self.send(start)
+            await self.send(message)
+            return
+
+        profile, _, precompressed = policy
+        headers = MutableHeaders(raw=list(start["headers"]))
+        if more_body:
+            self.encoder = COMPRESSION_ENCODERS[self.encoding](COMPRESSION_PROFILES[profile][self.encoding])
+            del headers["content-length"]
+            body = self.encoder.compress(body)
+        else:
+            etag = headers.get("etag")
+            cache_key = etag or (hashlib.blake2b(body, digest_size=16).digest() if precompressed else None)
+            compressed = await self.middleware.compress(self.encoding, body, profile, cache_key)
+            if len(compressed) >= len(body):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            body = compressed
+            headers["content-length"] = str(len(body))
+        headers["content-encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            # 인코딩마다 바이트가 달라지므로 약한 ETag 로 바꿈 (조건부 요청은 W/ 태그도 맞춰봄)
+            headers["etag"] = f"W/{etag}"
+        await self.send({**start, "headers": headers.raw})
+        if body or not more_body:
+            await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+# 트래픽 캡처: CAPTURE_PATH 가 지정되면 요청을 CAPTURE_SAMPLE_RATE 비율로 골라서 replay.py 가 읽는 JSONL 형식으로 덧붙임
+# 한 줄 = {"method", "path"(쿼리 포함), "headers", "body"(JSON 본문) 또는 "body_b64"(그 외 본문), "status"}
+# 줄마다 O_APPEND 로 한 번에 write 하므로 serve.py 워커 여러 개가 같은 파일에 써도 줄이 섞이지 않음
+# 인증 정보가 담긴 헤더는 남기지 않고, 본문이 CAPTURE_MAX_BODY 보다 크거나 앱이 본문을 끝까지 읽지 않은 요청은 건너뜀
+CAPTURE_SKIP_HEADERS = {b"cookie", b"authorization", b"proxy-authorization", b"content-length", b"transfer-encoding"}
+
+
+class CaptureMiddleware:
+    def __init__(self, app, path: str | None, sample_rate: float = 0.01, max_body: int = 1 << 20):
+        self.app = app
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_body = max_body
+        self.fd = None
+
+    async def __call__(self, scope, receive, send):
+        if (
+            self.path is None or scope["type"] != "http" or scope.get("subrequest")
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+        chunks = []
+        size = 0
+        # 본문이 없는 요청이면 처음부터 다 읽은 것으로 봄
+        complete = not any(
+            key == b"transfer-encoding" or (key == b"content-length" and value != b"0")
+            for key, value in scope["headers"]
+        )
+        status = None
+
+        async def capture_receive():
+            nonlocal size, complete
+            message = await receive()
+            if message["type"] == "http.request" and size <= self.max_body:
+                body = message.get("body", b"")
+                size += len(body)
+                chunks.append(body)
+                complete = not message.get("more_body", False)
+            return message
+
+        async def capture_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            if status is not None and complete and size <= self.max_body:
+                self.write(scope, b"".join(chunks), status)
+
+    def write(self, scope, body: bytes, status: int):
+        # 디코딩된 scope["path"] 가 아니라 클라이언트가 보낸 그대로(raw_path)를 남겨야 %3F, %2F 같은 경로도 같은 요청으로 재생됨
+        raw_path = scope.get("raw_path") or quote(scope["path"]).encode("ascii")
+        path = raw_path.decode("latin-1")
+        if scope["query_string"]:
+            path += "?" + scope["query_string"].decode("latin-1")
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"] if key not in CAPTURE_SKIP_HEADERS
+        }
+        record = {"method": scope["method"], "path": path, "headers": headers}
+        if body:
+            try:
+                if not _is_json_content_type(headers.get("content-type")):
+                    raise ValueError
+                record["body"] = json.loads(body)
+            except ValueError:
+                record["body_b64"] = base64.b64encode(body).decode("ascii")
+        record["status"] = status
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        # 파일은 첫 기록 때 엶 (serve.py 가 fork 한 뒤 워커마다 자기 fd 를 가짐)
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.write(self.fd, line.encode("utf-8"))
+
+
+# 앱 전체 기본 응답 클래스: dict/모델을 바로 bytes 로 직렬화 (orjson 이 있으면 사용, 없으면 stdlib json)
+# 응답 모델이 없는 라우트는 InstrumentedRoute 가 반환값을 이 클래스로 바로 감싸서 jsonable_encoder 단계를 건너뜀
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _orjson_default(value):
+    if isinstance(value, BaseModel):
+        if hasattr(orjson, "Fragment"):
+            return orjson.Fragment(value.__pydantic_serializer__.to_json(value))
+        return value.model_dump(mode="json")
+    return jsonable_encoder(value)
+
+
+def _json_default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return jsonable_encoder(value)
+
+
+def render_json(content) -> bytes:
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if orjson is not None:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_json_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return render_json(content)
+
+
+# 리스트 응답을 다 만들어 두지 않고 batch_size 개씩 직렬화해서 흘려보냄 (JSON 배열 또는 ndjson)
+# items 는 모델(또는 JSON 으로 바꿀 수 있는 값)의 async 생성기나 일반 iterable
+# send 가 막히면(클라이언트가 느려서 서버 쓰기 버퍼가 차면) 다음 배치를 만들지 않고 기다리므로 메모리에는 배치 하나만 남음
+# 클라이언트가 끊기면 스트리밍 태스크를 취소하고 생성기를 닫음 (생성기의 finally 가 실행됨)
+# 길이를 아는 리스트가 batch_size 이하이면 한 번에 보내고 Content-Length 를 붙임
+class StreamingListResponse(Response):
+    media_type = "application/json"
+
+    def __init__(self, items, batch_size: int = 256, ndjson: bool = False, status_code: int = 200, headers=None):
+        self.items = items
+        self.batch_size = max(1, batch_size)
+        self.ndjson = ndjson
+        self.status_code = status_code
+        self.background = None
+        if ndjson:
+            self.media_type = "application/x-ndjson"
+        self.body = None
+        if isinstance(items, (list, tuple)) and len(items) <= self.batch_size:
+            self.body = self.frame([render_json(item) for item in items], first=True, last=True)
+        self.init_headers(headers)
+
+    def frame(self, parts: list, first: bool, last: bool) -> bytes:
+        if self.ndjson:
+            return b"".join(part + b"\n" for part in parts)
+        body = b",".join(parts)
+        if body and not first:
+            body = b"," + body
+        return (b"[" if first else b"") + body + (b"]" if last else b"")
+
+    async def __call__(self, scope, receive, send):
+        if self.body is not None:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": self.body})
+            return
+        stream = asyncio.ensure_future(self.stream(send))
+        watcher = asyncio.ensure_future(_wait_disconnect(receive))
+        try:
+            await asyncio.wait((stream, watcher), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            watcher.cancel()
+            if not stream.done():
+                stream.cancel()
+                await asyncio.wait((stream,))
+        if not stream.cancelled() and not isinstance(stream.exception(), OSError):
+            # 본문 도중의 에러는 상태 코드를 바꿀 수 없으므로 그대로 올려서 서버가 연결을 끊게 함 (잘린 응답)
+            stream.result()
+
+    async def stream(self, send):
+        items = self.items if hasattr(self.items, "__aiter__") else _iterate(self.items)
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            parts = []
+            first = True
+            async for item in items:
+                parts.append(render_json(item))
+                if len(parts) >= self.batch_size:
+                    await send({"type": "http.response.body", "body": self.frame(parts, first, False), "more_body": True})
+                    parts = []
+                    first = False
+                    # send 가 막히지 않는 동안에도 배치마다 이벤트 루프에 차례를 넘김
+                    await asyncio.sleep(0)
+            await send({"type": "http.response.body", "body": self.frame(parts, first, True), "more_body": False})
+        finally:
+            aclose = getattr(items, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+async def _iterate(items):
+    for item in items:
+        yield item
+
+
+def _direct_render(call, response_class, status_code):
+    def render(result):
+        if isinstance(result, Response):
+            return result
+        return response_class(result, status_code=status_code) if status_code else response_class(result)
+
+    if not METRICS_ENABLED:
+        if inspect.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def rendered(*args, **kwargs):
+                return render(await call(*args, **kwargs))
+        else:
+            @functools.wraps(call)
+            def rendered(*args, **kwargs):
+                return render(call(*args, **kwargs))
+        return rendered
+
+    # 엔드포인트 구간 기록도 여기서 함께 해서 _timed_endpoint 래퍼를 한 겹 덜 거침
+    if inspect.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def rendered(*args, **kwargs):
+            timings = _request_timings.get()
+            if timings is None:
+                return render(await call(*args, **kwargs))
+            timings[2] = perf_counter_ns()
+            try:
+                result = await call(*args, **kwargs)
+            finally:
+                timings[3] = perf_counter_ns()
+            return render(result)
+    else:
+        @functools.wraps(call)
+        def rendered(*args, **kwargs):
+            timings = _request_timings.get()
+            if timings is None:
+                return render(call(*args, **kwargs))
+            timings[2] = perf_counter_ns()
+            try:
+                result = call(*args, **kwargs)
+            finally:
+                timings[3] = perf_counter_ns()
+            return render(result)
+    return rendered
+
+
+def _uses_response_param(dependant) -> bool:
+    # 엔드포인트나 하위 의존성 어디서든 Response 를 주입받으면 거기서 바꾼 헤더/상태 코드를 FastAPI 가 합쳐야 함
+    return dependant.response_param_name is not None or any(map(_uses_response_param, dependant.dependencies))
+
+
+class InstrumentedRoute(APIRoute):
+    def get_route_handler(self):
+        response_class = getattr(self.response_class, "value", self.response_class)
+        call = self.dependant.call
+        # 본문이 없어야 하는 상태 코드(204, 304 ...)와 Response 주입은 FastAPI 의 원래 처리(본문 비우기, 헤더 합치기)를 거침
+        if (
+            isinstance(response_class, type) and issubclass(response_class, FastJSONResponse)
+            and self.response_field is None
+            and is_body_allowed_for_status_code(self.status_code)
+            and not _uses_response_param(self.dependant)
+            and not (inspect.isasyncgenfunction(call) or inspect.isgeneratorfunction(call))
+            and not getattr(call, "direct_render", False)
+        ):
+            call = self.dependant.call = _direct_render(call, response_class, self.status_code)
+            call.direct_render = True
+        elif METRICS_ENABLED and not getattr(call, "direct_render", False) and not getattr(call, "timed", False):
+            call = self.dependant.call = _timed_endpoint(call)
+            call.timed = True
+        handler = super().get_route_handler()
+        cache = getattr(self.endpoint, "response_cache", None)
+        if cache is not None:
+            handler = _cached_handler(handler, cache)
+        min_size = getattr(self.endpoint, "offload_body_min_size", None)
+        if min_size is not None:
+            handler = _offloaded_body(handler, self.dependant, min_size)
+        limit = getattr(self.endpoint, "rate_limit", None)
+        if limit is not None:
+            handler = _rate_limited(handler, f"{','.join(sorted(self.methods))} {self.path}", *limit)
+        if not METRICS_ENABLED:
+            return handler
+
+        async def timed_handler(request: Request):
+            timings = _request_timings.get()
+            if timings is None:
+                return await handler(request)
+            timings[1] = perf_counter_ns()
+            try:
+                return await handler(request)
+            finally:
+                timings[4] = perf_counter_ns()
+
+        return timed_handler
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+# 라우트를 등록하기 전에 지정해야 모든 라우트가 계측됨
+app.router.route_class = InstrumentedRoute
+app.add_middleware(CompressionMiddleware, min_size=int(os.environ.get("COMPRESSION_MIN_SIZE", "500")))
+app.add_middleware(
+    AdmissionMiddleware,
+    max_concurrency=int(os.environ.get("MAX_CONCURRENCY", "512")),
+    max_queue=int(os.environ.get("MAX_QUEUE", "1024")),
+    queue_timeout=float(os.environ.get("QUEUE_TIMEOUT", "2.0")),
+    exempt=("/metrics",),
+    exempt_pattern=r"/models/[^/]+/events",
+)
+# 나중에 추가한 미들웨어가 바깥쪽이므로 503 으로 거절된 요청도 지연 시간 지표에 남음
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+app.add_middleware(
+    CaptureMiddleware,
+    path=os.environ.get("CAPTURE_PATH") or None,
+    sample_rate=float(os.environ.get("CAPTURE_SAMPLE_RATE", "0.01")),
+    max_body=int(os.environ.get("CAPTURE_MAX_BODY", str(1 << 20))),
+)
+
+
+# 기능별 라우터(routers/)는 해당 경로로 첫 요청이 올 때 import 해서 워커 콜드 스타트 시간을 줄임
+# 자리표시자 라우트가 접두사로 매칭되면 모듈을 불러와 자기 자리를 모듈의 라우트들로 바꾼 뒤 같은 요청을 다시 라우팅함
+class LazyRoutes(BaseRoute):
+    def __init__(self, app: FastAPI, module: str, prefixes: tuple):
+        self.app = app
+        self.module = module
+        self.prefixes = prefixes
+
+    def matches(self, scope):
+        if scope["type"] in ("http", "websocket") and scope["path"].startswith(self.prefixes):
+            return Match.FULL, {}
+        return Match.NONE, {}
+
+    async def handle(self, scope, receive, send):
+        self.load()
+        await self.app.router(scope, receive, send)
+
+    def load(self):
+        routes = self.app.router.routes
+        if self in routes:
+            # include_router 로 붙여야 앱의 default_response_class 와 dependency_overrides 가 적용됨
+            # (모듈 라우터의 라우트 객체를 그대로 옮기면 둘 다 빠짐)
+            # 포함된 라우터는 매칭할 때마다 안쪽 라우트를 모두 훑으므로 include_router 가 붙인 대로 맨 뒤에 둬서
+            # 앱 라우트로 가는 요청은 거치지 않게 함 (LAZY_ROUTERS 의 접두사와 겹치는 앱 라우트가 없어야 함)
+            self.app.include_router(importlib.import_module(self.module).router)
+            routes.remove(self)
+
+
+LAZY_ROUTERS = {
+    "routers.files": ("/files/",),
+    "routers.batch": ("/batch",),
+    "routers.images": ("/images/multiple/stream", "/images/url-cache"),
+    "routers.index_weights": ("/index-weights/columnar",),
+    "routers.uploads": ("/uploads", "/uploadfile/stream"),
+}
+for module, prefixes in LAZY_ROUTERS.items():
+    app.router.routes.append(LazyRoutes(app, module, prefixes))
+
+
+def load_lazy_routes(app: FastAPI):
+    for route in list(app.router.routes):
+        if isinstance(route, LazyRoutes):
+            route.load()
+
+
+# OpenAPI 스키마는 빌드 시점에 python -m openapi_schema 로 openapi.json 에 미리 만들어 두고 읽기만 함
+# 파일이 없으면 지연 라우터를 모두 불러온 뒤 평소처럼 생성
+OPENAPI_SCHEMA_PATH = pathlib.Path(
+    os.environ.get("OPENAPI_SCHEMA_PATH", pathlib.Path(__file__).with_name("openapi.json"))
+)
+
+
+def build_openapi_schema(app: FastAPI) -> dict:
+    load_lazy_routes(app)
+    app.openapi_schema = None
+    return FastAPI.openapi(app)
+
+
+def openapi():
+    if app.openapi_schema is None:
+        try:
+            app.openapi_schema = json.loads(OPENAPI_SCHEMA_PATH.read_bytes())
+        except FileNotFoundError:
+            build_openapi_schema(app)
+    return app.openapi_schema
+
+
+app.openapi = openapi
 
 
 @app.get("/")
 async def root():
-    return {"message": "Hello World"}
+    return root_template.render()
+
+
+@app.get("/metrics")
+async def read_metrics():
+    return PlainTextResponse(latency_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/hello/{name}")
 async def say_hello(name: str):
-    return {"message": f"Hello {name}"}
+    return hello_template.render(name=name)
 
 # @app.get("/items/{item_id}")
 # async def read_item(item_id: int):
@@ -83,14 +2595,79 @@ async def say_hello(name: str):
 # 순서에 유의할 것
 @app.get("/users/me")
 async def read_user_me():
-    return {"user_id": "the current user"}
+    return user_me_template.render()
 
 @app.get("/users/{user_id}")
-async def read_user(user_id: str):
-    return {"user_id": user_id}
+@cached_response(ttl=30, maxsize=10000)
+async def read_user(user_id: str, conn: Annotated[PooledConnection | None, resources.depends("users")]):
+    user = await user_loader.get(user_id, conn)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"user_id": user_id, **user.model_dump()}
+
+@app.get("/users")
+async def read_users(ids: Annotated[List[str], Query()],
+                     conn: Annotated[PooledConnection | None, resources.depends("users")]):
+    # ?ids=a&ids=b 와 ?ids=a,b 둘 다 허용, 저장소 조회는 한 번만
+    user_ids = [user_id for value in ids for user_id in value.split(",") if user_id]
+    found = await user_loader.get_many(user_ids, conn)
+    return {
+        "users": [{"user_id": user_id, **user.model_dump()} for user_id, user in found.items()],
+        "missing": [user_id for user_id in dict.fromkeys(user_ids) if user_id not in found],
+    }
+# http://localhost:8000/users?ids=gyeore,haneul,nobody
+
+
+@app.post("/sessions", status_code=201)
+async def create_session(
+    user_id: Annotated[str, Body(embed=True)],
+    users: Annotated[PooledConnection | None, resources.depends("users")],
+    sessions: Annotated[PooledConnection, resources.depends("sessions")],
+):
+    if await user_loader.get(user_id, users) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    session = await session_store.create(user_id, conn=sessions)
+    response = JSONResponse({"user_id": user_id}, status_code=201)
+    # 만료는 서버가 슬라이딩으로 관리하므로 쿠키에는 max_age 를 주지 않음 (고정 max_age 면 쓰는 중에도 브라우저에서 먼저 사라짐)
+    response.set_cookie("session_id", session.session_id, httponly=True, samesite="lax")
+    return response
+
+
+@app.get("/sessions/me")
+async def read_session(session: Annotated[Session, Depends(require_session)]):
+    return {"user_id": session.user_id, "data": session.data,
+            "expires": datetime.fromtimestamp(session.expires, timezone.utc)}
+
+
+@app.put("/sessions/me/data")
+async def replace_session_data(
+    session: Annotated[Session, Depends(require_session)],
+    conn: Annotated[PooledConnection, resources.depends("sessions")],
+    data: Dict[str, Any],
+):
+    session.data = data
+    await session_store.save(session, conn)
+    return {"user_id": session.user_id, "data": session.data}
+
+
+@app.delete("/sessions/me")
+async def delete_session(
+    session: Annotated[Session, Depends(require_session)],
+    conn: Annotated[PooledConnection, resources.depends("sessions")],
+):
+    await session_store.delete(session.session_id, conn)
+    response = Response(status_code=204)
+    response.delete_cookie("session_id")
+    return response
+
+
+@app.get("/sessions/stats")
+async def read_session_stats():
+    return session_store.stats()
 
 # 사전정의 값: 그 외의 값 입력하면 에러 남 왜냐하면 ModelName으로 타입 정의되었으니까
 @app.get("/models/{model_name}")
+@prerender_enum_responses(max_age=300)
 async def get_model(model_name: ModelName):
     if model_name is ModelName.alexnet:
         return {"model_name": model_name, "message": "Deep Learning FTW!"}
@@ -98,16 +2675,238 @@ async def get_model(model_name: ModelName):
         return {"model_name": model_name, "message": "LeCNN all the images"}
     return {"model_name": model_name, "message": "Have some residuals"}
 
-# 경로 변환기
-@app.get("/files/{file_path:path}")
-async def read_file(file_path: str):
-    return {"file_path": file_path}
+
+# 모델 상태 푸시: /models/{model_name} 을 계속 폴링하는 대신 SSE(/events) 나 웹소켓(/ws) 으로 구독
+# 구독하면 현재 상태를 먼저 받고, PUT /models/{model_name}/status 로 바뀔 때마다 새 상태를 받음
+# 브로커가 워커 프로세스 안에 있으므로 serve.py 로 여러 워커를 띄우면 PUT 을 받은 워커의 구독자에게만 전달됨
+class ModelStatusUpdate(BaseModel):
+    status: Literal["ready", "loading", "training", "failed"]
+    detail: str | None = Field(default=None, max_length=1000)
+
+
+class ModelStatus(ModelStatusUpdate):
+    model_name: ModelName
+    version: int
+    updated_at: datetime
+
+
+model_statuses = {}
+
+
+def publish_model_status(model_name: ModelName, update: ModelStatusUpdate) -> ModelStatus:
+    previous = model_statuses.get(model_name)
+    status = ModelStatus(
+        model_name=model_name, version=previous.version + 1 if previous else 0,
+        updated_at=datetime.now(timezone.utc), **update.model_dump(),
+    )
+    model_statuses[model_name] = status
+    push_broker.publish(model_name.value, PushMessage(status.model_dump_json(), event_id=status.version))
+    return status
+
+
+for _model_name in ModelName:
+    publish_model_status(_model_name, ModelStatusUpdate(status="ready"))
+
+
+@app.get("/models/{model_name}/status", response_model=ModelStatus)
+async def read_model_status(model_name: ModelName):
+    return model_statuses[model_name]
+
+
+@app.put("/models/{model_name}/status", response_model=ModelStatus)
+async def update_model_status(model_name: ModelName, update: ModelStatusUpdate):
+    return publish_model_status(model_name, update)
+
+
+@app.get("/models/{model_name}/events", response_class=EventStreamResponse)
+@compression_policy(None)
+@streaming_route
+async def model_status_events(model_name: ModelName):
+    return EventStreamResponse(push_broker, model_name.value)
+# curl -N http://localhost:8000/models/alexnet/events
+
+
+@app.websocket("/models/{model_name}/ws")
+async def model_status_websocket(websocket: WebSocket, model_name: ModelName):
+    await websocket.accept()
+
+    async def write(messages):
+        for message in messages:
+            if message.text is not None:
+                await websocket.send_text(message.text)
+
+    subscriber = await push_broker.serve(model_name.value, websocket.receive, write)
+    if subscriber.dropped:
+        # 큐가 넘쳐서 끊긴 경우: 1013(Try Again Later) 으로 닫아 다시 연결하도록 함
+        await websocket.close(code=1013)
+
+
+@app.get("/push/stats")
+async def read_push_stats():
+    return push_broker.stats()
+
+@app.get("/cache/stats")
+async def read_cache_stats():
+    return {name: cache.stats() for name, cache in response_caches.items()}
+
+@app.get("/resources/stats")
+async def read_resource_stats():
+    return resources.stats()
+
+
+@app.delete("/cache")
+async def purge_cache(route: str | None = None, prefix: str | None = None):
+    if route is None:
+        caches = response_caches.values()
+    elif route in response_caches:
+        caches = [response_caches[route]]
+    else:
+        raise HTTPException(status_code=404, detail="Unknown cached route")
+    return {"purged": sum(cache.purge(prefix) for cache in caches)}
+# http://localhost:8000/cache?route=get_model&prefix=/models/alexnet  (DELETE)
 
 ####################
 # 쿼리 매개변수
 ####################
 
-fake_items_db = [{"item_name": "Foo"}, {"item_name": "Bar"}, {"item_name": "Baz"}]
+# 리스트를 매번 훑는 대신 (시각, id) 정렬 인덱스와 태그 역색인을 유지하는 인메모리 아이템 저장소
+# 정렬 순서대로 이미 쌓여 있으므로 한 페이지는 O(log n + limit) 으로 잘라냄 (태그 여러 개면 가장 짧은 태그 목록을 훑으며 나머지로 거름)
+class ItemStore:
+    orders = ("created_at", "updated_at")
+
+    def __init__(self):
+        self._items = {}
+        self._next_id = 1
+        self._order = {order: [] for order in self.orders}
+        self._tag_ids = {}
+        self._tag_order = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, item_id: int):
+        return dict(self._items[item_id])
+
+    def add(self, item_name: str, tags=(), created_at: datetime | None = None):
+        now = created_at or datetime.now()
+        item = {
+            "id": self._next_id,
+            "item_name": item_name,
+            "created_at": now,
+            "updated_at": now,
+            "tags": sorted(set(tags)),
+        }
+        self._next_id += 1
+        self._items[item["id"]] = item
+        self._index(item)
+        return dict(item)
+
+    def update(self, item_id: int, **fields):
+        item = self._items[item_id]
+        self._unindex(item)
+        if "tags" in fields:
+            fields["tags"] = sorted(set(fields["tags"]))
+        item.update(fields, updated_at=fields.get("updated_at") or datetime.now())
+        self._index(item)
+        return dict(item)
+
+    def remove(self, item_id: int):
+        self._unindex(self._items.pop(item_id))
+
+    def _index(self, item):
+        for order in self.orders:
+            key = (item[order], item["id"])
+            bisect.insort(self._order[order], key)
+            for tag in item["tags"]:
+                bisect.insort(self._tag_order.setdefault(tag, {o: [] for o in self.orders})[order], key)
+        for tag in item["tags"]:
+            self._tag_ids.setdefault(tag, set()).add(item["id"])
+
+    def _unindex(self, item):
+        for order in self.orders:
+            key = (item[order], item["id"])
+            self._discard(self._order[order], key)
+            for tag in item["tags"]:
+                self._discard(self._tag_order[tag][order], key)
+        for tag in item["tags"]:
+            ids = self._tag_ids[tag]
+            ids.discard(item["id"])
+            if not ids:
+                del self._tag_ids[tag], self._tag_order[tag]
+
+    @staticmethod
+    def _discard(keys: list, key):
+        pos = bisect.bisect_left(keys, key)
+        if pos < len(keys) and keys[pos] == key:
+            del keys[pos]
+
+    @staticmethod
+    def encode_cursor(key) -> str:
+        return f"{key[0].isoformat()}|{key[1]}"
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        # 키는 모두 naive datetime 이라 시간대가 붙은 값은 bisect 비교에서 TypeError 가 나므로 여기서 ValueError 로 거름
+        timestamp, _, item_id = cursor.rpartition("|")
+        key = datetime.fromisoformat(timestamp), int(item_id)
+        if key[0].tzinfo is not None:
+            raise ValueError("cursor timestamp must not have a timezone")
+        return key
+
+    def page(self, order_by: str, limit: int, offset: int = 0, tags=(), cursor: str | None = None):
+        tags = set(tags)
+        if tags:
+            if not tags <= self._tag_ids.keys():
+                return [], None
+            base_tag = min(tags, key=lambda tag: len(self._tag_ids[tag]))
+            keys = self._tag_order[base_tag][order_by]
+            others = [self._tag_ids[tag] for tag in tags if tag != base_tag]
+        else:
+            keys = self._order[order_by]
+            others = []
+
+        # cursor가 있으면 이전 페이지 마지막 키 바로 다음부터 (깊은 페이지도 bisect 한 번)
+        start = bisect.bisect_right(keys, self.decode_cursor(cursor)) if cursor else 0
+        if not others:
+            window = keys[start + offset:start + offset + limit]
+        else:
+            window = []
+            skipped = 0
+            for key in itertools.islice(keys, start, None):
+                if all(key[1] in ids for ids in others):
+                    if skipped < offset:
+                        skipped += 1
+                        continue
+                    window.append(key)
+                    if len(window) == limit:
+                        break
+
+        next_cursor = self.encode_cursor(window[-1]) if len(window) == limit else None
+        return [dict(self._items[item_id]) for _, item_id in window], next_cursor
+
+
+class StoredItem(BaseModel):
+    id: int
+    item_name: str
+    created_at: datetime
+    updated_at: datetime
+    tags: list[str]
+
+
+async def iter_stored_items(order_by: str, tags=(), batch_size: int = 1000):
+    # 커서로 한 묶음씩 읽으므로 내보내는 도중에 아이템이 추가/수정되어도 건너뛰거나 중복되지 않음
+    cursor = None
+    while True:
+        items, cursor = fake_items_db.page(order_by, batch_size, 0, tags, cursor)
+        for item in items:
+            yield StoredItem.model_construct(**item)
+        if cursor is None:
+            return
+
+
+fake_items_db = ItemStore()
+for _name in ("Foo", "Bar", "Baz"):
+    fake_items_db.add(_name)
 
 # @app.get("/items/")
 # async def read_item(skip: int = 0, limit: int = 10):
@@ -308,15 +3107,135 @@ class FilterParams(BaseModel):
     offset: int = Field(0, ge=0)
     order_by: Literal["created_at", "updated_at"] = "created_at"
     tags: list[str] = []
+    cursor: str | None = None
+
+# 매개변수 모델을 시작 시 한 번 "컴파일"해서 요청마다 쓰는 전용 검증 함수로 만듦 (COMPILED_PARAMS=1 일 때만 사용)
+# 필드마다 TypeAdapter 를 미리 만들어 두고, 들어온 값만 검증한 뒤 model_construct 로 바로 모델을 만듦
+# 에러가 하나라도 있으면 FastAPI 와 똑같은 방식으로 dict 를 만들어 모델 전체를 검증 -> 에러 응답이 완전히 같음
+class ParamsValidator:
+    def __init__(self, model: type[BaseModel], source: Literal["query", "header"]):
+        self.model = model
+        self.source = source
+        self.forbid_extra = model.model_config.get("extra") == "forbid"
+        self.fields = []
+        self.known_keys = set()
+        self.required_names = {name for name, field in model.model_fields.items() if field.is_required()}
+        for name, field in model.model_fields.items():
+            key = field.validation_alias if isinstance(field.validation_alias, str) else (field.alias or name)
+            lookup = key.replace("_", "-") if source == "header" and key == name else key
+            is_list = get_origin(field.annotation) in (list, List, set, Set)
+            adapter = TypeAdapter(Annotated[field.annotation, *field.metadata] if field.metadata else field.annotation)
+            self.fields.append((name, key, lookup, is_list, adapter.validate_python))
+            self.known_keys.update((key, lookup))
+
+    def __call__(self, params):
+        if self.forbid_extra:
+            for key in params.keys():
+                if key not in self.known_keys:
+                    return self._validate_slow(params)
+        values = {}
+        try:
+            for name, _, lookup, is_list, validate in self.fields:
+                if is_list:
+                    raw = params.getlist(lookup)
+                    if not raw:
+                        continue
+                else:
+                    raw = params.get(lookup)
+                    if raw is None:
+                        continue
+                values[name] = validate(raw)
+        except ValidationError:
+            return self._validate_slow(params)
+        # 값이 없는 필드는 model_construct 가 기본값으로 채움 (필수 필드가 빠졌으면 slow path 에서 missing 에러)
+        if not self.required_names <= values.keys():
+            return self._validate_slow(params)
+        return self.model.model_construct(**values)
+
+    def _validate_slow(self, params):
+        # fastapi.dependencies.utils.request_params_to_args 와 같은 방식으로 dict 를 만들어 검증
+        raw = {}
+        processed = set()
+        for name, key, lookup, is_list, _ in self.fields:
+            value = params.getlist(lookup) if is_list else params.get(lookup)
+            if value is None or value == []:
+                field = self.model.model_fields[name]
+                value = None if field.is_required() else copy.deepcopy(field.default)
+            if value is not None:
+                raw[key] = value
+            processed.update((key, lookup))
+        for key in params.keys():
+            if key not in processed:
+                value = params.getlist(key)
+                raw[key] = value[0] if len(value) == 1 else value
+        try:
+            return self.model.model_validate(raw)
+        except ValidationError as exc:
+            raise RequestValidationError(
+                [{**error, "loc": (self.source, *error["loc"])} for error in exc.errors(include_url=False)]
+            )
+
+    async def dependency(self, request: Request):
+        return self(request.query_params if self.source == "query" else request.headers)
+
+    def openapi_parameters(self):
+        # Depends 로 바꾸면 FastAPI 가 문서에 매개변수를 못 그리므로 모델 스키마로 직접 채워 넣음
+        schema = self.model.model_json_schema()
+        return [
+            {
+                "name": lookup,
+                "in": self.source,
+                "required": key in schema.get("required", ()),
+                "schema": schema["properties"][key],
+            }
+            for _, key, lookup, _, _ in self.fields
+        ]
+
+
+if os.environ.get("COMPILED_PARAMS") == "1":
+    filter_params_validator = ParamsValidator(FilterParams, "query")
+    FilterQuery = Annotated[FilterParams, Depends(filter_params_validator.dependency)]
+    filter_query_openapi = {"parameters": filter_params_validator.openapi_parameters()}
+else:
+    FilterQuery = Annotated[FilterParams, Query()]
+    filter_query_openapi = None
 
 # @app.get("/items/")
 # async def read_items(filter_query: Annotated[FilterParams, Query()]):
 #     return filter_query
+
+@app.get("/items/", openapi_extra=filter_query_openapi)
+async def read_items(filter_query: FilterQuery):
+    try:
+        items, next_cursor = fake_items_db.page(
+            filter_query.order_by,
+            filter_query.limit,
+            filter_query.offset,
+            filter_query.tags,
+            filter_query.cursor,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"items": items, "next_cursor": next_cursor}
+# http://localhost:8000/items/?limit=2&order_by=updated_at&tags=gyeore
+# 다음 페이지는 offset 대신 응답의 next_cursor를 cursor로 넘기면 앞쪽을 건너뛰지 않고 바로 이어서 읽음
 # http://localhost:8000/items/?limit=1&offset=0&order_by=updated_at&tags=gyeore&tags=haneul
 # 연관된 쿼리 매개변수 그룹이 있다면 Pydantic 모델 을 사용해 선언할 수 있습니다
 # http://localhost:8000/items/?limit=1&offset=0&order_by=updated_at&tags=gyeore&tags=haneul&aa=bb
 # 만약 클라이언트가 쿼리 매개변수로 추가적인 데이터를 보내려고 하면, 클라이언트는 에러 응답을 받게 됩니다.
 
+# 페이지 없이 전체 목록을 내보냄 (한꺼번에 만들지 않고 batch_size 개씩 스트리밍)
+@app.get("/items/export", response_class=StreamingListResponse)
+@streaming_route
+async def export_items(
+        order_by: Literal["created_at", "updated_at"] = "created_at",
+        tags: Annotated[list[str], Query()] = [],
+        format: Literal["json", "ndjson"] = "json",
+        batch_size: Annotated[int, Query(gt=0, le=10000)] = 256,
+):
+    return StreamingListResponse(iter_stored_items(order_by, tags), batch_size=batch_size, ndjson=format == "ndjson")
+# http://localhost:8000/items/export?format=ndjson&tags=gyeore
+
 # @app.put("/items/{item_id}")
 # async def update_item(
 #         *,
@@ -368,10 +3287,15 @@ class FilterParams(BaseModel):
 #     return offer
 
 @app.post("/images/multiple/")
+@rate_limit(rate=20, burst=40)
+@compression_policy("fast")
+@offload_body()
 async def create_multiple_images(images: List[Image]):
-    return images
+    return StreamingListResponse(images)
 
 @app.post("/index-weights/")
+@compression_policy("fast")
+@offload_body()
 async def create_index_weights(weights: Dict[int, float]):
     return weights
 # JSON 사양상 key는 무조건 문자열로만 구성되어야 하며, FastAPI는 이를 받아서 Python에서 기대하는 타입(int, float, 등)으로 자동 변환해줍니다.
@@ -645,6 +3569,66 @@ class CommonHeaders(BaseModel):
 # 이를 위해 표준 Python 타입 힌트인 typing.Union을 사용할 수 있습니다:
 # 하지만 이를 response_model=PlaneItem | CarItem과 같이 할당하면 에러가 발생합니다. 이는 Python이 이를 타입 어노테이션으로 해석하지 않고, PlaneItem과 CarItem 사이의 잘못된 연산(invalid operation)을 시도하기 때문입니다
 
+# 그냥 Union 이면 Pydantic 이 변형을 하나씩 검증해 보므로 변형이 많을수록 느려지고, 실패하면 모든 변형의 에러가 다 나옴
+# type 필드를 판별자(discriminator)로 쓰면 type 값 -> 변형 표(dict)로 한 번에 골라서 그 변형만 검증/직렬화함
+# 하위 클래스는 type: Literal["..."] 만 선언하면 정의될 때 CatalogItem.variants 에 등록되고,
+# 모든 변형을 정의한 뒤 catalog_union() 으로 판별 Union 을 한 번 만들어 요청 본문과 response_model 에 같이 씀
+class CatalogItem(BaseModel):
+    type: str
+    description: str
+
+    variants: ClassVar[dict] = {}
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs):
+        super().__pydantic_init_subclass__(**kwargs)
+        field = cls.model_fields["type"]
+        if get_origin(field.annotation) is not Literal or len(field.annotation.__args__) != 1:
+            raise TypeError(f"{cls.__name__}.type must be a single Literal tag")
+        tag = field.annotation.__args__[0]
+        if tag in CatalogItem.variants:
+            raise TypeError(f"Duplicate catalog item type {tag!r}")
+        CatalogItem.variants[tag] = cls
+
+
+class CarItem(CatalogItem):
+    type: Literal["car"] = "car"
+
+
+class PlaneItem(CatalogItem):
+    type: Literal["plane"] = "plane"
+    size: int
+
+
+def catalog_union(variants=None):
+    # variants 를 주면 그 변형들로만 만듦 (기본은 등록된 전체)
+    variants = tuple(CatalogItem.variants.values() if variants is None else variants)
+    return Annotated[Union[variants], Field(discriminator="type")]
+
+
+AnyCatalogItem = catalog_union()
+
+catalog_items = {
+    "item1": CarItem(description="All my friends drive a low rider"),
+    "item2": PlaneItem(description="Music is my aeroplane, it's my aeroplane", size=5),
+}
+
+
+@app.get("/catalog/{item_id}", response_model=AnyCatalogItem)
+async def read_catalog_item(item_id: str):
+    item = catalog_items.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
+
+
+@app.put("/catalog/{item_id}", response_model=AnyCatalogItem)
+async def replace_catalog_item(item_id: str, item: AnyCatalogItem):
+    catalog_items[item_id] = item
+    return item
+# http://localhost:8000/catalog/item2
+# {"type": "plane", "description": "...", "size": 5} 처럼 type 으로 변형을 고름 (없는 type 이면 422 union_tag_invalid)
+
 # class Item(BaseModel):
 #     name: str
 #     description: str
@@ -0,0 +1,39 @@
+# 빌드 시점에 OpenAPI 스키마를 만들어 openapi.json 으로 저장: python -m openapi_schema
+# main 은 시작할 때 이 파일을 읽기만 하므로 /docs 첫 요청에서 모든 라우트의 스키마를 만들지 않음
+# 라우트나 모델을 바꾸면 다시 실행해야 함 (--check 는 파일이 현재 코드와 다르면 실패)
+import argparse
+import json
+import sys
+
+from main import OPENAPI_SCHEMA_PATH, app, build_openapi_schema
+
+
+def render() -> str:
+    return json.dumps(build_openapi_schema(app), ensure_ascii=False, indent=2, sort_keys=True) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m openapi_schema")
+    parser.add_argument("--output", default=str(OPENAPI_SCHEMA_PATH))
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args(argv)
+
+    schema = render()
+    if args.check:
+        try:
+            with open(args.output, encoding="utf-8") as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current != schema:
+            print(f"{args.output} is out of date (run python -m openapi_schema)", file=sys.stderr)
+            return 1
+        return 0
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(schema)
+    print(f"wrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
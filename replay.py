@@ -0,0 +1,296 @@
+# 캡처한 트래픽(JSONL) 재생 부하 테스트: python -m replay capture.jsonl
+# 한 줄 = {"method", "path", "headers", "body" 또는 "body_b64"} (main.CaptureMiddleware 가 쓰는 형식, "status" 등 다른 키는 무시)
+# "path" 는 클라이언트가 보낸 요청 대상 그대로 (퍼센트 인코딩된 경로 + "?" + 쿼리 문자열)
+#
+# 기본은 같은 프로세스에서 ASGI 앱(--app, 기본 main:app)을 직접 호출하고, --url 을 주면 실제 HTTP 로 보냄 (httpx 필요)
+# --rate 를 주면 개방 루프: 정해진 도착률로 요청을 보내고 지연 시간은 "보냈어야 할 시각"부터 재므로
+#   서버가 밀려서 늦게 보낸 요청의 대기 시간도 결과에 들어감. 없으면 --concurrency 개의 닫힌 루프로 최대한 보냄
+# 결과는 라우트(경로 템플릿)별 요청 수, 처리량, 에러 수, 지연 시간 백분위수
+import argparse
+import asyncio
+import base64
+import importlib
+import itertools
+import json
+import math
+import random
+import sys
+from urllib.parse import unquote
+
+from starlette.routing import Match
+
+
+def load_capture(path: str):
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                method = record.get("method", "GET").upper()
+                target = record["path"]
+            except (ValueError, KeyError) as e:
+                raise SystemExit(f"{path}:{lineno}: invalid capture record ({e})")
+            headers = {k.lower(): v for k, v in record.get("headers", {}).items()}
+            body = b""
+            if "body" in record:
+                body = json.dumps(record["body"]).encode()
+                headers.setdefault("content-type", "application/json")
+            elif "body_b64" in record:
+                body = base64.b64decode(record["body_b64"])
+            headers.pop("content-length", None)
+            headers.pop("host", None)
+            records.append((method, target, headers, body))
+    if not records:
+        raise SystemExit(f"{path}: no requests")
+    return records
+
+
+def load_app(spec: str):
+    module_name, _, attr = spec.partition(":")
+    module = importlib.import_module(module_name)
+    app = getattr(module, attr or "app")
+    # 지연 라우터까지 미리 불러 둬야 라우트 템플릿을 찾을 수 있고 첫 요청 지연도 결과에 섞이지 않음
+    load_lazy_routes = getattr(module, "load_lazy_routes", None)
+    if load_lazy_routes is not None:
+        load_lazy_routes(app)
+    return app
+
+
+class RouteLabels:
+    def __init__(self, app):
+        self.routes = app.router.routes if app is not None else []
+        self.labels = {}
+
+    def __call__(self, method: str, target: str) -> str:
+        path = unquote(target.split("?", 1)[0])
+        key = (method, path)
+        label = self.labels.get(key)
+        if label is None:
+            label = f"{method} {path}" if not self.routes else f"{method} <unmatched>"
+            scope = {"type": "http", "method": method, "path": path, "root_path": ""}
+            for route in self.routes:
+                match, _ = route.matches(scope)
+                if match != Match.NONE:
+                    label = f"{method} {getattr(route, 'path', path)}"
+                    break
+            self.labels[key] = label
+        return label
+
+
+class AsgiClient:
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, target: str, headers: dict, body: bytes) -> int:
+        # target 은 캡처한 raw_path 그대로(퍼센트 인코딩 유지)라서 scope["path"] 만 서버처럼 디코딩함
+        raw_path, _, query = target.partition("?")
+        raw_headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.4"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": unquote(raw_path),
+            "raw_path": raw_path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "root_path": "",
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("replay", 80),
+            "state": {},
+        }
+        sent = False
+        done = asyncio.Event()
+        status = 500
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            done.set()
+        return status
+
+    async def close(self):
+        pass
+
+
+class HttpClient:
+    def __init__(self, url: str, connections: int, timeout: float):
+        try:
+            import httpx
+        except ImportError:
+            raise SystemExit("--url requires httpx (pip install httpx)")
+        self.client = httpx.AsyncClient(
+            base_url=url, timeout=timeout,
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        )
+
+    async def request(self, method: str, target: str, headers: dict, body: bytes) -> int:
+        response = await self.client.request(method, target, headers=headers, content=body)
+        await response.aread()
+        return response.status_code
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, label: str, latency: float, status):
+        self.latencies.setdefault(label, []).append(latency)
+        statuses = self.statuses.setdefault(label, {})
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == "error" or status >= 500:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def summary(self, elapsed: float):
+        rows = []
+        everything = []
+        for label in sorted(self.latencies):
+            latencies = sorted(self.latencies[label])
+            everything.extend(latencies)
+            rows.append(self.row(label, latencies, self.errors.get(label, 0), elapsed, self.statuses[label]))
+        everything.sort()
+        statuses = {}
+        for route_statuses in self.statuses.values():
+            for status, count in route_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+        total = self.row("TOTAL", everything, sum(self.errors.values()), elapsed, statuses)
+        return rows, total
+
+    @staticmethod
+    def row(label, latencies, errors, elapsed, statuses):
+        def percentile(p):
+            # nearest-rank
+            return latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)] * 1000
+
+        return {
+            "route": label,
+            "count": len(latencies),
+            "rps": len(latencies) / elapsed if elapsed else 0.0,
+            "errors": errors,
+            "non_2xx": sum(count for status, count in statuses.items() if not str(status).startswith("2")),
+            "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+            "p50_ms": percentile(50),
+            "p90_ms": percentile(90),
+            "p99_ms": percentile(99),
+            "max_ms": latencies[-1] * 1000,
+        }
+
+
+async def replay(client, records, labels, args):
+    results = Results()
+    loop = asyncio.get_running_loop()
+    total = args.requests or len(records)
+    stream = itertools.islice(itertools.cycle(records), total)
+
+    async def issue(record, intended):
+        method, target, headers, body = record
+        try:
+            status = await client.request(method, target, headers, body)
+        except Exception:
+            status = "error"
+        results.record(labels(method, target), loop.time() - intended, status)
+
+    start = loop.time()
+    if args.rate:
+        tasks = []
+        intended = start
+        for record in stream:
+            delay = intended - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(issue(record, intended)))
+            intended += random.expovariate(args.rate) if args.arrival == "poisson" else 1 / args.rate
+        await asyncio.gather(*tasks)
+    else:
+        async def worker():
+            for record in stream:
+                await issue(record, loop.time())
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return results, loop.time() - start
+
+
+def print_report(rows, total, elapsed, out=sys.stdout):
+    print(f"{'route':<40} {'count':>7} {'req/s':>9} {'non2xx':>6} {'err':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}",
+          file=out)
+    for row in [*rows, total]:
+        print(f"{row['route'][:40]:<40} {row['count']:>7} {row['rps']:>9.1f} {row['non_2xx']:>6} {row['errors']:>5} "
+              f"{row['p50_ms']:>9.2f} {row['p90_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['max_ms']:>9.2f}", file=out)
+    print(f"elapsed {elapsed:.2f}s", file=out)
+
+
+async def run(args):
+    records = load_capture(args.capture)
+    if args.url:
+        try:
+            app = load_app(args.app or "main:app")
+        except ImportError:
+            if args.app:
+                raise
+            app = None
+        client = HttpClient(args.url, args.concurrency, args.timeout)
+        lifespan = None
+    else:
+        app = load_app(args.app or "main:app")
+        client = AsgiClient(app)
+        lifespan = app.router.lifespan_context(app)
+    labels = RouteLabels(app)
+    if lifespan is not None:
+        await lifespan.__aenter__()
+    try:
+        results, elapsed = await replay(client, records, labels, args)
+    finally:
+        await client.close()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    rows, total = results.summary(elapsed)
+    if args.json:
+        json.dump({"elapsed": elapsed, "routes": rows, "total": total}, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(rows, total, elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m replay")
+    parser.add_argument("capture", help="JSONL capture file")
+    parser.add_argument("--app", help="ASGI app to call in-process (module:attr, default main:app); "
+                                      "with --url it is only used to group paths by route template")
+    parser.add_argument("--url", help="send over HTTP to this base URL instead of calling the app in-process")
+    parser.add_argument("--requests", type=int, default=0, help="total requests (cycles the capture; default: once)")
+    parser.add_argument("--rate", type=float, default=0.0, help="open-loop arrival rate in req/s")
+    parser.add_argument("--arrival", choices=("uniform", "poisson"), default="uniform")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="closed-loop workers (without --rate) and HTTP connection limit")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# /batch: 하위 요청 여러 개를 한 번에 처리 (main 의 LazyRoutes 가 첫 요청 때 import)
+import asyncio
+import json
+from typing import Annotated, Any, Dict, List, Literal
+from urllib.parse import unquote
+
+from fastapi import APIRouter, Body, HTTPException, Request
+from pydantic import BaseModel, Field
+from starlette.routing import Match, WebSocketRoute
+
+from main import InstrumentedRoute, LazyRoutes
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+# 배치 요청: 하위 요청 배열을 받아서 루프백 HTTP 없이 같은 프로세스의 ASGI 앱을 직접 호출 (라우팅/검증/미들웨어 모두 그대로 거침)
+# 하위 요청들은 asyncio 로 동시에 실행되고, 각 결과의 상태 코드는 따로 돌려줌
+# 하위 응답은 끝까지 모아야 하므로 스트리밍 라우트(@streaming_route)와 웹소켓 라우트는 미리 400 으로 거절하고,
+# 하위 요청마다 BATCH_ITEM_TIMEOUT 이 지나면 504. 바깥 요청의 클라이언트가 끊기면 하위 요청들에게도 http.disconnect 를 전달함
+# 하위 요청은 수용 제어를 다시 거치지 않는 대신, 바깥 요청이 동시에 돌릴 하위 요청 수(min(개수, BATCH_CONCURRENCY))만큼
+# 수용 제어 자리를 잡고 시작함 (못 잡으면 503). 그래서 /batch 로도 워커의 동시 처리 한도를 넘지 않음
+MAX_BATCH_SIZE = 100
+BATCH_CONCURRENCY = 16
+BATCH_ITEM_TIMEOUT = 10.0
+
+
+class BatchRequestItem(BaseModel):
+    model_config = {"extra": "forbid"}
+
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str = Field(pattern=r"^/")
+    headers: Dict[str, str] = {}
+    body: Any = None
+
+
+def _error(status: int, detail: str):
+    return {"status": status, "headers": {}, "body": {"detail": detail}}
+
+
+def _find_route(routes, scope, websocket_scope):
+    for route in routes:
+        if isinstance(route, WebSocketRoute):
+            if route.matches(websocket_scope)[0] is Match.FULL:
+                return route
+            continue
+        # 지연 라우터는 include_router 로 붙으므로 그 안에서 실제 라우트를 찾음
+        included = getattr(route, "original_router", None)
+        if included is not None:
+            found = _find_route(included.routes, scope, websocket_scope)
+            if found is not None:
+                return found
+            continue
+        if route.matches(scope)[0] is Match.FULL:
+            return route
+    return None
+
+
+def _resolve_route(app, scope):
+    websocket_scope = {**scope, "type": "websocket"}
+    route = _find_route(app.router.routes, scope, websocket_scope)
+    if isinstance(route, LazyRoutes):
+        # 아직 불러오지 않은 라우터면 지금 불러온 뒤 실제 라우트로 다시 찾음
+        route.load()
+        route = _find_route(app.router.routes, scope, websocket_scope)
+    return route
+
+
+async def dispatch_subrequest(
+        request: Request, item: BatchRequestItem, semaphore: asyncio.Semaphore, disconnected: asyncio.Event
+):
+    raw_path, _, query = item.path.partition("?")
+    # 실제 요청처럼 path 는 퍼센트 디코딩한 값, raw_path 는 받은 그대로
+    path = unquote(raw_path)
+    if path == "/batch":
+        return _error(400, "Nested batch requests are not allowed")
+    headers = {k.lower(): v for k, v in item.headers.items()}
+    body = b""
+    if item.body is not None:
+        body = json.dumps(item.body).encode()
+        headers.setdefault("content-type", "application/json")
+    headers["content-length"] = str(len(body))
+    parent = request.scope
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": parent.get("http_version", "1.1"),
+        "method": item.method,
+        "scheme": parent.get("scheme", "http"),
+        "path": path,
+        "raw_path": raw_path.encode(),
+        "query_string": query.encode(),
+        "root_path": parent.get("root_path", ""),
+        "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        "client": parent.get("client"),
+        "server": parent.get("server"),
+        "state": dict(parent.get("state", {})),
+        # 바깥 /batch 요청이 하위 요청 몫까지 수용 제어 자리를 잡았으므로 미들웨어들이 하위 요청을 알아볼 수 있게 표시
+        "subrequest": True,
+    }
+    route = _resolve_route(request.app, scope)
+    if isinstance(route, WebSocketRoute):
+        return _error(400, "WebSocket routes cannot be batched")
+    if getattr(getattr(route, "endpoint", None), "streaming_route", False):
+        return _error(400, "Streaming routes cannot be batched")
+    sent_body = False
+    status_code = 500
+    response_headers = []
+    chunks = []
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status_code, response_headers
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            response_headers = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    async with semaphore:
+        try:
+            await asyncio.wait_for(request.app(scope, receive, send), BATCH_ITEM_TIMEOUT)
+        except TimeoutError:
+            return _error(504, "Sub-request timed out")
+        except Exception:
+            # ServerErrorMiddleware 가 500 응답을 보낸 뒤 예외를 다시 던지므로, 이 하위 요청만 실패로 남김
+            if not chunks:
+                status_code = 500
+
+    decoded_headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in response_headers}
+    content = b"".join(chunks)
+    if decoded_headers.get("content-type", "").startswith("application/json") and content:
+        response_body = json.loads(content)
+    else:
+        response_body = content.decode("utf-8", errors="replace")
+    return {"status": status_code, "headers": decoded_headers, "body": response_body}
+
+
+@router.post("/batch")
+async def batch(request: Request, items: Annotated[List[BatchRequestItem], Body(max_length=MAX_BATCH_SIZE)]):
+    concurrency = max(1, min(len(items), BATCH_CONCURRENCY))
+    # 바깥 요청이 이미 한 자리를 쥐고 있으므로 나머지만 더 잡음 (워커 한도보다 많이는 못 잡으므로 그만큼만 동시에 돌림)
+    admission = request.scope.get("admission")
+    extra = 0
+    if admission is not None:
+        concurrency = min(concurrency, admission.max_concurrency)
+        extra = concurrency - 1
+    if extra and not await admission.admit(extra):
+        admission.shed += 1
+        raise HTTPException(status_code=503, detail="Service Unavailable", headers={"Retry-After": "1"})
+    try:
+        return await run_batch(request, items, concurrency)
+    finally:
+        if extra:
+            admission.release(extra)
+
+
+async def run_batch(request: Request, items: List[BatchRequestItem], concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        responses = await asyncio.gather(
+            *(dispatch_subrequest(request, item, semaphore, disconnected) for item in items)
+        )
+    finally:
+        watcher.cancel()
+    return {"responses": responses}
+# [{"path": "/hello/gyeore"}, {"path": "/users/haneul"}, {"path": "/models/lenet"}] 를 POST 하면 세 결과가 순서대로 옴
@@ -0,0 +1,194 @@
+# /files: FILES_ROOT 아래 정적 파일 서빙 (main 의 LazyRoutes 가 첫 요청 때 import)
+import mimetypes
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException, Response
+from starlette.concurrency import run_in_threadpool
+
+from main import InstrumentedRoute
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+# 파일 서빙: FILES_ROOT 아래의 파일만 내보냄 (resolve 후 루트 밖이면 404 라서 ../ 나 심볼릭 링크로 빠져나갈 수 없음)
+# 서버가 ASGI zerocopysend 확장을 지원하면 파일 객체를 넘겨 커널이 sendfile 로 바로 보내고,
+# 아니면 os.pread 로 청크 단위로 읽어 보냄 (파일 위치를 공유하지 않으므로 같은 fd 로 동시 Range 요청 가능)
+FILES_ROOT = pathlib.Path(os.environ.get("FILES_ROOT", "files")).resolve()
+FILE_CHUNK_SIZE = 1 << 20
+
+
+class OpenFile:
+    __slots__ = ("file", "size", "mtime_ns", "ino", "users", "evicted")
+
+    def __init__(self, path: pathlib.Path):
+        self.file = open(path, "rb", buffering=0)
+        st = os.fstat(self.file.fileno())
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.ino = st.st_ino
+        self.users = 0
+        self.evicted = False
+
+    @property
+    def etag(self):
+        return f'"{self.ino:x}-{self.mtime_ns:x}-{self.size:x}"'
+
+
+class OpenFileCache:
+    # 자주 받는 파일의 fd 를 열어둔 채로 재사용하는 LRU. 전송 중인 파일은 밀려나도 전송이 끝난 뒤에 닫음
+    # lookup/acquire 는 stat/open 때문에 스레드풀에서 부르므로 항목 변경은 락 안에서 함
+    # 핸들러는 lookup 으로 메타데이터만 보고, fd 는 응답을 실제로 보낼 때(FileRangeResponse.__call__) pin 해서
+    # 응답이 끝내 전송되지 않아도 users 가 남아 fd 가 안 닫히는 일이 없음
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, path: pathlib.Path) -> OpenFile:
+        entry = self.acquire(path)
+        self.release(entry)
+        return entry
+
+    def acquire(self, path: pathlib.Path) -> OpenFile:
+        st = os.stat(path)
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None and (entry.ino, entry.mtime_ns, entry.size) != (st.st_ino, st.st_mtime_ns, st.st_size):
+                self._evict(path)
+                entry = None
+            if entry is None:
+                entry = self._files[path] = OpenFile(path)
+                while len(self._files) > self.maxsize:
+                    self._evict(next(iter(self._files)))
+            else:
+                self._files.move_to_end(path)
+            entry.users += 1
+            return entry
+
+    def pin(self, entry: OpenFile) -> bool:
+        # 이미 밀려나 닫힌 항목이면 False (호출한 쪽에서 acquire 로 다시 엶)
+        with self._lock:
+            if entry.file.closed:
+                return False
+            entry.users += 1
+            return True
+
+    def release(self, entry: OpenFile):
+        with self._lock:
+            entry.users -= 1
+            if entry.evicted and not entry.users:
+                entry.file.close()
+
+    def _evict(self, path: pathlib.Path):
+        entry = self._files.pop(path)
+        entry.evicted = True
+        if not entry.users:
+            entry.file.close()
+
+
+open_file_cache = OpenFileCache(int(os.environ.get("OPEN_FILE_CACHE_SIZE", "256")))
+
+
+def parse_range(header: str | None, size: int):
+    # 단일 범위만 처리하고 (start, end) 를 돌려줌 (end 포함). 범위가 없거나 여러 개거나 문법이 틀리면 None -> 전체 전송
+    # 문법은 맞지만 만족할 수 없는 범위 (파일 끝 뒤에서 시작, bytes=-0, 빈 파일의 접미사 범위) 는 416
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start, sep, end = header[6:].strip().partition("-")
+    if not sep or not (start or end) or not all(part.isdigit() for part in (start, end) if part):
+        return None
+    if not start:
+        length = int(end)
+        if length == 0 or size == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+class FileRangeResponse(Response):
+    def __init__(self, path: pathlib.Path, entry: OpenFile, byte_range, media_type: str | None):
+        self.path = path
+        self.entry = entry
+        self.background = None
+        if byte_range is None:
+            self.status_code = 200
+            self.offset, self.length = 0, entry.size
+        else:
+            self.status_code = 206
+            self.offset, self.length = byte_range[0], byte_range[1] - byte_range[0] + 1
+        headers = {
+            "accept-ranges": "bytes",
+            "content-length": str(self.length),
+            "content-type": media_type or "application/octet-stream",
+            "etag": entry.etag,
+            "last-modified": format_datetime(datetime.fromtimestamp(entry.mtime_ns / 1e9, timezone.utc), usegmt=True),
+        }
+        if byte_range is not None:
+            headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{entry.size}"
+        self.raw_headers = [(k.encode(), v.encode()) for k, v in headers.items()]
+
+    async def __call__(self, scope, receive, send):
+        entry = self.entry
+        if not open_file_cache.pin(entry):
+            # 핸들러와 전송 사이에 밀려나 닫혔음: 다시 열고, 그 사이 파일이 바뀌었으면 약속한 헤더와 맞지 않으므로 다시 요청하게 함
+            entry = await run_in_threadpool(open_file_cache.acquire, self.path)
+            if entry.etag != self.entry.etag:
+                open_file_cache.release(entry)
+                await send({"type": "http.response.start", "status": 503,
+                            "headers": [(b"content-length", b"0"), (b"retry-after", b"0")]})
+                await send({"type": "http.response.body", "body": b""})
+                return
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": entry.file,
+                    "offset": self.offset,
+                    "count": self.length,
+                })
+                return
+            fd = entry.file.fileno()
+            offset, remaining = self.offset, self.length
+            while remaining:
+                chunk = await run_in_threadpool(os.pread, fd, min(FILE_CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+            if remaining:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            open_file_cache.release(entry)
+
+
+def open_file(file_path: str):
+    # resolve/stat/open 은 디스크를 건드리므로 스레드풀에서 부름. 없거나 루트 밖이면 None
+    path = (FILES_ROOT / file_path).resolve()
+    if not path.is_relative_to(FILES_ROOT) or not path.is_file():
+        return None
+    try:
+        return path, open_file_cache.lookup(path)
+    except OSError:
+        return None
+
+
+# 경로 변환기
+@router.get("/files/{file_path:path}")
+async def read_file(file_path: str, range: Annotated[str | None, Header()] = None):
+    opened = await run_in_threadpool(open_file, file_path)
+    if opened is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    path, entry = opened
+    return FileRangeResponse(path, entry, parse_range(range, entry.size), mimetypes.guess_type(path.name)[0])
+# http://localhost:8000/files/some/dir/report.pdf  (curl -H "Range: bytes=0-1023" 로 부분 요청)
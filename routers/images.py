@@ -0,0 +1,136 @@
+# /images/multiple/stream, /images/url-cache: 이미지 배열 스트리밍 수집 (main 의 LazyRoutes 가 첫 요청 때 import)
+import codecs
+import json
+from typing import Literal
+
+from fastapi import APIRouter, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from main import Image, InstrumentedRoute, compression_policy, rate_limit, streaming_route, url_cache
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+# 스트리밍 모드: 본문 전체를 읽지 않고 JSON 배열을 원소 단위로 파싱/검증하면서 바로 응답으로 흘려보냄
+# 버퍼에는 아직 파싱되지 않은 꼬리 부분(원소 하나 + 청크 하나 정도)만 남으므로 배치 크기와 무관하게 메모리가 일정함
+MAX_STREAM_ELEMENT_SIZE = 1 << 20
+
+
+class JsonArrayStreamError(ValueError):
+    pass
+
+
+async def iter_json_array(chunks):
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    # "[" -> 배열 시작, "v]" -> 첫 원소 또는 빈 배열 끝, "v" -> 원소, ",]" -> 구분자 또는 배열 끝
+    expect = "["
+    eof = False
+    chunk_iter = chunks.__aiter__()
+
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos < len(buf):
+            ch = buf[pos]
+            if expect == "[":
+                if ch != "[":
+                    raise JsonArrayStreamError("Request body must be a JSON array")
+                expect = "v]"
+                pos += 1
+                continue
+            if ch == "]" and expect in ("v]", ",]"):
+                return
+            if expect == ",]":
+                if ch != ",":
+                    raise JsonArrayStreamError("Expected ',' or ']' between array elements")
+                expect = "v"
+                pos += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise JsonArrayStreamError("Malformed JSON array element")
+                if len(buf) - pos > MAX_STREAM_ELEMENT_SIZE:
+                    raise JsonArrayStreamError("JSON array element is too large")
+            else:
+                # 값이 버퍼 끝에서 끝났거나 (예: 숫자 "12" + 다음 청크 "34"), 숫자 뒤에 덜 온 소수부/지수부만 남았다면
+                # (예: "-0." + 다음 청크 "5") 더 읽어 본 뒤에 확정
+                incomplete = end == len(buf) or (type(value) in (int, float) and not buf[end:].lstrip("+-.eE0123456789"))
+                if eof or not incomplete:
+                    pos = end
+                    expect = ",]"
+                    yield value
+                    continue
+        elif eof:
+            raise JsonArrayStreamError("Unexpected end of JSON array")
+
+        # 더 읽어야 판단할 수 있으면 다음 청크를 기다림 (이미 소비한 앞부분은 버림)
+        try:
+            chunk = await chunk_iter.__anext__()
+        except StopAsyncIteration:
+            eof = True
+            buf = buf[pos:] + utf8.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+
+
+class RequestStreamingResponse(StreamingResponse):
+    # 요청 본문을 읽으면서 응답을 내보내므로, StreamingResponse의 disconnect 감시 태스크가 receive()를 가로채지 않게 함
+    # 클라이언트가 끊기면 request.stream()이 ClientDisconnect를 던지면서 스트림이 멈춤
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def stream_images(request: Request, ndjson: bool):
+    if not ndjson:
+        yield b"["
+    index = 0
+    try:
+        async for raw in iter_json_array(request.stream()):
+            try:
+                image = Image.model_validate(raw)
+            except ValidationError as exc:
+                error = {"index": index, "detail": exc.errors(include_url=False)}
+                record = json.dumps(jsonable_encoder(error), separators=(",", ":")).encode()
+                yield (b"," if index and not ndjson else b"") + record
+                break
+            line = image.model_dump_json().encode()
+            if ndjson:
+                yield line + b"\n"
+            else:
+                yield (b"," if index else b"") + line
+            index += 1
+    except JsonArrayStreamError as exc:
+        error = {"index": index, "detail": str(exc)}
+        yield (b"," if index and not ndjson else b"") + json.dumps(error, separators=(",", ":")).encode()
+    if not ndjson:
+        yield b"]"
+
+
+@router.get("/images/url-cache")
+async def read_url_cache_stats():
+    return url_cache.stats()
+
+
+@router.post("/images/multiple/stream")
+@rate_limit(rate=20, burst=40)
+@compression_policy("fast")
+@streaming_route
+async def create_multiple_images_stream(
+        request: Request, format: Literal["ndjson", "json"] = "ndjson"
+):
+    ndjson = format == "ndjson"
+    return RequestStreamingResponse(
+        stream_images(request, ndjson),
+        media_type="application/x-ndjson" if ndjson else "application/json",
+    )
+# http://localhost:8000/images/multiple/stream?format=json
+# 응답 헤더가 이미 전송된 뒤라 상태 코드를 바꿀 수 없으므로, 검증 실패 시 {"index", "detail"} 레코드를 마지막 원소로 내보내고 멈춤
@@ -0,0 +1,194 @@
+# /index-weights/columnar: 컬럼형 가중치 벡터 (main 의 LazyRoutes 가 첫 요청 때 import)
+import collections
+import itertools
+import json
+import math
+import operator
+import re
+import sys
+from array import array
+from typing import Dict
+
+import pydantic_core
+from fastapi import APIRouter, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import FiniteFloat, TypeAdapter, ValidationError
+
+from main import InstrumentedRoute, compression_policy
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+# 컬럼형 fast path: 수백만 개짜리 가중치 벡터를 Dict[int, float] 대신 array('q')/array('d') 두 버퍼로 들고 있음 (인덱스 순 정렬)
+# JSON 본문이 흔한 모양({"<정수>": <숫자>, ...})이면 정규식 한 번으로 문법을 확인한 뒤, 1MiB 청크마다 따옴표를 지우고 ":" 를
+# "," 로 바꾼 [키, 값, 키, 값 ...] 배열을 pydantic_core 로 읽어서 바로 두 열에 붙임 (본문 전체 크기의 dict/list 를 만들지 않음)
+# 그 외 모양(" 1" 같은 키, 문자열 값, 빈 객체, 잘못된 본문)은 /index-weights/ 와 같은 pydantic 검증으로 처리 (에러 모양도 여기서 나옴)
+# application/octet-stream 본문은 little-endian int64/float64 쌍의 연속. memoryview stride 슬라이스를 통째로 frombytes 해서 두 열로 나눔
+# 정렬: 이미 오름차순이면 그대로, 빈틈없는 구간(lo..hi)이면 제자리에 흩어 쓰고, 그 외에는 인덱스 argsort 한 번으로 두 열을 같이 재배치 (같은 인덱스는 dict 처럼 나중 값 우선)
+# NaN/Infinity 는 JSON 응답으로 돌려줄 수 없으므로 입력에서 422 로 거절
+_index_weights_adapter = TypeAdapter(Dict[int, FiniteFloat])
+_PAIR = b',"%d":%r'
+_PAIRS = re.compile(
+    rb'\s*+\{(?>\s*+"-?\d++"\s*+:\s*+[-+.eE\d]++\s*+,)*+\s*+"-?\d++"\s*+:\s*+[-+.eE\d]++\s*+\}\s*+'
+)
+_FLAT = bytes.maketrans(b"{}:", b"  ,")
+_CHUNK = 1 << 20
+
+
+def _body_validation_error(exc: ValidationError, body: bytes):
+    # 에러 경로에서만 FastAPI 본문 처리와 같은 순서(json.loads -> validate_python)로 다시 검증해서 에러 모양을 /index-weights/ 와 맞춤
+    try:
+        value = json.loads(body)
+    except json.JSONDecodeError as e:
+        return RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body", e.pos), "msg": "JSON decode error",
+              "input": {}, "ctx": {"error": e.msg}}],
+            body=e.doc,
+        )
+    try:
+        _index_weights_adapter.validate_python(value)
+    except ValidationError as python_exc:
+        exc = python_exc
+    errors = exc.errors(include_url=False)
+    for error in errors:
+        if error["type"] == "finite_number":
+            error["input"] = str(error["input"])
+    return RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in errors])
+
+
+def _index_range_error():
+    return RequestValidationError(
+        [{"type": "value_error", "loc": ("body",),
+          "msg": "Index must fit in a signed 64-bit integer", "input": None}]
+    )
+
+
+def _is_increasing(indices) -> bool:
+    return all(map(operator.lt, indices, itertools.islice(indices, 1, None)))
+
+
+def _scan_pairs(body: bytes):
+    # 흔한 모양이면 (indices, values), 아니면 None (호출하는 쪽이 pydantic 으로 다시 검증)
+    if _PAIRS.fullmatch(body) is None:
+        return None
+    indices = array("q")
+    values = array("d")
+    start = 0
+    while start < len(body):
+        # 이 모양에서 "," 는 쌍 사이에만 나오므로 그대로 청크 경계가 됨
+        end = body.find(b",", start + _CHUNK)
+        if end < 0:
+            end = len(body)
+        try:
+            flat = pydantic_core.from_json(b"[" + body[start:end].translate(_FLAT, b'"') + b"]", allow_inf_nan=False)
+            indices.fromlist(flat[0::2])
+            values.fromlist(flat[1::2])
+        except (ValueError, OverflowError):
+            # "01" 같은 키, 1e400 같은 값, int64 를 넘는 인덱스
+            return None
+        start = end + 1
+    # 유한수끼리 더한 값만 유한수 (합이 넘치면 느린 경로로 가서 다시 확인)
+    if not math.isfinite(sum(values)):
+        return None
+    return indices, values
+
+
+class IndexWeights:
+    __slots__ = ("indices", "values")
+
+    def __init__(self, indices: array, values: array):
+        self.indices = indices
+        self.values = values
+
+    def __len__(self):
+        return len(self.indices)
+
+    @classmethod
+    def from_columns(cls, indices: array, values: array):
+        if _is_increasing(indices):
+            return cls(indices, values)
+        lo, hi = min(indices), max(indices)
+        if hi - lo + 1 == len(indices):
+            # 빈틈없는 구간이면 정렬 없이 제자리(index - lo)에 바로 씀. 같은 인덱스가 반복됐다면 빈 자리의 NaN 이 남으므로 아래 정렬로 감
+            placed = array("d", [math.nan]) * len(values)
+            collections.deque(map(placed.__setitem__, map(operator.sub, indices, itertools.repeat(lo)), values), maxlen=0)
+            if math.isfinite(sum(placed)):
+                return cls(array("q", range(lo, hi + 1)), placed)
+        # 정렬 키는 |인덱스| <= 2**53 이면 float (정확히 표현되고, 2**30 을 넘는 int 끼리 비교하는 것보다 두 배쯤 빠름)
+        # sorted 는 stable 이라 같은 인덱스는 들어온 순서대로 붙어 있음
+        keys = list(map(float, indices)) if -2**53 <= lo and hi <= 2**53 else indices.tolist()
+        take = operator.itemgetter(*sorted(range(len(keys)), key=keys.__getitem__))
+        del keys
+        indices = array("q", take(indices))
+        values = array("d", take(values))
+        if not _is_increasing(indices):
+            # 같은 인덱스가 반복되면 묶음마다 마지막 값만 남김
+            last = [*map(operator.ne, indices, itertools.islice(indices, 1, None)), True]
+            indices = array("q", itertools.compress(indices, last))
+            values = array("d", itertools.compress(values, last))
+        return cls(indices, values)
+
+    @classmethod
+    def from_json(cls, body: bytes):
+        columns = _scan_pairs(body)
+        if columns is None:
+            try:
+                weights = _index_weights_adapter.validate_json(body)
+            except ValidationError as exc:
+                raise _body_validation_error(exc, body)
+            try:
+                columns = array("q", weights), array("d", weights.values())
+            except OverflowError:
+                raise _index_range_error()
+        return cls.from_columns(*columns)
+
+    @classmethod
+    def from_binary(cls, body: bytes):
+        if len(body) % 16:
+            raise RequestValidationError(
+                [{"type": "value_error", "loc": ("body",),
+                  "msg": "Binary body must be a sequence of 16-byte (int64, float64) pairs",
+                  "input": len(body)}]
+            )
+        view = memoryview(body)
+        indices = array("q")
+        values = array("d")
+        indices.frombytes(view.cast("q")[0::2].tobytes())
+        values.frombytes(view.cast("d")[1::2].tobytes())
+        if sys.byteorder != "little":
+            indices.byteswap()
+            values.byteswap()
+        if not all(map(math.isfinite, values)):
+            pos = next(i for i, value in enumerate(values) if not math.isfinite(value))
+            raise RequestValidationError(
+                [{"type": "finite_number", "loc": ("body", str(indices[pos])),
+                  "msg": "Input should be a finite number", "input": str(values[pos])}]
+            )
+        return cls.from_columns(indices, values)
+
+    def to_json_bytes(self) -> bytes:
+        # 기존 응답과 같은 {"<index>": <float>} 모양 (%r 은 stdlib json 과 같은 float repr, 값은 모두 유한수)
+        # 4096 쌍씩 [i0, v0, i1, v1, ...] 로 엮어서 포맷 한 번으로 찍음 (쌍마다 % 를 부르지 않음)
+        chunks = [b"{"]
+        for start in range(0, len(self), 4096):
+            indices = self.indices[start:start + 4096].tolist()
+            flat = [None] * (2 * len(indices))
+            flat[0::2] = indices
+            flat[1::2] = self.values[start:start + 4096].tolist()
+            chunks.append((_PAIR * len(indices)) % tuple(flat))
+        if len(chunks) > 1:
+            chunks[1] = chunks[1][1:]
+        chunks.append(b"}")
+        return b"".join(chunks)
+
+
+@router.post("/index-weights/columnar")
+@compression_policy("fast")
+async def create_index_weights_columnar(request: Request):
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/octet-stream"):
+        weights = IndexWeights.from_binary(body)
+    else:
+        weights = IndexWeights.from_json(body)
+    return Response(weights.to_json_bytes(), media_type="application/json")
+# 응답 형식은 /index-weights/ 와 동일함 (키 순서만 인덱스 오름차순)
+# 바이너리 예시: struct.pack("<qd", 3, 0.5) + struct.pack("<qd", 1, 2.0)
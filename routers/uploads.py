@@ -0,0 +1,188 @@
+# /uploads, /uploadfile/stream: 스트리밍/이어 올리기 업로드 (main 의 LazyRoutes 가 첫 요청 때 import)
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import pathlib
+from typing import Annotated
+from uuid import UUID, uuid4
+
+from fastapi import APIRouter, Header, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+from main import InstrumentedRoute
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+# 스트리밍 업로드: 본문을 request.stream() 으로 청크 단위로 받아서 바로 디스크에 씀
+# 받는 쪽과 쓰는 쪽 사이에 크기가 정해진 큐를 두므로 업로드 하나가 쓰는 메모리는 파일 크기와 상관없이 일정함
+# 디스크 쓰기/해시는 스레드풀에서 돌아서 여러 업로드가 동시에 진행되어도 이벤트 루프를 막지 않음
+# 이어 올리기: POST /uploads/ 로 id 를 받고, PATCH 에 Upload-Offset 헤더를 붙여 끊긴 지점부터 계속 보냄 (tus 와 비슷)
+#
+# 업로드 상태는 워커 메모리에 두지 않고 매번 디스크에서 읽음 (serve.py 의 여러 워커가 같은 업로드를 나눠 받아도 안전)
+# - .part 파일을 fcntl.flock 으로 잠근 쪽만 쓰고, offset 은 잠근 뒤의 fstat 크기 (잠겨 있으면 423)
+# - 파일 이름은 옆의 .json 에 둠
+# - sha256: 이어 올리기는 완료할 때 디스크에서 한 번 계산 (해시 중간 상태는 프로세스 사이에 넘길 수 없음),
+#           한 요청으로 끝나는 /uploadfile/stream 은 받으면서 누적 계산
+UPLOAD_DIR = pathlib.Path(os.environ.get("UPLOAD_DIR", "uploads")).resolve()
+UPLOAD_QUEUE_SIZE = 8
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def _part_path(upload_id: UUID) -> pathlib.Path:
+    return UPLOAD_DIR / f"{upload_id.hex}.part"
+
+
+def _meta_path(upload_id: UUID) -> pathlib.Path:
+    return UPLOAD_DIR / f"{upload_id.hex}.json"
+
+
+def _read_filename(upload_id: UUID) -> str | None:
+    try:
+        return json.loads(_meta_path(upload_id).read_bytes())["filename"]
+    except FileNotFoundError:
+        return None
+
+
+def create_upload(filename: str | None) -> UUID:
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    upload_id = uuid4()
+    _meta_path(upload_id).write_text(json.dumps({"filename": pathlib.PurePath(filename).name if filename else None}))
+    os.close(os.open(_part_path(upload_id), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+    return upload_id
+
+
+def upload_status(upload_id: UUID) -> dict:
+    try:
+        offset = _part_path(upload_id).stat().st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {"upload_id": upload_id, "filename": _read_filename(upload_id), "offset": offset}
+
+
+def open_locked(upload_id: UUID):
+    # O_CREAT 없이 열어서 없는(이미 완료된) 업로드를 다시 만들지 않음. 잠금은 열린 파일에 붙으므로 close 하면 풀림
+    path = _part_path(upload_id)
+    try:
+        f = open(os.open(path, os.O_RDWR | os.O_APPEND), "r+b")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        raise HTTPException(status_code=status.HTTP_423_LOCKED, detail="Upload is being written by another request")
+    try:
+        # 열고 잠그는 사이에 다른 요청이 완료(rename)했으면 더는 이 업로드의 .part 가 아님
+        current = os.stat(path).st_ino
+    except FileNotFoundError:
+        current = None
+    if current != os.fstat(f.fileno()).st_ino:
+        f.close()
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return f
+
+
+def current_offset(f) -> int:
+    return os.fstat(f.fileno()).st_size
+
+
+def _write(f, chunk: bytes, hasher):
+    f.write(chunk)
+    if hasher is not None:
+        hasher.update(chunk)
+
+
+async def append_stream(f, chunks, hasher=None):
+    queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_SIZE)
+    failure = []
+
+    async def writer():
+        while (chunk := await queue.get()) is not None:
+            # 쓰기가 실패해도 큐는 계속 비워서 받는 쪽이 put 에서 멈추지 않게 함
+            if failure:
+                continue
+            try:
+                await run_in_threadpool(_write, f, chunk, hasher)
+            except OSError as exc:
+                failure.append(exc)
+        try:
+            await run_in_threadpool(f.flush)
+        except OSError as exc:
+            failure.append(exc)
+
+    task = asyncio.create_task(writer())
+    try:
+        async for chunk in chunks:
+            if failure:
+                break
+            if chunk:
+                await queue.put(chunk)
+    finally:
+        # 클라이언트가 끊겨도 이미 받은 만큼은 디스크에 남겨서 그 offset 부터 이어 올릴 수 있음
+        await queue.put(None)
+        await task
+    if failure:
+        raise HTTPException(status_code=507, detail=f"Failed to write upload: {failure[0]}")
+
+
+def complete_upload(f, upload_id: UUID, sha256: str | None = None) -> dict:
+    # 잠금을 쥔 채로 호출됨
+    if sha256 is None:
+        hasher = hashlib.sha256()
+        f.seek(0)
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            hasher.update(chunk)
+        sha256 = hasher.hexdigest()
+    filename = _read_filename(upload_id)
+    _part_path(upload_id).replace(UPLOAD_DIR / upload_id.hex)
+    _meta_path(upload_id).unlink(missing_ok=True)
+    return {"upload_id": upload_id, "filename": filename, "size": current_offset(f), "sha256": sha256}
+
+
+@router.post("/uploads/", status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(filename: str | None = None):
+    upload_id = await run_in_threadpool(create_upload, filename)
+    return {"upload_id": upload_id, "offset": 0}
+
+
+@router.get("/uploads/{upload_id}")
+async def read_upload(upload_id: UUID):
+    return await run_in_threadpool(upload_status, upload_id)
+
+
+@router.patch("/uploads/{upload_id}")
+async def append_upload(upload_id: UUID, request: Request, upload_offset: Annotated[int, Header()]):
+    f = await run_in_threadpool(open_locked, upload_id)
+    try:
+        offset = await run_in_threadpool(current_offset, f)
+        if upload_offset != offset:
+            raise HTTPException(status_code=409, detail="Offset mismatch", headers={"Upload-Offset": str(offset)})
+        await append_stream(f, request.stream())
+        return {"upload_id": upload_id, "offset": await run_in_threadpool(current_offset, f)}
+    finally:
+        await run_in_threadpool(f.close)
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def finish_upload(upload_id: UUID):
+    f = await run_in_threadpool(open_locked, upload_id)
+    try:
+        return await run_in_threadpool(complete_upload, f, upload_id)
+    finally:
+        await run_in_threadpool(f.close)
+
+
+@router.post("/uploadfile/stream")
+async def create_streaming_upload(request: Request, filename: str | None = None):
+    upload_id = await run_in_threadpool(create_upload, filename)
+    f = await run_in_threadpool(open_locked, upload_id)
+    try:
+        hasher = hashlib.sha256()
+        await append_stream(f, request.stream(), hasher)
+        return await run_in_threadpool(complete_upload, f, upload_id, hasher.hexdigest())
+    finally:
+        await run_in_threadpool(f.close)
+# curl -T big.iso "http://localhost:8000/uploadfile/stream?filename=big.iso"
+# 여러 파일은 업로드마다 따로 요청을 보내면 서로 막지 않고 동시에 처리됨
@@ -0,0 +1,176 @@
+# 멀티 프로세스 실행기: python -m serve --workers 8
+# 부모 프로세스가 소켓을 한 번 열고 main(모델, 라우트, OpenAPI 스키마)을 미리 로드/워밍한 뒤 fork 하므로
+# 워커들은 같은 리스닝 소켓을 나눠 쓰고, 로드된 메모리 페이지는 copy-on-write 로 공유함
+#
+# SIGHUP: 무중단 리로드 (부모가 같은 소켓을 물려받은 채로 자신을 re-exec -> 새 코드로 워커를 띄우고 준비되면 옛 워커 종료)
+# SIGTERM/SIGINT: 워커들에게 SIGTERM을 보내 진행 중인 요청을 마무리하고 종료
+import argparse
+import gc
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+READY_TIMEOUT = 30.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="warning")
+    return parser.parse_args(argv)
+
+
+def open_socket(args):
+    # 리로드로 re-exec 된 경우에는 이전 이미지가 열어둔 소켓을 그대로 이어받음
+    fd = os.environ.pop("SERVE_FD", None)
+    if fd is not None:
+        return socket.socket(fileno=int(fd))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    return sock
+
+
+def load_app(workers):
+    from main import app, latency_metrics, load_lazy_routes
+
+    # fork 전에 지연 생성되는 것들을 미리 만들어 둠 (지연 라우터도 여기서 불러 두면 워커들이 copy-on-write 로 공유)
+    load_lazy_routes(app)
+    app.openapi()
+    app.middleware_stack = app.build_middleware_stack()
+    # 워커마다 한 칸씩 쓰는 지연 시간 히스토그램 공유 메모리 (/metrics 가 모든 워커의 값을 합쳐서 내보냄)
+    latency_metrics.share(workers)
+    # 이후 GC가 공유 객체의 헤더를 건드려서 페이지가 복사되지 않도록 지금까지의 객체를 영구 세대로 옮김
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+class ReadyServer(uvicorn.Server):
+    def __init__(self, config, ready_fd):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if self.started:
+            os.write(self.ready_fd, b"1")
+        os.close(self.ready_fd)
+
+
+class Arbiter:
+    def __init__(self, app, sock, args):
+        self.app = app
+        self.sock = sock
+        self.args = args
+        # pid -> 지표 공유 메모리 칸 번호 (다시 띄운 워커는 죽은 워커의 칸을 이어받음)
+        self.workers = {}
+        self.stopping = False
+        self.reloading = False
+
+    def spawn(self, slot):
+        from main import latency_metrics
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                signal.signal(sig, signal.SIG_DFL)
+            latency_metrics.attach(slot)
+            config = uvicorn.Config(self.app, log_level=self.args.log_level, access_log=False)
+            code = 0
+            try:
+                ReadyServer(config, write_fd).run(sockets=[self.sock])
+            except BaseException:
+                code = 1
+            os._exit(code)
+        os.close(write_fd)
+        self.workers[pid] = slot
+        return pid, read_fd
+
+    def wait_ready(self, pid, read_fd):
+        try:
+            readable, _, _ = select.select([read_fd], [], [], READY_TIMEOUT)
+            ready = bool(readable) and os.read(read_fd, 1) == b"1"
+        finally:
+            os.close(read_fd)
+        print(f"[serve] worker {pid} {'ready' if ready else 'failed to start'}", file=sys.stderr)
+        return ready
+
+    def stop_workers(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            self.workers.pop(pid, None)
+
+    def reload(self):
+        # 현재 워커 목록을 넘겨두고 같은 pid로 re-exec: 새 이미지가 워커를 다 띄운 뒤 이 목록을 종료시킴
+        os.set_inheritable(self.sock.fileno(), True)
+        os.environ["SERVE_FD"] = str(self.sock.fileno())
+        os.environ["SERVE_OLD_WORKERS"] = ",".join(map(str, self.workers))
+        print("[serve] reloading", file=sys.stderr)
+        os.execv(sys.executable, [sys.executable, "-m", "serve", *sys.argv[1:]])
+
+    def run(self):
+        old_workers = [int(pid) for pid in os.environ.pop("SERVE_OLD_WORKERS", "").split(",") if pid]
+
+        def on_stop(signum, frame):
+            self.stopping = True
+
+        def on_reload(signum, frame):
+            self.reloading = True
+
+        signal.signal(signal.SIGTERM, on_stop)
+        signal.signal(signal.SIGINT, on_stop)
+        signal.signal(signal.SIGHUP, on_reload)
+
+        for slot in range(self.args.workers):
+            self.wait_ready(*self.spawn(slot))
+        # 새 워커가 모두 준비된 다음에야 이전 이미지의 워커를 내림
+        self.stop_workers(old_workers)
+
+        while not self.stopping:
+            if self.reloading:
+                self.reload()
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid and pid in self.workers:
+                slot = self.workers.pop(pid)
+                print(f"[serve] worker {pid} exited ({status}), respawning", file=sys.stderr)
+                self.wait_ready(*self.spawn(slot))
+            elif not pid:
+                time.sleep(0.2)
+
+        self.stop_workers(list(self.workers))
+
+
+def main(argv=None):
+    if not hasattr(os, "fork"):
+        raise SystemExit("serve requires os.fork (use `uvicorn main:app` on this platform)")
+    args = parse_args(argv)
+    sock = open_socket(args)
+    app = load_app(args.workers)
+    Arbiter(app, sock, args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+
+# main 을 import 하기 전에 테스트용 환경을 정해 둠 (세션 DB 는 메모리, 요청 캡처/계측 파일 없음)
+os.environ.setdefault("SESSION_DB", ":memory:")
+os.environ.setdefault("USER_STORE", "memory")
@@ -0,0 +1,67 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from main import AdmissionMiddleware, FastJSONResponse, InstrumentedRoute
+from routers.batch import router as batch_router
+
+
+async def noop(scope, receive, send):
+    pass
+
+
+def test_weighted_admission_is_fifo_and_all_or_nothing():
+    async def run():
+        admission = AdmissionMiddleware(noop, max_concurrency=4, max_queue=10, queue_timeout=1.0)
+        assert await admission.admit(3)
+        big = asyncio.ensure_future(admission.admit(4))
+        small = asyncio.ensure_future(admission.admit(1))
+        await asyncio.sleep(0)
+        # 큰 요청이 먼저 왔으므로 자리가 하나 남아도 뒤의 작은 요청은 기다림
+        assert not big.done() and not small.done() and admission.waiting == 2
+        admission.release(3)
+        assert await big and admission.active == 4
+        await asyncio.sleep(0)
+        assert not small.done()
+        admission.release(4)
+        assert await small and admission.active == 1
+
+    asyncio.run(run())
+
+
+def test_admission_times_out_and_bounds_queue():
+    async def run():
+        admission = AdmissionMiddleware(noop, max_concurrency=1, max_queue=1, queue_timeout=0.05)
+        assert await admission.admit(1)
+        waiter = asyncio.ensure_future(admission.admit(1))
+        await asyncio.sleep(0)
+        assert not await admission.admit(1)
+        assert not await waiter
+        assert admission.waiting == 0 and admission.active == 1
+        admission.release(1)
+        assert await admission.admit(1)
+
+    asyncio.run(run())
+
+
+def test_batch_holds_slots_for_its_subrequests():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.router.route_class = InstrumentedRoute
+    app.include_router(batch_router)
+    app.add_middleware(AdmissionMiddleware, max_concurrency=4, max_queue=10, queue_timeout=1.0)
+
+    @app.get("/probe")
+    async def probe():
+        admission = app.middleware_stack.app
+        while not isinstance(admission, AdmissionMiddleware):
+            admission = admission.app
+        return {"active": admission.active}
+
+    with TestClient(app) as client:
+        assert client.get("/probe").json() == {"active": 1}
+        response = client.post("/batch", json=[{"path": "/probe"}] * 10)
+        assert [r["body"] for r in response.json()["responses"]] == [{"active": 4}] * 10
+        response = client.post("/batch", json=[{"path": "/probe"}] * 2)
+        assert [r["body"] for r in response.json()["responses"]] == [{"active": 2}] * 2
+        assert client.get("/probe").json() == {"active": 1}
@@ -0,0 +1,44 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def large_body(**overrides):
+    weights = {str(i): i / 3 for i in range(8000)}
+    weights.update(overrides)
+    return json.dumps(weights).encode()
+
+
+BODIES = [
+    large_body(),
+    large_body(**{"5": "not a number"}),
+    large_body(**{"x": 1.0}),
+    large_body()[:-10],
+]
+
+
+def post_all(client):
+    return [
+        client.post("/index-weights/", content=body, headers={"content-type": "application/json"})
+        for body in BODIES
+    ]
+
+
+def test_offload_is_off_by_default():
+    assert main.body_offload is None
+
+
+def test_thread_pool_matches_inline_responses(monkeypatch):
+    with TestClient(main.app) as client:
+        inline = post_all(client)
+        monkeypatch.setattr(main, "body_offload", main.BodyOffloadPool(1, "thread"))
+        try:
+            offloaded = post_all(client)
+            assert main.body_offload.executor is not None
+        finally:
+            main.body_offload.shutdown()
+    assert [r.status_code for r in inline] == [200, 422, 422, 422]
+    for a, b in zip(inline, offloaded):
+        assert (a.status_code, a.json()) == (b.status_code, b.json())
@@ -0,0 +1,22 @@
+from typing import Literal
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import CatalogItem, app
+
+
+def test_duplicate_variant_tag_is_rejected():
+    with pytest.raises(TypeError):
+        class OtherCar(CatalogItem):
+            type: Literal["car"] = "car"
+    assert sorted(CatalogItem.variants) == ["car", "plane"]
+
+
+def test_unknown_tag_is_rejected():
+    with TestClient(app) as client:
+        response = client.put("/catalog/x", json={"type": "boat", "description": "b"})
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["type"] == "union_tag_invalid"
+        response = client.put("/catalog/x", json={"type": "plane", "description": "p", "size": 1})
+        assert response.json() == {"type": "plane", "description": "p", "size": 1}
@@ -0,0 +1,79 @@
+import asyncio
+import gzip
+import threading
+
+import pytest
+
+import main
+from main import CompressionMiddleware, negotiate_encoding
+
+BODY = b'{"items": [' + b",".join(b'{"name": "item %d"}' % i for i in range(500)) + b"]}"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("*", next(iter(main.COMPRESSION_ENCODERS))),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("gzip;q=bad", None),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def make_scope():
+    return {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+
+
+async def call(middleware):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(make_scope(), None, send)
+    return messages
+
+
+async def etag_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(BODY)).encode()), (b"etag", b'"v1"'),
+    ]})
+    await send({"type": "http.response.body", "body": BODY})
+
+
+def test_etag_body_is_compressed_once_off_the_event_loop(monkeypatch):
+    threads = []
+    encoder = main.COMPRESSION_ENCODERS["gzip"]
+
+    class RecordingEncoder(encoder):
+        def finish(self, data=b""):
+            threads.append(threading.current_thread())
+            return super().finish(data)
+
+    monkeypatch.setitem(main.COMPRESSION_ENCODERS, "gzip", RecordingEncoder)
+
+    async def run():
+        middleware = CompressionMiddleware(etag_app)
+        results = await asyncio.gather(*(call(middleware) for _ in range(4)))
+        results.append(await call(middleware))
+        return results
+
+    results = asyncio.run(run())
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+    for start, body in results:
+        headers = dict(start["headers"])
+        assert headers[b"content-encoding"] == b"gzip"
+        assert headers[b"etag"] == b'W/"v1"'
+        assert gzip.decompress(body["body"]) == BODY
+
+
+def test_small_body_is_not_compressed():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    start, body = asyncio.run(call(CompressionMiddleware(app)))
+    assert b"content-encoding" not in dict(start["headers"])
+    assert body["body"] == b"{}"
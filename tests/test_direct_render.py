@@ -0,0 +1,62 @@
+from typing import Annotated
+
+from fastapi import Depends, FastAPI, Response
+from fastapi.testclient import TestClient
+
+from main import FastJSONResponse, InstrumentedRoute
+
+
+def make_app():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.router.route_class = InstrumentedRoute
+
+    def set_header(response: Response):
+        response.headers["x-dep"] = "1"
+        response.status_code = 202
+
+    @app.delete("/things/{thing_id}", status_code=204)
+    async def delete_thing(thing_id: int):
+        return None
+
+    @app.get("/dep-header", dependencies=[Depends(set_header)])
+    async def dep_header():
+        return {"ok": True}
+
+    def nested(value: Annotated[None, Depends(set_header)]):
+        return value
+
+    @app.get("/nested-dep-header")
+    async def nested_dep_header(value: Annotated[None, Depends(nested)]):
+        return {"ok": True}
+
+    @app.get("/plain")
+    def plain():
+        return {"ok": True}
+
+    return app
+
+
+def test_no_body_status_sends_empty_body():
+    with TestClient(make_app()) as client:
+        response = client.delete("/things/1")
+    assert response.status_code == 204
+    assert response.content == b""
+
+
+def test_dependency_response_headers_and_status_are_kept():
+    with TestClient(make_app()) as client:
+        for path in ("/dep-header", "/nested-dep-header"):
+            response = client.get(path)
+            assert response.status_code == 202
+            assert response.headers["x-dep"] == "1"
+            assert response.json() == {"ok": True}
+
+
+def test_plain_route_is_rendered_directly():
+    app = make_app()
+    route = next(route for route in app.routes if getattr(route, "path", None) == "/plain")
+    assert getattr(route.dependant.call, "direct_render", False)
+    with TestClient(app) as client:
+        response = client.get("/plain")
+    assert response.json() == {"ok": True}
+    assert response.headers["content-type"] == "application/json"
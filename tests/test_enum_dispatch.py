@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+
+from main import EnumDispatchApp, app
+
+
+def enum_route():
+    return next(route for route in app.router.routes if getattr(route, "path", None) == "/models/{model_name}")
+
+
+def test_repeated_lifespan_does_not_nest_dispatch():
+    for _ in range(3):
+        with TestClient(app) as client:
+            assert client.get("/models/alexnet").status_code == 200
+    dispatch = enum_route().app
+    assert isinstance(dispatch, EnumDispatchApp)
+    assert not isinstance(dispatch.fallback, EnumDispatchApp)
+
+
+def test_unknown_member_falls_back_to_validation():
+    with TestClient(app) as client:
+        assert client.get("/models/unknown").status_code == 422
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import routers.files as files
+from routers.files import FileRangeResponse, OpenFileCache, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("items=0-10", None),
+    ("bytes=0-1,4-5", None),
+    ("bytes=-", None),
+    ("bytes=a-b", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=99-99", (99, 99)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=100-", 100),
+    ("bytes=50-10", 100),
+    ("bytes=-0", 100),
+    ("bytes=-5", 0),
+    ("bytes=0-", 0),
+])
+def test_parse_range_unsatisfiable(header, size):
+    with pytest.raises(HTTPException) as exc:
+        parse_range(header, size)
+    assert exc.value.status_code == 416
+    assert exc.value.headers == {"Content-Range": f"bytes */{size}"}
+
+
+@pytest.fixture
+def file_cache(tmp_path, monkeypatch):
+    cache = OpenFileCache(1)
+    monkeypatch.setattr(files, "open_file_cache", cache)
+    for name in ("a.bin", "b.bin"):
+        (tmp_path / name).write_bytes(name.encode() * 100)
+    return cache
+
+
+def test_unsent_response_does_not_pin_file(tmp_path, file_cache):
+    entry = file_cache.lookup(tmp_path / "a.bin")
+    FileRangeResponse(tmp_path / "a.bin", entry, None, None)
+    # 응답을 보내지 않은 채로 밀려나면 바로 닫혀야 함
+    file_cache.lookup(tmp_path / "b.bin")
+    assert entry.users == 0 and entry.file.closed
+
+
+def test_response_reopens_evicted_file(tmp_path, file_cache):
+    entry = file_cache.lookup(tmp_path / "a.bin")
+    response = FileRangeResponse(tmp_path / "a.bin", entry, (0, 9), None)
+    file_cache.lookup(tmp_path / "b.bin")
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(response({"type": "http"}, None, send))
+    assert messages[0]["status"] == 206
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == b"a.bina.bin"
+    reopened = file_cache._files[(tmp_path / "a.bin")]
+    assert reopened.users == 0
+
+
+def test_evicted_file_closes_after_transfer(tmp_path, file_cache):
+    entry = file_cache.lookup(tmp_path / "a.bin")
+    assert file_cache.pin(entry)
+    file_cache.lookup(tmp_path / "b.bin")
+    assert not entry.file.closed
+    file_cache.release(entry)
+    assert entry.file.closed
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import pytest
+
+import routers.images as images
+from routers.images import JsonArrayStreamError, iter_json_array
+
+
+def collect(*chunks):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        return [value async for value in iter_json_array(stream())]
+
+    return asyncio.run(run())
+
+
+BODY = json.dumps([{"url": "http://a/한", "name": "x"}, 1234, -0.5, "a,]b", [], {}, None], ensure_ascii=False).encode()
+
+
+def test_whole_body():
+    assert collect(BODY) == json.loads(BODY)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_split_at_any_byte(size):
+    # 숫자, 문자열, 멀티바이트 UTF-8 문자가 청크 경계에서 잘려도 같은 값
+    chunks = [BODY[i:i + size] for i in range(0, len(BODY), size)]
+    assert collect(*chunks) == json.loads(BODY)
+
+
+@pytest.mark.parametrize("chunks, expected", [
+    ([b"[12", b"34", b"]"], [1234]),
+    ([b"[-0.", b"5]"], [-0.5]),
+    ([b"[1e", b"3, 2E", b"-1]"], [1000.0, 0.2]),
+])
+def test_number_split_across_chunks(chunks, expected):
+    assert collect(*chunks) == expected
+
+
+@pytest.mark.parametrize("chunks", [[b"[]"], [b" [ ", b" ] "], [b"[", b"", b"]"]])
+def test_empty_array(chunks):
+    assert collect(*chunks) == []
+
+
+@pytest.mark.parametrize("chunks, message", [
+    ([b'{"a": 1}'], "must be a JSON array"),
+    ([b"[1 2]"], "Expected ','"),
+    ([b"[1,"], "Unexpected end"),
+    ([b"[1"], "Unexpected end"),
+    ([b"[1, }"], "Malformed"),
+    ([b""], "Unexpected end"),
+])
+def test_malformed(chunks, message):
+    with pytest.raises(JsonArrayStreamError, match=message):
+        collect(*chunks)
+
+
+def test_element_too_large(monkeypatch):
+    monkeypatch.setattr(images, "MAX_STREAM_ELEMENT_SIZE", 8)
+    with pytest.raises(JsonArrayStreamError, match="too large"):
+        collect(b'["', b"x" * 16, b'"]')
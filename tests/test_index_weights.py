@@ -0,0 +1,93 @@
+import json
+import random
+import struct
+from typing import Dict
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+import routers.index_weights as index_weights
+from main import app
+from routers.index_weights import IndexWeights
+
+adapter = TypeAdapter(Dict[int, float])
+
+
+def expected(body: bytes):
+    # /index-weights/ 와 같은 값을 인덱스 순으로
+    return sorted(adapter.validate_json(body).items())
+
+
+def pairs(weights: IndexWeights):
+    return list(zip(weights.indices, weights.values))
+
+
+@pytest.mark.parametrize("layout", ["sorted", "dense-shuffled", "sparse-shuffled", "duplicates"])
+def test_from_json_matches_dict_validation(layout, monkeypatch):
+    # 청크 경계를 여러 번 넘도록 청크를 작게 잡음
+    monkeypatch.setattr(index_weights, "_CHUNK", 64)
+    rng = random.Random(layout)
+    indices = {
+        "sorted": list(range(-5, 500)),
+        "dense-shuffled": rng.sample(range(-5, 500), 505),
+        "sparse-shuffled": rng.sample(range(-10**12, 10**12), 505),
+        "duplicates": [rng.randrange(-5, 100) for _ in range(505)],
+    }[layout]
+    items = ", ".join(f'"{i}": {json.dumps(rng.choice([rng.random(), rng.randrange(-9, 9), -0.0, 1e300]))}'
+                      for i in indices)
+    body = f"{{{items}}}".encode()
+    weights = IndexWeights.from_json(body)
+    assert pairs(weights) == expected(body)
+    assert json.loads(weights.to_json_bytes()) == {str(k): v for k, v in expected(body)}
+
+
+@pytest.mark.parametrize("body", [
+    b"{}",
+    b'{"1":2}',
+    b'{" 2": "1.5", "01": true, "3": 1}',
+    b'{"2": 1e308, "1": 1e308}',
+    b' {"-0" : 1 , "-3":-2.5e-3}\n',
+])
+def test_from_json_other_shapes(body):
+    # 정규식에 안 맞는 모양은 pydantic 으로 처리하고, 맞는 모양도 같은 값이어야 함
+    assert pairs(IndexWeights.from_json(body)) == expected(body)
+
+
+def test_from_binary_sorts_and_keeps_last_duplicate():
+    body = b"".join(struct.pack("<qd", *pair) for pair in [(3, 0.5), (-1, 2.0), (3, 1.5), (7, 0.0), (-1, 4.0)])
+    assert pairs(IndexWeights.from_binary(body)) == [(-1, 4.0), (3, 1.5), (7, 0.0)]
+
+
+def test_to_json_bytes_matches_stdlib():
+    weights = IndexWeights.from_json(json.dumps({str(i): i / 7 for i in range(10_000)}).encode())
+    assert weights.to_json_bytes() == json.dumps({str(i): i / 7 for i in range(10_000)},
+                                                 separators=(",", ":")).encode()
+    assert IndexWeights.from_json(b"{}").to_json_bytes() == b"{}"
+
+
+@pytest.mark.parametrize("body, error", [
+    (b'{"1": NaN}', {"type": "finite_number", "loc": ["body", "1"], "input": "nan"}),
+    (b'{"1": 1e400}', {"type": "finite_number", "loc": ["body", "1"], "input": "inf"}),
+    (b'{"x": 1}', {"type": "int_parsing", "loc": ["body", "x", "[key]"]}),
+    (b"[1]", {"type": "dict_type", "loc": ["body"]}),
+    (b'{"1": 1', {"type": "json_invalid", "loc": ["body", 7]}),
+    (b'{"99999999999999999999": 1}', {"type": "value_error", "loc": ["body"]}),
+])
+def test_json_errors(body, error):
+    with TestClient(app) as client:
+        response = client.post("/index-weights/columnar", content=body, headers={"content-type": "application/json"})
+    assert response.status_code == 422
+    detail = response.json()["detail"][0]
+    assert {key: detail[key] for key in error} == error
+
+
+def test_binary_errors():
+    with TestClient(app) as client:
+        headers = {"content-type": "application/octet-stream"}
+        response = client.post("/index-weights/columnar", content=b"\0" * 15, headers=headers)
+        assert response.status_code == 422
+        response = client.post("/index-weights/columnar", content=struct.pack("<qd", 4, float("inf")), headers=headers)
+        assert response.json()["detail"][0]["loc"] == ["body", "4"]
+        response = client.post("/index-weights/columnar", content=struct.pack("<qdqd", 2, 0.5, 1, 0.25), headers=headers)
+        assert response.json() == {"1": 0.25, "2": 0.5}
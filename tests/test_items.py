@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import ItemStore, app
+
+
+@pytest.fixture
+def store():
+    store = ItemStore()
+    start = datetime(2026, 1, 1)
+    for i in range(10):
+        store.add(f"item{i}", tags=["even" if i % 2 == 0 else "odd", "all"], created_at=start + timedelta(seconds=i // 2))
+    return store
+
+
+def test_cursor_round_trip():
+    key = (datetime(2026, 10, 17, 23, 18, 28, 123456), 2)
+    assert ItemStore.decode_cursor(ItemStore.encode_cursor(key)) == key
+
+
+@pytest.mark.parametrize("cursor", [
+    "2026-10-17T23:18:28+00:00|2",
+    "2026-10-17T23:18:28Z|2",
+    "garbage",
+    "2026-10-17T23:18:28|x",
+    "|2",
+])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        ItemStore.decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("tags", [(), ("all",), ("even", "all")])
+def test_cursor_pages_cover_every_item_once(store, tags):
+    expected, _ = store.page("created_at", 100, tags=tags)
+    seen, cursor = [], None
+    while True:
+        page, cursor = store.page("created_at", 3, tags=tags, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert [item["id"] for item in seen] == [item["id"] for item in expected]
+
+
+def test_cursor_survives_updates_before_it(store):
+    first, cursor = store.page("updated_at", 3)
+    store.update(first[0]["id"], item_name="moved")
+    rest, _ = store.page("updated_at", 100, cursor=cursor)
+    assert [item["id"] for item in rest] == [4, 5, 6, 7, 8, 9, 10, first[0]["id"]]
+
+
+def test_cursor_with_equal_timestamps_uses_id(store):
+    page, cursor = store.page("created_at", 1)
+    assert cursor.endswith("|1")
+    page, _ = store.page("created_at", 1, cursor=cursor)
+    assert page[0]["id"] == 2
+
+
+def test_unknown_tag_gives_empty_page(store):
+    assert store.page("created_at", 10, tags=("missing",)) == ([], None)
+
+
+@pytest.mark.parametrize("cursor", ["2026-10-17T23:18:28+00:00|2", "nope"])
+def test_bad_cursor_is_400(cursor):
+    with TestClient(app) as client:
+        response = client.get("/items/", params={"cursor": cursor})
+        assert response.status_code == 400
+        assert response.json() == {"detail": "Invalid cursor"}
@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from main import LatencyHistogram, LatencyMetrics, app
+
+MS = 1_000_000
+
+
+@pytest.mark.parametrize("micros", [1, 15, 16, 17, 31, 32, 33, 1023, 1024, 1025, 65535, 65536, 65537, 10**8])
+def test_bucket_edges_match_le_bounds(micros):
+    # 값 v 는 v 이상인 모든 le 경계에, v 미만인 경계에는 하나도 세지지 않아야 함
+    histogram = LatencyHistogram()
+    histogram.record(micros)
+    for bound, count in histogram.cumulative():
+        assert count == (micros <= bound), bound
+
+
+def test_table_lookup_matches_bucket():
+    # 표를 벗어나는 값이 섞이면 bucket() 으로 다시 계산함
+    values = [0, 1, 2, 16, 17, 4096, 65535, 65536, 1 << 30]
+    batched, single = LatencyHistogram(), LatencyHistogram()
+    batched.record_many(values[:-1])
+    batched.record_many(values)
+    for value in values[:-1] + values:
+        single.counts[LatencyHistogram.bucket(value)] += 1
+    assert batched.counts == single.counts
+    assert (batched.count, batched.sum) == (len(values) * 2 - 1, sum(values) * 2 - values[-1])
+
+
+class Route:
+    path = "/things"
+
+
+def test_flush_skips_unreached_phases():
+    metrics = LatencyMetrics()
+    # 끝까지 간 요청, 엔드포인트 전에 검증 실패(422), 라우트를 못 찾은 요청(404)
+    metrics.observe({"route": Route, "method": "GET"}, [0, 1 * MS, 2 * MS, 4 * MS, 7 * MS, 11 * MS])
+    metrics.observe({"route": Route, "method": "GET"}, [0, 1 * MS, 0, 0, 3 * MS, 5 * MS])
+    metrics.observe({"method": "GET"}, [0, 0, 0, 0, 0, 2 * MS])
+    metrics.flush()
+    things = metrics.histograms[("/things", "GET")]
+    assert {phase: (h.count, h.sum) for phase, h in things.items()} == {
+        "routing": (2, 2000), "validation": (1, 1000), "handler": (1, 2000),
+        "serialization": (1, 3000), "total": (2, 16000),
+    }
+    unmatched = metrics.histograms[("<unmatched>", "GET")]
+    assert {phase: h.count for phase, h in unmatched.items()} == {
+        "routing": 0, "validation": 0, "handler": 0, "serialization": 0, "total": 1,
+    }
+
+
+def test_shared_slots_are_merged():
+    # serve.py 처럼 부모가 share 하고 워커가 각자 칸을 맡은 상황 (같은 mmap 을 두 객체가 나눠 씀)
+    first, second = LatencyMetrics(), LatencyMetrics()
+    first.share(2)
+    second.shared = first.shared
+    first.attach(0)
+    second.attach(1)
+    for metrics, total in ((first, 3 * MS), (second, 5 * MS)):
+        metrics.observe({"route": Route, "method": "GET"}, [0, MS, 0, 0, 2 * MS, total])
+        metrics.flush()
+        metrics.publish()
+    text = first.render_prometheus()
+    labels = 'route="/things",method="GET",phase="total"'
+    assert f"http_request_phase_seconds_count{{{labels}}} 2" in text
+    assert f"http_request_phase_seconds_sum{{{labels}}} 0.008000" in text
+    assert f'http_request_phase_seconds_bucket{{{labels},le="0.004096"}} 1' in text
+
+    # 다시 띄운 워커는 같은 칸의 값에서 이어서 셈
+    respawned = LatencyMetrics()
+    respawned.shared = first.shared
+    respawned.attach(1)
+    assert respawned.histograms[("/things", "GET")]["total"].count == 1
+
+
+def test_metrics_endpoint():
+    with TestClient(app) as client:
+        client.get("/")
+        text = client.get("/metrics").text
+    assert '# TYPE http_request_phase_seconds histogram' in text
+    assert 'route="/",method="GET",phase="total"' in text
@@ -0,0 +1,37 @@
+import asyncio
+
+from main import CaptureMiddleware
+from replay import AsgiClient, load_capture
+
+
+def test_capture_replays_raw_path(tmp_path):
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append((scope["path"], scope["raw_path"], scope["query_string"]))
+        await receive()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    capture_path = tmp_path / "capture.jsonl"
+    middleware = CaptureMiddleware(app, str(capture_path), sample_rate=1.0)
+    raw_path = "/files/a%3Fb%2Fc/%ED%95%9C".encode()
+    scope = {
+        "type": "http", "method": "GET", "path": "/files/a?b/c/한", "raw_path": raw_path,
+        "query_string": b"q=%20x", "headers": [(b"host", b"test")],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def run():
+        await middleware(scope, receive, send)
+        [(method, target, headers, body)] = load_capture(str(capture_path))
+        assert target == "/files/a%3Fb%2Fc/%ED%95%9C?q=%20x"
+        assert await AsgiClient(app).request(method, target, headers, body) == 200
+
+    asyncio.run(run())
+    assert seen[0] == seen[1] == ("/files/a?b/c/한", raw_path, b"q=%20x")
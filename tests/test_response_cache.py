@@ -0,0 +1,61 @@
+from typing import Annotated
+
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from main import FastJSONResponse, InstrumentedRoute, cached_response
+
+
+def make_app():
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.router.route_class = InstrumentedRoute
+    calls = {"dependency": 0, "endpoint": 0}
+
+    def dependency():
+        calls["dependency"] += 1
+
+    @app.get("/things/{thing_id}")
+    @cached_response(ttl=30, maxsize=10)
+    async def read_thing(thing_id: int, _: Annotated[None, Depends(dependency)], q: str = ""):
+        calls["endpoint"] += 1
+        if thing_id == 0:
+            raise HTTPException(status_code=404, detail="Not found")
+        return {"thing_id": thing_id, "q": q}
+
+    return app, read_thing.response_cache, calls
+
+
+def test_hit_skips_dependencies_and_endpoint():
+    app, cache, calls = make_app()
+    with TestClient(app) as client:
+        first = client.get("/things/1?q=a")
+        second = client.get("/things/1?q=a")
+    assert first.json() == second.json() == {"thing_id": 1, "q": "a"}
+    assert first.headers["etag"] == second.headers["etag"]
+    assert calls == {"dependency": 1, "endpoint": 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_key_includes_query_and_errors_are_not_cached():
+    app, cache, calls = make_app()
+    with TestClient(app) as client:
+        assert client.get("/things/1?q=a").json()["q"] == "a"
+        assert client.get("/things/1?q=b").json()["q"] == "b"
+        assert client.get("/things/0").status_code == 404
+        assert client.get("/things/0").status_code == 404
+        assert client.get("/things/x").status_code == 422
+    assert calls["endpoint"] == 4
+    assert cache.stats()["size"] == 2
+
+
+def test_conditional_requests_get_304():
+    app, cache, calls = make_app()
+    with TestClient(app) as client:
+        response = client.get("/things/2")
+        etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+        assert client.get("/things/2", headers={"if-none-match": etag}).status_code == 304
+        assert client.get("/things/2", headers={"if-none-match": f"W/{etag}"}).status_code == 304
+        assert client.get("/things/2", headers={"if-none-match": '"other"'}).status_code == 200
+        assert client.get("/things/2", headers={"if-modified-since": last_modified}).status_code == 304
+        assert client.get("/things/2", headers={"if-modified-since": "garbage"}).status_code == 200
+    assert calls["endpoint"] == 1
@@ -0,0 +1,117 @@
+import asyncio
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import PooledConnection, Session, SessionStore, SqlitePool, TimerWheel, app, resources
+
+
+@pytest.mark.parametrize("value", [
+    None, True, False, 0, 1, -1, 127, 128, -32, -33, 255, 256, 65535, 65536, 2 ** 32, 2 ** 64 - 1, -(2 ** 63),
+    1.5, -0.0, math.inf, "", "a" * 31, "a" * 32, "한글" * 100, "x" * 70000, b"", b"\x00" * 300, [], [1, [2, [3]]],
+    list(range(20)), {}, {"a": {"b": [1, 2]}}, {i: i for i in range(20)}, {1: "int key"},
+])
+def test_msgpack_round_trip(value):
+    assert main.unpackb(main.packb(value)) == (list(value) if isinstance(value, tuple) else value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (0, b"\x00"), (-1, b"\xff"), (128, b"\xcc\x80"), (-33, b"\xd0\xdf"), ("ab", b"\xa2ab"),
+    ([1, 2], b"\x92\x01\x02"), ({"a": None}, b"\x81\xa1a\xc0"), (b"\x01", b"\xc4\x01\x01"),
+    (2 ** 16, b"\xce\x00\x01\x00\x00"),
+])
+def test_msgpack_encoding(value, expected):
+    assert main.packb(value) == expected
+
+
+@pytest.mark.parametrize("value, error", [(2 ** 64, ValueError), (-(2 ** 63) - 1, ValueError), (object(), TypeError)])
+def test_msgpack_rejects_unsupported(value, error):
+    with pytest.raises(error):
+        main.packb(value)
+
+
+def test_msgpack_rejects_trailing_data():
+    with pytest.raises(ValueError):
+        main.unpackb(main.packb(1) + b"\x00")
+
+
+def test_session_encoding_round_trip():
+    session = Session("sid", "user", {"theme": "dark", "n": [1, 2]}, 100.5, 200.0)
+    decoded = Session.decode("sid", session.encode(), 200.0)
+    assert (decoded.user_id, decoded.data, decoded.created, decoded.expires) == ("user", session.data, 100.5, 200.0)
+
+
+class Item:
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+
+def test_timer_wheel_expires_and_reschedules():
+    wheel = TimerWheel(1.0, 8)
+    wheel.current = 100
+    early, late, dropped = Item(101.5), Item(103.0), Item(102.0)
+    for item in (early, late, dropped):
+        wheel.schedule(item, item.deadline)
+    dropped.deadline = None
+    # 마감 전이면 칸이 지나가도 다음 칸으로 다시 들어감
+    assert wheel.advance(101.4, lambda item: item.deadline) == []
+    assert wheel.advance(102.0, lambda item: item.deadline) == [early]
+    # 슬라이딩으로 늘어난 항목은 다음 칸으로 옮겨짐
+    late.deadline = 105.0
+    assert wheel.advance(104.0, lambda item: item.deadline) == []
+    assert wheel.advance(106.0, lambda item: item.deadline) == [late]
+
+
+def test_timer_wheel_clamps_past_and_far_deadlines():
+    wheel = TimerWheel(1.0, 4)
+    wheel.current = 10
+    past, far = Item(5.0), Item(30.0)
+    wheel.schedule(past, past.deadline)
+    wheel.schedule(far, far.deadline)
+    assert wheel.advance(11.0, lambda item: item.deadline) == [past]
+    # 한 바퀴 넘게 멈춰 있어도 모든 칸을 한 번씩만 봄
+    assert wheel.advance(31.0, lambda item: item.deadline) == [far]
+
+
+def test_lru_hit_does_not_acquire_a_connection():
+    async def run():
+        pool = SqlitePool(":memory:", setup=SessionStore.setup)
+        store = SessionStore(pool)
+        await pool.open()
+        try:
+            session = await store.create("user")
+            handle = PooledConnection(pool)
+            assert await store.get(session.session_id, handle) is session
+            assert not handle.acquired
+            store.cache.clear()
+            loaded = await store.get(session.session_id, handle)
+            assert loaded.user_id == "user" and handle.acquired
+            # 같은 요청 안의 쓰기는 빌려 둔 연결을 다시 씀 (연결이 하나뿐인 풀에서도 기다리지 않음)
+            await asyncio.wait_for(store.save(loaded, handle), 1.0)
+            await handle.release()
+            assert pool.stats()["in_use"] == 0
+        finally:
+            await pool.close()
+
+    asyncio.run(run())
+
+
+def test_current_session_dependency_skips_the_pool_on_hits(monkeypatch):
+    with TestClient(app) as client:
+        response = client.post("/sessions", json={"user_id": "gyeore"})
+        assert response.status_code == 201
+        session_id = response.cookies["session_id"]
+        pool = resources.pools["sessions"]
+        with monkeypatch.context() as patch:
+            def exhausted():
+                raise AssertionError("LRU hit must not acquire a connection")
+
+            patch.setattr(pool, "acquire", exhausted)
+            assert client.get("/sessions/me").json()["user_id"] == "gyeore"
+        assert client.put("/sessions/me/data", json={"theme": "dark"}).json()["data"] == {"theme": "dark"}
+        response = client.delete("/sessions/me")
+        assert response.status_code == 204 and response.content == b""
+        client.cookies.set("session_id", session_id)
+        assert client.get("/sessions/me").status_code == 401